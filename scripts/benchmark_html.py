@@ -0,0 +1,57 @@
+import sys
+import os
+import time
+import argparse
+
+# Add src to path
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(__file__)), 'src'))
+
+from services import html_parser
+from services.official import CONTENT_STRAINER
+from services.googlenews import PARAGRAPH_STRAINER
+from services.dashen import newer_cards_strainer
+
+STRAINERS = {
+    'official': CONTENT_STRAINER,
+    'google': PARAGRAPH_STRAINER,
+    # A cursor below every ObjectId keeps all cards, as on a first run
+    'dashen': newer_cards_strainer('0' * 24),
+}
+
+def time_parse(markup, backend, strainer, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        html_parser.parse(markup, only=strainer, parser=backend)
+    return (time.perf_counter() - started) / repeat * 1000
+
+def benchmark(pages, repeat):
+    backends = html_parser.available_backends()
+    print(f"Backends: {', '.join(backends)} ({repeat} runs each)\n")
+    print(f"{'page':<40} {'backend':<12} {'full ms':>10} {'partial ms':>11}")
+
+    for kind, path in pages:
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+            markup = f.read()
+        strainer = STRAINERS[kind]
+        for backend in backends:
+            full = time_parse(markup, backend, None, repeat)
+            partial = time_parse(markup, backend, strainer, repeat)
+            print(f"{os.path.basename(path)[:40]:<40} {backend:<12} {full:>10.2f} {partial:>11.2f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare HTML parser backends on saved pages")
+    parser.add_argument('pages', nargs='+', help="KIND:PATH where KIND is one of " + ", ".join(STRAINERS))
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    pages = []
+    for spec in args.pages:
+        kind, _, path = spec.partition(':')
+        if kind not in STRAINERS or not path:
+            parser.error(f"Invalid page spec '{spec}'")
+        pages.append((kind, path))
+
+    benchmark(pages, args.repeat)
+
+if __name__ == "__main__":
+    main()
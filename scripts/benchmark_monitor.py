@@ -0,0 +1,222 @@
+import sys
+import os
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+import statistics
+import subprocess
+from datetime import datetime
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src')
+RESULT_MARKER = 'BENCHMARK_RESULT '
+WEBHOOK_URL = 'https://discord.com/api/webhooks/0/replay'
+DEFAULT_ENTRIES = '1,10,100,1000,5000'
+
+
+def run_child():
+    """Run one monitor.main() against the replay server and print its measurements."""
+    started = time.perf_counter()
+    sys.path.insert(0, SRC_DIR)
+    import monitor
+    imported = time.perf_counter()
+
+    from services import http_client, metrics
+    from services.discord_dispatcher import DiscordDispatcher
+    metrics.enable()
+
+    delivery = {}
+    report = DiscordDispatcher.report
+    def capture_report(dispatcher):
+        delivery.update(dispatcher.stats())
+        report(dispatcher)
+    DiscordDispatcher.report = capture_report
+
+    main_started = time.perf_counter()
+    monitor.main()
+    finished = time.perf_counter()
+
+    # Stage totals summed over sources; sources run concurrently, so poll and fetch can exceed wall time
+    run_metrics = metrics.snapshot()
+    stages = {}
+    for entry in run_metrics['spans']:
+        stages[entry['stage']] = stages.get(entry['stage'], 0.0) + entry['seconds']
+
+    client = http_client.get_client()
+    result = {
+        'wall': finished - started,
+        'startup': imported - started,
+        'main': finished - main_started,
+        'stages': stages,
+        'metrics': run_metrics,
+        'delivery': delivery,
+        'connections': client.connection_stats(),
+        'cache': client.cache.stats() if client.cache is not None else None,
+    }
+    print(RESULT_MARKER + json.dumps(result))
+
+
+def run_once(server, data_dir, timeout, verbose, translate_latency=0.0):
+    """Run the monitor in a fresh process against `server`, keeping state in data_dir."""
+    server.reset_stats()
+    env = dict(os.environ)
+    env.update({
+        'REPLAY_BASE_URL': server.base_url,
+        'WEBHOOK_URL': WEBHOOK_URL,
+        'DATA_DIR': data_dir,
+        # Always the single default destination, whatever destinations.json holds
+        'DESTINATIONS_FILE': '',
+        # Translations are echoed locally instead of calling Google
+        'TRANSLATION_ENGINE': 'offline',
+        'OFFLINE_TRANSLATION_LATENCY': str(translate_latency),
+    })
+    completed = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--child'],
+        env=env, capture_output=True, text=True, timeout=timeout
+    )
+    if verbose:
+        print(completed.stdout)
+    if completed.returncode != 0:
+        print(completed.stderr)
+
+    result = None
+    for line in completed.stdout.splitlines():
+        if line.startswith(RESULT_MARKER):
+            result = json.loads(line[len(RESULT_MARKER):])
+    if result is None:
+        raise RuntimeError(f"Monitor run produced no result (exit code {completed.returncode})")
+    result['server'] = server.stats()
+    return result
+
+
+def summarize(runs):
+    """Median measurements per (entries, phase)."""
+    groups = {}
+    for run in runs:
+        groups.setdefault((run['entries'], run['phase']), []).append(run)
+
+    summary = []
+    for (entries, phase), group in groups.items():
+        stage_names = sorted({name for run in group for name in run['stages']})
+        summary.append({
+            'entries': entries,
+            'phase': phase,
+            'runs': len(group),
+            'wall': statistics.median(run['wall'] for run in group),
+            'startup': statistics.median(run['startup'] for run in group),
+            'stages': {name: statistics.median(run['stages'].get(name, 0.0) for run in group) for name in stage_names},
+            'requests': statistics.median(run['server']['requests_total'] for run in group),
+            'bytes': statistics.median(run['server']['bytes_sent'] for run in group),
+            'embeds': statistics.median(run['server']['embeds_received'] for run in group),
+        })
+    return summary
+
+
+def print_summary(summary):
+    stage_names = sorted({name for row in summary for name in row['stages']})
+    header = f"{'entries':>8} {'phase':<6} {'wall ms':>9} {'startup':>8}" + ''.join(f" {name:>9}" for name in stage_names)
+    print(header + f" {'requests':>9} {'KiB':>8} {'embeds':>7}")
+    for row in summary:
+        line = f"{row['entries']:>8} {row['phase']:<6} {row['wall'] * 1000:>9.1f} {row['startup'] * 1000:>8.1f}"
+        line += ''.join(f" {row['stages'].get(name, 0.0) * 1000:>9.1f}" for name in stage_names)
+        print(line + f" {row['requests']:>9.0f} {row['bytes'] / 1024:>8.1f} {row['embeds']:>7.0f}")
+
+
+def compare(summary, baseline_file):
+    """Print wall time and request deltas against an earlier report."""
+    with open(baseline_file, 'r') as f:
+        baseline = json.load(f)
+    previous = {(row['entries'], row['phase']): row for row in baseline['summary']}
+
+    print(f"\nCompared with {baseline_file} ({baseline.get('version') or 'unknown version'}):")
+    print(f"{'entries':>8} {'phase':<6} {'wall ms':>19} {'change':>8} {'requests':>13}")
+    for row in summary:
+        old = previous.get((row['entries'], row['phase']))
+        if old is None:
+            continue
+        change = (row['wall'] - old['wall']) / old['wall'] * 100 if old['wall'] else 0.0
+        print(
+            f"{row['entries']:>8} {row['phase']:<6} {old['wall'] * 1000:>9.1f}->{row['wall'] * 1000:<9.1f} "
+            f"{change:>+7.1f}% {old['requests']:>6.0f}->{row['requests']:<6.0f}"
+        )
+
+
+def git_version():
+    try:
+        return subprocess.run(['git', 'describe', '--always', '--dirty'], capture_output=True, text=True,
+                              cwd=os.path.dirname(SRC_DIR)).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main():
+    from replay_server import add_server_arguments, server_from_args
+
+    parser = argparse.ArgumentParser(description="Benchmark monitor.main end to end against a local replay server")
+    parser.add_argument('--entries', default=DEFAULT_ENTRIES, help=f"Comma-separated synthetic entries per feed (default: {DEFAULT_ENTRIES})")
+    parser.add_argument('--repeat', type=int, default=3, help="Runs per entry count")
+    parser.add_argument('--warm', action='store_true', help="Follow every cold run with a second run on the same state and caches")
+    parser.add_argument('--translate-latency', type=float, default=0.0, metavar='MS',
+                        help="Simulated latency of every translation request")
+    parser.add_argument('--timeout', type=float, default=600, help="Seconds before a single run is abandoned")
+    parser.add_argument('--output', metavar='JSON_PATH', help="Write the report to JSON_PATH")
+    parser.add_argument('--compare', metavar='JSON_PATH', help="Compare against an earlier report")
+    parser.add_argument('--verbose', action='store_true', help="Show the monitor's own output")
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    add_server_arguments(parser)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child()
+        return
+
+    entry_counts = [int(value) for value in args.entries.split(',') if value.strip()]
+    server = server_from_args(args, entry_counts[0])
+    server.start()
+    print(f"Replay server on {server.base_url}\n")
+
+    runs = []
+    try:
+        for entries in entry_counts:
+            server.set_entries(entries)
+            for repeat in range(args.repeat):
+                data_dir = tempfile.mkdtemp(prefix='wwmbot-bench-')
+                try:
+                    phases = ['cold', 'warm'] if args.warm else ['cold']
+                    for phase in phases:
+                        result = run_once(server, data_dir, args.timeout, args.verbose, args.translate_latency / 1000)
+                        result.update({'entries': entries, 'phase': phase, 'repeat': repeat})
+                        runs.append(result)
+                        print(f"entries={entries} {phase} run {repeat + 1}/{args.repeat}: "
+                              f"{result['wall'] * 1000:.1f}ms, {result['server']['requests_total']} requests")
+                finally:
+                    shutil.rmtree(data_dir, ignore_errors=True)
+    finally:
+        server.stop()
+
+    settings = {name: value for name, value in vars(args).items() if name not in ('child', 'verbose', 'output', 'compare')}
+    report = {
+        'version': git_version(),
+        'created_at': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'settings': settings,
+        'summary': summarize(runs),
+        'runs': runs,
+    }
+
+    print()
+    print_summary(report['summary'])
+    if args.compare:
+        compare(report['summary'], args.compare)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=4)
+        print(f"\nReport written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
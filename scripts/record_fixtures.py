@@ -0,0 +1,124 @@
+import sys
+import os
+import json
+import hashlib
+import argparse
+import requests
+from urllib.parse import urlsplit, urljoin
+
+# Add src to path
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(__file__)), 'src'))
+
+from services import http_client, feed_stream
+from services.official import OfficialService, NEWS_LINK_RE, MAX_LINKS
+from services.googlenews import GoogleNewsService
+from services.dashen import DashenService
+from services.reddit_rss import RedditRSSService
+from replay_server import MANIFEST_FILE, fixture_key
+
+DEFAULT_FIXTURES_DIR = os.path.join(os.path.dirname(__file__), 'fixtures')
+# Headers worth replaying; everything else is connection specific
+KEPT_HEADERS = ('Content-Type', 'Location', 'Retry-After', 'X-RateLimit-Limit', 'X-RateLimit-Remaining', 'X-RateLimit-Reset-After')
+
+
+class FixtureRecorder:
+    def __init__(self, fixtures_dir):
+        self.fixtures_dir = fixtures_dir
+        self.manifest_file = os.path.join(fixtures_dir, MANIFEST_FILE)
+        self.manifest = {}
+        if os.path.exists(self.manifest_file):
+            with open(self.manifest_file, 'r') as f:
+                self.manifest = json.load(f)
+
+    def save(self, method, url, response):
+        parts = urlsplit(url)
+        path = parts.path or '/'
+        if parts.query:
+            path += f"?{parts.query}"
+        key = fixture_key(method, parts.netloc, path)
+
+        body_file = None
+        if response.content:
+            body_file = hashlib.sha1(key.encode('utf-8')).hexdigest() + '.body'
+            with open(os.path.join(self.fixtures_dir, body_file), 'wb') as f:
+                f.write(response.content)
+
+        headers = {name: response.headers[name] for name in KEPT_HEADERS if name in response.headers}
+        if 'Location' in headers:
+            # Keep redirects on the replay server
+            target = urlsplit(urljoin(url, headers['Location']))
+            headers['Location'] = f"/{target.netloc}{target.path}" + (f"?{target.query}" if target.query else "")
+
+        self.manifest[key] = {'status': response.status_code, 'headers': headers, 'body': body_file}
+        print(f"Recorded {key} -> HTTP {response.status_code} ({len(response.content)} bytes)")
+
+    def get(self, url, **kwargs):
+        """GET url without following redirects, recording every hop."""
+        for _ in range(10):
+            response = http_client.get(url, allow_redirects=False, **kwargs)
+            self.save('GET', url, response)
+            if response.status_code not in (301, 302, 303, 307, 308):
+                return response
+            url = urljoin(url, response.headers['Location'])
+        return response
+
+    def write(self):
+        with open(self.manifest_file, 'w') as f:
+            json.dump(self.manifest, f, indent=4, ensure_ascii=False)
+
+
+def record(fixtures_dir, webhook_url=None):
+    os.makedirs(fixtures_dir, exist_ok=True)
+    recorder = FixtureRecorder(fixtures_dir)
+
+    # Official news index, listing and the newest articles
+    recorder.get(OfficialService().api_url, timeout=10)
+    response = recorder.get("https://www.yysls.cn/news/")
+    response.encoding = 'utf-8'
+    links = []
+    for match in NEWS_LINK_RE.finditer(response.text):
+        if match.group(1) not in links:
+            links.append(match.group(1))
+    for link in links[:MAX_LINKS]:
+        recorder.get(link)
+
+    # Google News feed, then the redirect chain and page of the first few 17173 articles
+    google = GoogleNewsService("燕云十六声")
+    response = recorder.get(google.rss_url)
+    entries = feed_stream.iter_entries([response.content])
+    articles = [entry['link'] for entry in entries if '17173' in entry['source_title'].lower()]
+    for link in articles[:MAX_LINKS]:
+        recorder.get(link, timeout=10)
+
+    dashen = DashenService("c47870f2c5f142a58ea746fbc4655165")
+    recorder.get(dashen.profile_url, headers=dashen.headers)
+    recorder.get(dashen.feed_api_url(dashen.user_id), headers=dashen.headers, timeout=10)
+
+    reddit = RedditRSSService(["WhereWindsMeet", "wherewindsmeet_"], post_limit=5)
+    recorder.get(reddit.rss_url, timeout=10)
+
+    if webhook_url:
+        # A real reply (status and rate limit headers) needs a real message
+        response = http_client.post(webhook_url, json={"content": "Recording replay fixtures."})
+        parts = urlsplit(webhook_url)
+        recorder.save('POST', f"https://{parts.netloc}/api/webhooks/0/replay", response)
+
+    recorder.write()
+    print(f"Wrote {len(recorder.manifest)} fixtures to {fixtures_dir}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record live upstream responses for replay_server.py")
+    parser.add_argument('--output', default=DEFAULT_FIXTURES_DIR, help="Fixture directory (default: scripts/fixtures)")
+    parser.add_argument('--webhook', help="Also post one message to this Discord webhook and record the reply")
+    args = parser.parse_args()
+
+    try:
+        record(args.output, args.webhook)
+    except requests.RequestException as e:
+        print(f"Recording failed: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
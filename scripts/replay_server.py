@@ -0,0 +1,448 @@
+import os
+import sys
+import json
+import time
+import random
+import hashlib
+import argparse
+import threading
+from datetime import datetime, timezone
+from email.utils import formatdate
+from html import escape
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+
+# Local stand-in for every upstream the monitor talks to. The monitor reaches it
+# through REPLAY_BASE_URL, which maps https://host/path to http://127.0.0.1:PORT/host/path.
+# Requests are answered from recorded fixtures when one matches (see
+# scripts/record_fixtures.py) and from synthetic feeds with a configurable
+# number of entries otherwise.
+
+MANIFEST_FILE = 'manifest.json'
+DISCORD_WINDOW = 2.0  # Seconds per Discord webhook rate limit bucket
+
+
+def fixture_key(method, host, path):
+    """Key of a recorded response: 'GET host/path?query'."""
+    return f"{method} {host}{path}"
+
+
+def load_fixtures(fixtures_dir):
+    """Load a fixture manifest written by record_fixtures.py into key -> response dict."""
+    with open(os.path.join(fixtures_dir, MANIFEST_FILE), 'r') as f:
+        manifest = json.load(f)
+
+    fixtures = {}
+    for key, entry in manifest.items():
+        body = b''
+        if entry.get('body'):
+            with open(os.path.join(fixtures_dir, entry['body']), 'rb') as f:
+                body = f.read()
+        fixtures[key] = (entry['status'], entry.get('headers', {}), body)
+    return fixtures
+
+
+class SyntheticUpstreams:
+    def __init__(self, entries, now=None):
+        """
+        Generate feeds, listings and articles shaped like the real sources.
+
+        Every listing holds `entries` items, all published within the last day,
+        so a fresh state store sees all of them as new. Output is deterministic
+        for a given `entries` and `now`, which keeps ETags stable between runs.
+        """
+        self.entries = entries
+        self.now = int(now or time.time())
+        self.today = datetime.fromtimestamp(self.now).strftime('%Y%m%d')
+
+    def _paragraphs(self, seed, count=4):
+        sentence = f"燕云十六声 第{seed}期 更新内容说明，新增玩法与活动奖励一览，敬请期待后续版本。"
+        return ''.join(f"<p>{sentence * 2}</p>" for _ in range(count))
+
+    def official_listing(self):
+        items = ''.join(
+            f'<li><a href="https://www.yysls.cn/news/{self.today}/40412_{1285000 + i}.html">新闻公告 {i}</a></li>'
+            for i in range(self.entries)
+        )
+        return f"<html><body><ul class=\"news-list\">{items}</ul></body></html>"
+
+    def official_index(self):
+        """The site's JSON news index: the listing's articles with their publish times."""
+        items = [
+            {
+                'id': 1285000 + i,
+                'title': f"新闻公告 {i}",
+                'url': f"https://www.yysls.cn/news/{self.today}/40412_{1285000 + i}.html",
+                'time': datetime.fromtimestamp(self.now - 600 * i).strftime('%Y-%m-%d %H:%M:%S'),
+            }
+            for i in range(self.entries)
+        ]
+        return json.dumps({'code': 0, 'data': {'list': items}}, ensure_ascii=False)
+
+    def official_article(self, path):
+        article_id = path.rsplit('_', 1)[-1].split('.')[0]
+        published = datetime.fromtimestamp(self.now - 600 * (int(article_id) - 1285000)).strftime('%Y-%m-%d %H:%M:%S')
+        # Navigation and script padding like the real pages, which partial parsing skips
+        navigation = '<a href="#">导航</a>' * 50
+        return (
+            f"<html><head><script>var x = {'1' * 2000};</script></head><body>"
+            f"<div class=\"nav\">{navigation}</div>"
+            f"<h1>官方公告 {article_id}</h1>"
+            f"<div class=\"time\">{published}</div>"
+            f"<div class=\"content\">{self._paragraphs(article_id)}"
+            f"<img src=\"https://yysls.cn/images/{article_id}.jpg\"></div>"
+            f"<div class=\"footer\">{'<span>页脚</span>' * 50}</div></body></html>"
+        )
+
+    def google_rss(self):
+        description = escape('<a href="#">摘要</a>')
+        items = []
+        for i in range(self.entries):
+            source = '17173.com' if i % 2 == 0 else 'Other News'
+            items.append(
+                f"<item><title>燕云十六声 新闻 {i}</title>"
+                f"<link>https://news.google.com/rss/articles/CBMi{i}</link>"
+                f"<guid>CBMi{i}</guid>"
+                f"<pubDate>{formatdate(self.now - 60 * i)}</pubDate>"
+                f"<description>{description}</description>"
+                f"<source url=\"https://www.17173.com\">{source}</source></item>"
+            )
+        return f"<?xml version=\"1.0\" encoding=\"UTF-8\"?><rss version=\"2.0\"><channel><title>Google News</title>{''.join(items)}</channel></rss>"
+
+    def article_17173(self, path):
+        article_id = path.rsplit('/', 1)[-1].split('.')[0]
+        return f"<html><body><h1>17173 {article_id}</h1>{self._paragraphs(article_id, 6)}</body></html>"
+
+    # Cards on the first page of a Dashen profile; the rest only come through the feed endpoint
+    DASHEN_PAGE_SIZE = 20
+
+    def _dashen_id(self, i):
+        return f"{self.now - 60 * i:08x}{i:016x}"
+
+    def dashen_profile(self):
+        cards = []
+        for i in range(min(self.entries, self.DASHEN_PAGE_SIZE)):
+            feed_id = self._dashen_id(i)
+            cards.append(
+                f"<div class=\"feed-card\" id=\"{feed_id}\">"
+                f"<div class=\"feed-card__content-title\">大神动态 {i}</div>"
+                f"<div class=\"feed-text\">{self._paragraphs(i, 2)}</div>"
+                f"<img src=\"https://ds.163.com/images/{feed_id}.jpg\">"
+                f"<time class=\"time-location__time\">{i}分钟前</time></div>"
+            )
+        return f"<html><body><div class=\"feed-list\">{''.join(cards)}</div></body></html>"
+
+    def dashen_feed(self, size, last_id=None):
+        """One page of the Dashen feed endpoint, newest first, continuing after last_id."""
+        start = 0
+        if last_id:
+            ids = [self._dashen_id(i) for i in range(self.entries)]
+            start = ids.index(last_id) + 1 if last_id in ids else self.entries
+        feeds = []
+        for i in range(start, min(self.entries, start + size)):
+            feed_id = self._dashen_id(i)
+            body = {
+                'title': f"大神动态 {i}",
+                'text': self._paragraphs(i, 2),
+                'media': [{'url': f"https://ds.163.com/images/{feed_id}.jpg"}],
+            }
+            feeds.append({'id': feed_id, 'createTime': (self.now - 60 * i) * 1000, 'content': json.dumps(body, ensure_ascii=False)})
+        return json.dumps({'code': 200, 'result': {'feeds': feeds}}, ensure_ascii=False)
+
+    def reddit_atom(self, subreddit, limit=None):
+        """Listing of one subreddit, or of a combined r/a+b with the entries interleaved."""
+        names = subreddit.split('+')
+        count = self.entries * len(names) if limit is None else min(self.entries * len(names), limit)
+        entries = []
+        for i in range(count):
+            name = names[i % len(names)]
+            number = i // len(names)
+            post_id = f"{name[:3].lower()}{number:05d}"
+            published = datetime.fromtimestamp(self.now - 60 * number, tz=timezone.utc).isoformat()
+            content = escape(f"<div class=\"md\"><p>Post body {number} for r/{name} with some discussion.</p></div>")
+            entries.append(
+                f"<entry><author><name>/u/user{number}</name></author>"
+                f"<content type=\"html\">{content}</content>"
+                f"<id>t3_{post_id}</id>"
+                f"<link href=\"https://www.reddit.com/r/{name}/comments/{post_id}/post_{number}/\"/>"
+                f"<published>{published}</published>"
+                f"<title>Post {number} in r/{name}</title></entry>"
+            )
+        return f"<?xml version=\"1.0\" encoding=\"UTF-8\"?><feed xmlns=\"http://www.w3.org/2005/Atom\"><title>r/{subreddit}</title>{''.join(entries)}</feed>"
+
+    def respond(self, method, host, path):
+        """
+        Build a synthetic response.
+
+        Returns:
+            (status, headers, body) or None if the route is unknown
+        """
+        parts = urlsplit(path)
+        route = parts.path
+        query = parse_qs(parts.query)
+
+        if method == 'HEAD':
+            return 200, {}, b''
+        if host == 'yysls.cn' and route == '/news/index.json':
+            return 200, {'Content-Type': 'application/json; charset=utf-8'}, self.official_index().encode('utf-8')
+        if host == 'www.yysls.cn' and route == '/news/':
+            return 200, {'Content-Type': 'text/html; charset=utf-8'}, self.official_listing().encode('utf-8')
+        if host == 'www.yysls.cn' and route.startswith('/news/'):
+            return 200, {'Content-Type': 'text/html; charset=utf-8'}, self.official_article(route).encode('utf-8')
+        if host == 'news.google.com' and route == '/rss/search':
+            return 200, {'Content-Type': 'application/rss+xml; charset=utf-8'}, self.google_rss().encode('utf-8')
+        if host == 'news.google.com' and route.startswith('/rss/articles/'):
+            article_id = route.rsplit('CBMi', 1)[-1]
+            # Relative, so the client stays on the replay server
+            return 302, {'Location': f"/www.17173.com/news/{article_id}.shtml"}, b''
+        if host == 'www.17173.com':
+            return 200, {'Content-Type': 'text/html; charset=utf-8'}, self.article_17173(route).encode('utf-8')
+        if host == 'inf.ds.163.com' and route.endswith('/getSomeOnesFeeds'):
+            size = int(query['size'][0]) if 'size' in query else 20
+            last_id = query['lastFeedId'][0] if 'lastFeedId' in query else None
+            return 200, {'Content-Type': 'application/json; charset=utf-8'}, self.dashen_feed(size, last_id).encode('utf-8')
+        if host == 'ds.163.com' and route.startswith('/user/'):
+            return 200, {'Content-Type': 'text/html; charset=utf-8'}, self.dashen_profile().encode('utf-8')
+        if host in ('www.reddit.com', 'old.reddit.com') and route.startswith('/r/'):
+            subreddit = route.split('/')[2]
+            limit = int(query['limit'][0]) if 'limit' in query else None
+            return 200, {'Content-Type': 'application/atom+xml; charset=UTF-8'}, self.reddit_atom(subreddit, limit).encode('utf-8')
+        return None
+
+
+class QuietHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients that stop reading a feed early simply drop the connection
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class ReplayServer:
+    def __init__(self, entries=20, latency=0.0, jitter=0.0, error_rate=0.0, host_latency=None,
+                 fixtures_dir=None, discord_limit=None, seed=0, port=0):
+        """
+        Threaded HTTP stand-in for every upstream, with latency and error injection.
+
+        Args:
+            entries: Items per synthetic feed or listing
+            latency: Seconds added to every response
+            jitter: Maximum extra random seconds added to every response
+            error_rate: Fraction of requests answered with a 503
+            host_latency: Dict of host -> seconds, replacing `latency` for that host
+            fixtures_dir: Directory of recorded fixtures served in preference to synthetic data
+            discord_limit: Webhook messages allowed per 2s bucket (None = unlimited)
+            seed: Seed for jitter and error injection, so runs are repeatable
+            port: Port to listen on (0 picks a free one)
+        """
+        self.synthetic = SyntheticUpstreams(entries)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.host_latency = host_latency or {}
+        self.fixtures = load_fixtures(fixtures_dir) if fixtures_dir else {}
+        self.discord_limit = discord_limit
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.port = port
+        self.httpd = None
+        self.thread = None
+        self._discord_bucket = (0.0, 0)
+        self.reset_stats()
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}"
+
+    def set_entries(self, entries):
+        self.synthetic = SyntheticUpstreams(entries, now=self.synthetic.now)
+
+    def reset_stats(self):
+        with self.lock:
+            self.requests = {}
+            self.statuses = {}
+            self.bytes_sent = 0
+            self.errors_injected = 0
+            self.embeds_received = 0
+
+    def stats(self):
+        with self.lock:
+            return {
+                'requests': dict(self.requests),
+                'requests_total': sum(self.requests.values()),
+                'statuses': dict(self.statuses),
+                'bytes_sent': self.bytes_sent,
+                'errors_injected': self.errors_injected,
+                'embeds_received': self.embeds_received,
+            }
+
+    def _delay(self, host):
+        with self.lock:
+            extra = self.random.uniform(0, self.jitter) if self.jitter else 0.0
+            fail = self.error_rate and self.random.random() < self.error_rate
+        return self.host_latency.get(host, self.latency) + extra, fail
+
+    def _discord(self, body, recorded=None):
+        try:
+            payload = json.loads(body or b'{}')
+        except ValueError:
+            return 400, {}, b'{"message": "Invalid JSON"}'
+
+        response = recorded or (204, {}, b'')
+        with self.lock:
+            if self.discord_limit:
+                now = time.monotonic()
+                window_start, used = self._discord_bucket
+                if now - window_start >= DISCORD_WINDOW:
+                    window_start, used = now, 0
+                reset_after = max(0.0, window_start + DISCORD_WINDOW - now)
+                if used >= self.discord_limit:
+                    body = json.dumps({'message': 'You are being rate limited.', 'retry_after': reset_after, 'global': False})
+                    return 429, {'Content-Type': 'application/json', 'Retry-After': f"{reset_after:.3f}"}, body.encode('utf-8')
+                used += 1
+                self._discord_bucket = (window_start, used)
+                response = (204, {
+                    'X-RateLimit-Limit': str(self.discord_limit),
+                    'X-RateLimit-Remaining': str(self.discord_limit - used),
+                    'X-RateLimit-Reset-After': f"{reset_after:.3f}",
+                }, b'')
+            self.embeds_received += len(payload.get('embeds', []))
+        return response
+
+    def handle(self, method, raw_path, headers, body):
+        """
+        Answer one request for http://host/path relayed as /host/path.
+
+        Returns:
+            (status, headers, body)
+        """
+        host, _, rest = raw_path.lstrip('/').partition('/')
+        path = '/' + rest
+        with self.lock:
+            self.requests[host] = self.requests.get(host, 0) + 1
+
+        delay, fail = self._delay(host)
+        if delay:
+            time.sleep(delay)
+        if fail:
+            with self.lock:
+                self.errors_injected += 1
+            return 503, {'Content-Type': 'text/plain'}, b'Injected failure'
+
+        response = self.fixtures.get(fixture_key(method, host, path))
+        if host == 'discord.com' and method == 'POST':
+            return self._discord(body, response)
+
+        if response is None and method == 'HEAD':
+            response = self.fixtures.get(fixture_key('GET', host, path))
+            if response is not None:
+                response = (response[0], response[1], b'')
+        if response is None:
+            response = self.synthetic.respond(method, host, path)
+        if response is None:
+            return 404, {'Content-Type': 'text/plain'}, b'No fixture for this route'
+
+        status, response_headers, content = response
+        response_headers = dict(response_headers)
+        if status == 200 and content:
+            # Strong validators so the monitor's HTTP cache can revalidate
+            etag = '"' + hashlib.sha1(content).hexdigest() + '"'
+            response_headers['ETag'] = etag
+            if headers.get('If-None-Match') == etag:
+                return 304, {'ETag': etag}, b''
+        return status, response_headers, content
+
+    def start(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def _serve(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                body = self.rfile.read(length) if length else b''
+                status, headers, content = server.handle(self.command, self.path, self.headers, body)
+                self.send_response(status)
+                for name, value in headers.items():
+                    if name.lower() not in ('content-length', 'transfer-encoding', 'connection', 'content-encoding'):
+                        self.send_header(name, value)
+                self.send_header('Content-Length', str(len(content)))
+                self.end_headers()
+                if self.command != 'HEAD':
+                    self.wfile.write(content)
+                with server.lock:
+                    server.statuses[status] = server.statuses.get(status, 0) + 1
+                    server.bytes_sent += len(content)
+
+            do_GET = do_POST = do_HEAD = _serve
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = QuietHTTPServer(('127.0.0.1', self.port), Handler)
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self.base_url
+
+    def stop(self):
+        if self.httpd is not None:
+            self.httpd.shutdown()
+            self.httpd.server_close()
+            self.httpd = None
+
+
+def parse_host_latency(specs):
+    """Parse HOST=MS options into a host -> seconds dict."""
+    host_latency = {}
+    for spec in specs or []:
+        host, _, ms = spec.partition('=')
+        host_latency[host] = float(ms) / 1000
+    return host_latency
+
+
+def add_server_arguments(parser):
+    parser.add_argument('--latency', type=float, default=0, help="Milliseconds added to every response")
+    parser.add_argument('--jitter', type=float, default=0, help="Maximum random extra milliseconds per response")
+    parser.add_argument('--error-rate', type=float, default=0, help="Fraction of requests answered with 503")
+    parser.add_argument('--host-latency', action='append', metavar='HOST=MS', help="Latency override for one host (repeatable)")
+    parser.add_argument('--fixtures', metavar='DIR', help="Serve recorded fixtures from DIR before synthetic data")
+    parser.add_argument('--discord-limit', type=int, default=None, help="Webhook messages allowed per 2s (default: unlimited)")
+    parser.add_argument('--seed', type=int, default=0)
+
+
+def server_from_args(args, entries, port=0):
+    return ReplayServer(
+        entries=entries,
+        latency=args.latency / 1000,
+        jitter=args.jitter / 1000,
+        error_rate=args.error_rate,
+        host_latency=parse_host_latency(args.host_latency),
+        fixtures_dir=args.fixtures,
+        discord_limit=args.discord_limit,
+        seed=args.seed,
+        port=port,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve recorded or synthetic upstream responses for the monitor")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--entries', type=int, default=20, help="Items per synthetic feed or listing")
+    add_server_arguments(parser)
+    args = parser.parse_args()
+
+    server = server_from_args(args, args.entries, port=args.port)
+    base_url = server.start()
+    print(f"Replay server listening on {base_url}")
+    print(f"Run the monitor with REPLAY_BASE_URL={base_url} WEBHOOK_URL=https://discord.com/api/webhooks/0/replay")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        print(json.dumps(server.stats(), indent=4))
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
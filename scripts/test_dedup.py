@@ -0,0 +1,69 @@
+import sys
+import os
+
+# Add src to path
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(__file__)), 'src'))
+
+from dedup import PostClusterer, post_fingerprint, distance, DEFAULT_MAX_DISTANCE
+
+OFFICIAL = {"name": "Official Site", "history_key": "official", "dedup": True}
+GOOGLE = {"name": "17173 (Google News)", "history_key": "googlenews", "dedup": True}
+DASHEN = {"name": "NetEase Dashen", "history_key": "dashen", "dedup": True}
+
+BODY = ("亲爱的少侠：\n为了给大家带来更好的游戏体验，《燕云十六声》将于{date}（周四）7:00-10:00对全部服务器进行停服维护，"
+        "维护期间将无法登录游戏，请各位少侠提前下线，以免造成不必要的损失。维护完成后将发放补偿：通宝×200。")
+
+def official_post(date, published):
+    # The article page opens with its own publish time
+    return {"title": f"{date}停服维护公告", "text": f"发布时间：{published}\n{BODY.format(date=date)}",
+            "link": f"https://www.yysls.cn/news/{published[:10]}.html"}
+
+def google_post(date):
+    # GoogleNewsService has already stripped the " - 17173.com" publisher suffix
+    return {"title": f"《燕云十六声》{date}停服维护公告",
+            "text": f"{BODY.format(date=date)}\n\n更多精彩内容请关注17173燕云十六声专区。",
+            "link": "https://news.17173.com/content/10172025/093000000.shtml"}
+
+def dashen_post(date):
+    # An untitled Dashen post with the notice pasted into its text
+    return {"title": "Dashen Update", "untitled": True, "text": f"【公告】{date}停服维护公告\n{BODY.format(date=date)}",
+            "link": "https://ds.163.com/feed/670f0a3b2c1d4e5f60718293/"}
+
+def test_copies_across_sources_merge():
+    posts = [(OFFICIAL, official_post("10月17日", "2025-10-16 18:00")), (GOOGLE, google_post("10月17日")),
+             (DASHEN, dashen_post("10月17日"))]
+    for (_, a), (_, b) in zip(posts, posts[1:]):
+        assert distance(post_fingerprint(a)[0], post_fingerprint(b)[0]) <= DEFAULT_MAX_DISTANCE
+
+    clusterer = PostClusterer()
+    clusters = [clusterer.add(svc, post) for svc, post in posts]
+    assert all(cluster is clusters[0] for cluster in clusters)
+    assert [svc for svc, _ in clusters[0]['members']] == [OFFICIAL, GOOGLE, DASHEN]
+
+def test_templated_notices_stay_apart():
+    clusterer = PostClusterer()
+    first = clusterer.add(OFFICIAL, official_post("10月17日", "2025-10-16 18:00"))
+    # Next week's notice from another source must not merge into this week's
+    second = clusterer.add(GOOGLE, google_post("10月24日"))
+    assert second is not first
+
+def test_issue_numbers_stay_apart():
+    text = "《燕云十六声》限时活动开启，参与活动即可获得丰厚奖励，活动期间每日登录领取通宝与外观，快来一起江湖同游吧！"
+    clusterer = PostClusterer()
+    first = clusterer.add(OFFICIAL, {"title": "江湖同游 第1期 活动说明", "text": text, "link": "a"})
+    second = clusterer.add(DASHEN, {"title": "江湖同游 第2期 活动说明", "text": text, "link": "b"})
+    assert second is not first
+
+def test_previous_delivery_matches_later_copy():
+    delivered = post_fingerprint(official_post("10月17日", "2025-10-16 18:00"))
+    clusterer = PostClusterer([("official", "Official Site", "https://www.yysls.cn/news/1.html", delivered)])
+    cluster = clusterer.add(DASHEN, dashen_post("10月17日"))
+    assert cluster['previous'] == [("official", "Official Site", "https://www.yysls.cn/news/1.html")]
+    assert clusterer.add(GOOGLE, google_post("10月24日"))['previous'] == []
+
+if __name__ == "__main__":
+    test_copies_across_sources_merge()
+    test_templated_notices_stay_apart()
+    test_issue_numbers_stay_apart()
+    test_previous_delivery_matches_later_copy()
+    print("All dedup tests passed.")
@@ -0,0 +1,111 @@
+import sys
+import os
+import json
+from datetime import datetime
+
+# Add src to path
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(__file__)), 'src'))
+
+from services import http_client
+from services import official
+from services.official import OfficialService, cursor_timestamp
+
+# Shape of https://yysls.cn/news/index.json (as replayed by scripts/replay_server.py)
+INDEX = {
+    "code": 0,
+    "data": {
+        "list": [
+            {"id": 1285159, "title": "10月17日停服维护公告", "url": "https://www.yysls.cn/news/20251016/40412_1285159.html",
+             "time": "2025-10-16 18:00:00"},
+            {"id": 1285158, "title": "江湖同游 第1期 活动说明", "url": "https://www.yysls.cn/news/20251016/40412_1285158.html",
+             "time": "2025-10-16 12:30:00"},
+        ]
+    }
+}
+
+
+class FakeResponse:
+    def __init__(self, status_code, document=None):
+        self.status_code = status_code
+        self.document = document
+        self.not_modified = False
+
+    def json(self):
+        return self.document
+
+
+def with_index(responses, check):
+    """Run check() with http_client.get_cached answering the index URL from `responses` in turn."""
+    calls = []
+    original = http_client.get_cached
+
+    def get_cached(url, **kwargs):
+        calls.append(url)
+        response = responses[min(len(calls), len(responses)) - 1]
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    http_client.get_cached = get_cached
+    try:
+        check()
+    finally:
+        http_client.get_cached = original
+    return calls
+
+def test_index_entries():
+    entries = OfficialService()._index_entries(INDEX)
+    link, title, ts = entries[0]
+    assert link == "https://www.yysls.cn/news/20251016/40412_1285159.html"
+    assert title == "10月17日停服维护公告"
+    assert ts == cursor_timestamp(datetime(2025, 10, 16, 18, 0).timestamp(), link)
+
+def test_index_error_is_unavailable():
+    service = OfficialService()
+    for document in ({"code": 500, "msg": "error"}, {"code": 0, "data": {}}, []):
+        try:
+            service._index_entries(document)
+        except ValueError:
+            continue
+        raise AssertionError(f"{document} accepted as a news index")
+
+def test_index_fetched_once_when_down():
+    service = OfficialService()
+    results = {}
+
+    def check():
+        results['upgraded'] = service.upgrade_watermark(1760572800.0)
+        try:
+            service._read_index(1760572800.0)
+        except ValueError:
+            results['read'] = 'unavailable'
+
+    calls = with_index([FakeResponse(503)], check)
+    assert results == {'upgraded': None, 'read': 'unavailable'}
+    assert calls == [service.api_url]
+
+def test_midnight_fallback_after_watermark():
+    # Listing fallback: the page has no publish time, and an earlier post of the
+    # same day has already moved the watermark past midnight
+    service = OfficialService()
+    seen = "https://www.yysls.cn/news/20251016/40412_1285158.html"
+    new = "https://www.yysls.cn/news/20251016/40412_1285159.html"
+    watermark = cursor_timestamp(datetime(2025, 10, 16, 12, 30).timestamp(), seen)
+
+    original = (service._read_index, service._read_listing, official.iter_all)
+    service._read_index = lambda ts: (_ for _ in ()).throw(ValueError("HTTP 503"))
+    service._read_listing = lambda ts: [(seen, datetime(2025, 10, 16)), (new, datetime(2025, 10, 16))]
+    official.iter_all = lambda fn, links, workers: [None for _ in links]
+    try:
+        posts = service.get_new_posts(watermark)
+    finally:
+        service._read_index, service._read_listing, official.iter_all = original
+    assert [post['link'] for post in posts] == [new]
+    assert posts[0]['timestamp'] > watermark
+
+if __name__ == "__main__":
+    test_index_entries()
+    test_index_error_is_unavailable()
+    test_index_fetched_once_when_down()
+    test_midnight_fallback_after_watermark()
+    print(json.dumps({"official index tests": "passed"}))
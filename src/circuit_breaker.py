@@ -0,0 +1,117 @@
+import time
+import random
+
+# Consecutive failed polls that open a source's circuit
+FAILURE_THRESHOLD = 3
+# How long an open circuit skips its source before one probe is allowed;
+# doubled after every failed probe, up to MAX_COOLDOWN
+OPEN_COOLDOWN = 30 * 60
+MAX_COOLDOWN = 6 * 3600
+
+# Attempts per poll, and the seconds after which no further attempt is started
+RETRY_ATTEMPTS = 3
+RETRY_BUDGET = 20.0
+RETRY_BASE_DELAY = 1.0
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitBreaker:
+    def __init__(self, store, key, threshold=FAILURE_THRESHOLD, cooldown=OPEN_COOLDOWN, max_cooldown=MAX_COOLDOWN):
+        """
+        Skip a source that keeps failing, with its state persisted between runs.
+
+        After `threshold` consecutive failed polls the circuit opens and the source
+        is skipped for `cooldown` seconds. The next poll is a single half-open
+        probe: success closes the circuit, failure reopens it for twice as long.
+
+        Args:
+            store: StateStore holding the source_health table
+            key: History key of the source (or of a group polled together)
+        """
+        self.store = store
+        self.key = key
+        self.threshold = threshold
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+
+    @property
+    def health(self):
+        return self.store.get_health(self.key) or {
+            'state': CLOSED,
+            'failures': 0,
+            'opened_at': None,
+            'cooldown': self.base_cooldown,
+            'last_error': None,
+        }
+
+    def allow(self, now=None):
+        """Return True if the source may be polled now; an expired open circuit becomes half-open."""
+        now = now or time.time()
+        health = self.health
+        if health['state'] != OPEN:
+            return True
+        if now < health['opened_at'] + health['cooldown']:
+            return False
+        self.store.set_health(self.key, HALF_OPEN, health['failures'], health['opened_at'], health['cooldown'], health['last_error'])
+        return True
+
+    @property
+    def probing(self):
+        return self.health['state'] == HALF_OPEN
+
+    def retry_at(self):
+        """When an open circuit allows its next probe (None unless open)."""
+        health = self.health
+        if health['state'] != OPEN:
+            return None
+        return health['opened_at'] + health['cooldown']
+
+    def record_success(self):
+        health = self.health
+        if health['state'] != CLOSED or health['failures']:
+            if health['state'] != CLOSED:
+                print(f"Circuit for {self.key} closed again")
+            self.store.set_health(self.key, CLOSED, 0, None, self.base_cooldown, None)
+
+    def record_failure(self, error, now=None):
+        now = now or time.time()
+        health = self.health
+        failures = health['failures'] + 1
+        if health['state'] == HALF_OPEN:
+            cooldown = min(self.max_cooldown, health['cooldown'] * 2)
+            print(f"Probe of {self.key} failed, circuit open for {cooldown / 60:.0f} min")
+            self.store.set_health(self.key, OPEN, failures, now, cooldown, str(error))
+        elif failures >= self.threshold:
+            print(f"{self.key} failed {failures} times in a row, circuit open for {self.base_cooldown / 60:.0f} min")
+            self.store.set_health(self.key, OPEN, failures, now, self.base_cooldown, str(error))
+        else:
+            self.store.set_health(self.key, CLOSED, failures, None, self.base_cooldown, str(error))
+
+
+def call_with_retry(func, retry_on=(Exception,), attempts=RETRY_ATTEMPTS, budget=RETRY_BUDGET, base_delay=RETRY_BASE_DELAY):
+    """
+    Call func, retrying failures with full-jitter exponential backoff.
+
+    Args:
+        func: Callable without arguments
+        retry_on: Exception types worth retrying; errors with retryable=False are raised at once
+        attempts: Maximum number of calls
+        budget: Seconds after the first call in which a retry may still be started
+        base_delay: Upper bound of the first backoff; doubled for every retry
+
+    Returns:
+        Result of the first successful call (the last error is raised otherwise)
+    """
+    deadline = time.monotonic() + budget
+    for attempt in range(attempts):
+        try:
+            return func()
+        except retry_on as e:
+            delay = random.uniform(0, base_delay * 2 ** attempt)
+            if attempt == attempts - 1 or not getattr(e, 'retryable', True) or time.monotonic() + delay >= deadline:
+                raise
+            print(f"Attempt {attempt + 1} failed ({e}), retrying in {delay:.1f}s")
+            time.sleep(delay)
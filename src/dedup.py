@@ -0,0 +1,202 @@
+import re
+import hashlib
+
+FINGERPRINT_BITS = 64
+SHINGLE_SIZE = 3
+# Only the start of a post is fingerprinted: copies of an announcement share their
+# opening, while sites append different footers, and it keeps hashing cheap
+FINGERPRINT_CHARS = 160
+# Fingerprints at most this many bits apart are the same story
+DEFAULT_MAX_DISTANCE = 10
+# Shorter normalised texts say too little to be matched
+MIN_NORMALIZED_CHARS = 20
+
+URL_RE = re.compile(r'https?://\S+')
+WORD_RE = re.compile(r'[^\W_]+')
+DIGITS_RE = re.compile(r'\d+')
+
+# Numbers that identify one instance of a templated announcement, by kind.
+# Other numbers (times, counts, rewards) are ignored.
+DATE_PATTERNS = [
+    re.compile(r'(?<!\d)(\d{1,2})\s*月\s*(\d{1,2})\s*[日号]'),
+    re.compile(r'(?<!\d)\d{4}[-/.年](\d{1,2})[-/.月](\d{1,2})(?!\d)'),
+]
+ORDINAL_RE = re.compile(r'第\s*(\d+)\s*([期章季弹轮届卷集话篇])')
+
+
+def opening(text):
+    """
+    Cut the start of a text for fingerprinting.
+
+    Returns:
+        (normalized, raw): the first FINGERPRINT_CHARS word characters lower-cased
+        with URLs, punctuation, whitespace and digits dropped (CJK characters are
+        kept), and the part of the text they were taken from. Digits are left to
+        identifying_numbers(), so a stray publish time does not move the SimHash.
+    """
+    text = URL_RE.sub('', text.lower())
+    normalized = ''
+    end = 0
+    for match in WORD_RE.finditer(text):
+        word = DIGITS_RE.sub('', match.group())
+        if not word:
+            continue
+        word = word[:FINGERPRINT_CHARS - len(normalized)]
+        normalized += word
+        end = match.end()
+        if len(normalized) >= FINGERPRINT_CHARS:
+            break
+    return normalized, text[:end]
+
+
+def identifying_numbers(text):
+    """
+    Dates and issue numbers mentioned in a text, as a sorted, space-separated
+    string of kind:value tokens (e.g. "date:10-17 期:1").
+    """
+    tokens = set()
+    for pattern in DATE_PATTERNS:
+        for month, day in pattern.findall(text):
+            tokens.add(f"date:{int(month)}-{int(day)}")
+    for number, kind in ORDINAL_RE.findall(text):
+        tokens.add(f"{kind}:{int(number)}")
+    return ' '.join(sorted(tokens))
+
+
+def numbers_conflict(a, b):
+    """
+    True if two identifying_numbers() strings name different instances: both
+    mention a kind of number (a date, an issue) but share no value of it.
+    A number only one copy mentions, such as a page's own publish date, does
+    not count against a match.
+    """
+    def by_kind(numbers):
+        kinds = {}
+        for token in numbers.split():
+            kind, sep, value = token.partition(':')
+            if sep:
+                kinds.setdefault(kind, set()).add(value)
+        return kinds
+
+    a_kinds, b_kinds = by_kind(a), by_kind(b)
+    return any(not values & b_kinds[kind] for kind, values in a_kinds.items() if kind in b_kinds)
+
+
+def simhash(text):
+    """64-bit SimHash over character shingles of normalised text."""
+    weights = [0] * FINGERPRINT_BITS
+    shingles = {text[i:i + SHINGLE_SIZE] for i in range(max(1, len(text) - SHINGLE_SIZE + 1))}
+    for shingle in shingles:
+        value = int.from_bytes(hashlib.blake2b(shingle.encode('utf-8'), digest_size=8).digest(), 'big')
+        for bit in range(FINGERPRINT_BITS):
+            if value >> bit & 1:
+                weights[bit] += 1
+            else:
+                weights[bit] -= 1
+    return sum(1 << bit for bit, weight in enumerate(weights) if weight > 0)
+
+
+def post_fingerprint(post):
+    """
+    Fingerprint a post's title and opening text.
+
+    Returns:
+        (simhash, numbers), or None if there is too little text. Templated
+        announcements (maintenance on 10月17日 and 10月24日, 第1期 and 第2期 of an
+        event) differ in only a few characters, so their SimHashes are close;
+        they are told apart by the dates and issue numbers they mention.
+    """
+    title = '' if post.get('untitled') else post['title']
+    text, raw = opening(f"{title}\n{post.get('text', '')}")
+    if len(text) < MIN_NORMALIZED_CHARS:
+        return None
+    return simhash(text), identifying_numbers(raw)
+
+
+def distance(a, b):
+    return bin(a ^ b).count('1')
+
+
+class FingerprintIndex:
+    def __init__(self, max_distance=DEFAULT_MAX_DISTANCE):
+        """
+        Find fingerprints within max_distance bits whose numbers do not conflict
+        without comparing against every entry.
+
+        SimHashes are split into max_distance + 1 bands; two SimHashes that
+        differ in at most max_distance bits must agree exactly on at least one band,
+        so only entries sharing a band are compared.
+        """
+        self.max_distance = max_distance
+        bands = max_distance + 1
+        width = FINGERPRINT_BITS // bands
+        self.bands = [(index * width, FINGERPRINT_BITS if index == bands - 1 else (index + 1) * width) for index in range(bands)]
+        self.buckets = {}
+
+    def _keys(self, fingerprint):
+        value, _ = fingerprint
+        for index, (start, end) in enumerate(self.bands):
+            yield index, (value >> start) & ((1 << (end - start)) - 1)
+
+    def add(self, fingerprint, item):
+        for key in self._keys(fingerprint):
+            self.buckets.setdefault(key, []).append((fingerprint, item))
+
+    def find(self, fingerprint):
+        """Return the items of every stored fingerprint within max_distance, closest first."""
+        value, numbers = fingerprint
+        matches = {}
+        for key in self._keys(fingerprint):
+            for (other, other_numbers), item in self.buckets.get(key, []):
+                if numbers_conflict(numbers, other_numbers):
+                    continue
+                d = distance(value, other)
+                if d <= self.max_distance:
+                    matches[id(item)] = (d, item)
+        return [item for _, item in sorted(matches.values(), key=lambda match: match[0])]
+
+
+class PostClusterer:
+    def __init__(self, previous=(), max_distance=DEFAULT_MAX_DISTANCE):
+        """
+        Group near-duplicate posts from different sources as they arrive.
+
+        Args:
+            previous: (source_key, source_name, link, fingerprint) of recently delivered posts
+            max_distance: Maximum SimHash distance of a duplicate (None disables detection)
+
+        Only services with 'dedup' set take part; every other post is its own cluster.
+        """
+        self.max_distance = max_distance
+        self.index = FingerprintIndex(max_distance or 0)
+        for source_key, source_name, link, fingerprint in previous:
+            self.index.add(fingerprint, {'previous': (source_key, source_name, link)})
+
+    def add(self, svc, post):
+        """
+        Assign a post to a cluster and set post['fingerprint'].
+
+        Returns:
+            The cluster, a dict with 'members' (list of (svc, post) in arrival
+            order, this post last) and 'previous' (matching earlier deliveries
+            from other sources). A cluster never holds two posts of one source.
+        """
+        fingerprint = post_fingerprint(post) if self.max_distance is not None and svc.get('dedup') else None
+        post['fingerprint'] = fingerprint
+        cluster = None
+        earlier = []
+        if fingerprint is not None:
+            for match in self.index.find(fingerprint):
+                if 'previous' in match:
+                    if match['previous'][0] != svc['history_key']:
+                        earlier.append(match['previous'])
+                elif cluster is None and all(member_svc is not svc for member_svc, _ in match['cluster']['members']):
+                    cluster = match['cluster']
+
+        if cluster is None:
+            cluster = {'members': [], 'previous': []}
+            if fingerprint is not None:
+                self.index.add(fingerprint, {'cluster': cluster})
+        cluster['members'].append((svc, post))
+        cluster['previous'].extend(item for item in earlier if item not in cluster['previous'])
+        return cluster
@@ -0,0 +1,97 @@
+import os
+import json
+from services.discord_dispatcher import DiscordDispatcher
+
+DESTINATIONS_FILE = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'destinations.json')
+# The destination that keeps using the plain per-source history keys
+DEFAULT_DESTINATION = 'default'
+DEFAULT_LANGUAGE = 'vi'
+# Language the sources are translated from
+SOURCE_LANGUAGE = 'zh-cn'
+
+# Embed wording per output language ("Read more on <source>", "Source: <author>")
+LABELS = {
+    'vi': {'more': 'Xem thêm trên', 'source': 'Nguồn'},
+    'en': {'more': 'Read more on', 'source': 'Source'},
+    'zh-cn': {'more': '在此查看更多', 'source': '来源'},
+}
+
+
+class Destination:
+    def __init__(self, name, webhook_url, language=DEFAULT_LANGUAGE, sources=None, include=None, exclude=None):
+        """
+        One webhook that receives posts, in one language, with its own filters and dedup state.
+
+        Args:
+            name: Unique name; 'default' shares history with the single-webhook setup
+            webhook_url: Discord webhook URL
+            language: Target language code for titles and descriptions
+            sources: History keys or names of the sources to deliver (None = all)
+            include: Keywords of which at least one must appear in the title or text
+            exclude: Keywords that drop a post when they appear in the title or text
+        """
+        self.name = name
+        self.webhook_url = webhook_url
+        self.language = language
+        self.sources = set(sources) if sources else None
+        self.include = [keyword.lower() for keyword in include or []]
+        self.exclude = [keyword.lower() for keyword in exclude or []]
+        self.labels = LABELS.get(language, LABELS['en'])
+        # Each webhook has its own queue and rate limit bucket
+        self.dispatcher = DiscordDispatcher(webhook_url, name=None if name == DEFAULT_DESTINATION else name)
+
+    def state_key(self, svc):
+        """History key holding this destination's watermark or seen IDs for a source."""
+        if self.name == DEFAULT_DESTINATION:
+            return svc['history_key']
+        return f"{svc['history_key']}@{self.name}"
+
+    def subscribes(self, svc):
+        return self.sources is None or svc['history_key'] in self.sources or svc['name'] in self.sources
+
+    def wants(self, post):
+        """Apply the keyword filters to a post."""
+        if not self.include and not self.exclude:
+            return True
+        haystack = f"{post['title']}\n{post.get('text', '')}".lower()
+        if self.include and not any(keyword in haystack for keyword in self.include):
+            return False
+        return not any(keyword in haystack for keyword in self.exclude)
+
+
+def load_destinations(path=DESTINATIONS_FILE, webhook_url=None):
+    """
+    Load the destinations file, or fall back to a single Vietnamese destination.
+
+    The file is a JSON list of objects with name, webhook_url (or webhook_url_env,
+    the name of an environment variable holding it), and optional language,
+    sources, include and exclude.
+
+    Returns:
+        List of Destination (empty if nothing is configured)
+    """
+    if not path or not os.path.exists(path):
+        return [Destination(DEFAULT_DESTINATION, webhook_url)] if webhook_url else []
+
+    with open(path, 'r', encoding='utf-8') as f:
+        config = json.load(f)
+
+    destinations = []
+    for entry in config:
+        url = entry.get('webhook_url') or os.getenv(entry.get('webhook_url_env', ''))
+        if not url:
+            print(f"Skipping destination '{entry.get('name')}': no webhook URL configured")
+            continue
+        destinations.append(Destination(
+            entry.get('name', DEFAULT_DESTINATION),
+            url,
+            language=entry.get('language', DEFAULT_LANGUAGE),
+            sources=entry.get('sources'),
+            include=entry.get('include'),
+            exclude=entry.get('exclude'),
+        ))
+
+    names = [destination.name for destination in destinations]
+    if len(names) != len(set(names)):
+        raise ValueError(f"Destination names must be unique: {names}")
+    return destinations
@@ -0,0 +1,168 @@
+import re
+import threading
+from services import metrics
+from services.translator import split_text
+from services.discord_dispatcher import MAX_CHARS_PER_MESSAGE
+
+# Discord embed limits
+TITLE_LIMIT = 256
+DESCRIPTION_LIMIT = 4096
+EMBED_LIMIT = MAX_CHARS_PER_MESSAGE
+# Characters of post text shown in an embed; the rest is behind the "read more" link
+DESCRIPTION_CHARS = 1000
+ELLIPSIS = '...'
+
+# Translated characters per source character: a CJK character becomes a whole word,
+# other text (English Reddit posts, links) stays about as long
+CJK_EXPANSION = {'vi': 3.0, 'en': 2.8}
+DEFAULT_CJK_EXPANSION = 3.0
+OTHER_EXPANSION = 1.2
+CJK_RE = re.compile(r'[\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uff00-\uffef]')
+# Weight of the newest measurement in the running correction of those estimates
+EXPANSION_SMOOTHING = 0.3
+# Slices shorter than this are too noisy to learn an expansion from
+MIN_SAMPLE_CHARS = 50
+# Share of the budget the first slice aims for, leaving room for a longer translation than estimated
+SLICE_TARGET = 0.9
+# Texts expected to overflow by less than this factor are translated whole and trimmed,
+# which costs a little extra text but never a top-up round
+WHOLE_TEXT_SLACK = 1.25
+# Extra rounds translating the next slice when the first came out short (each costs a
+# translation round trip), and the smallest unused budget worth one
+MAX_TOP_UPS = 1
+MIN_TOP_UP_CHARS = 250
+
+
+def estimate_length(text, dest):
+    """Expected length of text once translated into dest."""
+    cjk = len(CJK_RE.findall(text))
+    return cjk * CJK_EXPANSION.get(dest, DEFAULT_CJK_EXPANSION) + (len(text) - cjk) * OTHER_EXPANSION
+
+
+def trim_text(text, max_chars):
+    """
+    Shorten text to at most max_chars, ending with '...' at a sentence boundary
+    (or a word boundary if the last sentence ends before half the limit).
+    """
+    if len(text) <= max_chars:
+        return text
+    limit = max_chars - len(ELLIPSIS)
+    head = split_text(text, limit)[0][0].rstrip()
+    if len(head) < limit // 2:
+        head = text[:limit]
+        if ' ' in head[limit // 2:]:
+            head = head[:head.rindex(' ')]
+        head = head.rstrip()
+    return head + ELLIPSIS
+
+
+def fit_embed(embed):
+    """Clamp an embed's title, description and total length to Discord's limits."""
+    embed['title'] = trim_text(embed.get('title', ''), TITLE_LIMIT)
+    embed['description'] = trim_text(embed.get('description', ''), DESCRIPTION_LIMIT)
+    other = len(embed['title']) + len(embed.get('footer', {}).get('text', ''))
+    if other + len(embed['description']) > EMBED_LIMIT:
+        embed['description'] = trim_text(embed['description'], EMBED_LIMIT - other)
+    return embed
+
+
+class EmbedBudget:
+    def __init__(self, description_chars=DESCRIPTION_CHARS):
+        """
+        Translate only as much of each post as its embed can show.
+
+        The source text is cut at a sentence boundary to the length expected to
+        fill description_chars once translated, estimated from its share of CJK
+        characters and corrected by how far earlier estimates for the same
+        language pair were off. A translation that comes
+        out short is topped up with the next slice; one that overflows is trimmed.
+
+        Args:
+            description_chars: Characters of translated text shown per embed
+        """
+        self.description_chars = description_chars
+        self.lock = threading.Lock()
+        self.corrections = {}
+
+    def _estimate(self, text, src, dest):
+        with self.lock:
+            correction = self.corrections.get((src, dest), 1.0)
+        return estimate_length(text, dest) * correction
+
+    def _learn(self, src, dest, source, translated):
+        # A failed translation comes back unchanged and says nothing about the ratio
+        if len(source) < MIN_SAMPLE_CHARS or translated == source:
+            return
+        ratio = len(translated) / estimate_length(source, dest)
+        with self.lock:
+            current = self.corrections.get((src, dest), 1.0)
+            self.corrections[(src, dest)] = current + EXPANSION_SMOOTHING * (ratio - current)
+
+    def _slice(self, text, budget, src, dest):
+        """
+        Return (slice, rest, joiner): the start of text expected to fit budget
+        translated characters, the text after it, and how to join their translations.
+        """
+        estimate = self._estimate(text, src, dest)
+        if estimate <= budget * WHOLE_TEXT_SLACK:
+            return text, '', ''
+        limit = max(1, int(budget * SLICE_TARGET * len(text) / estimate))
+        piece, separator = split_text(text, limit)[0]
+        rest = text[len(piece) + len(separator):]
+        return piece, rest, separator if '\n' in separator else ' '
+
+    def translate_posts(self, translator, posts, dest, src):
+        """
+        Translate the titles and budgeted descriptions of several posts.
+
+        Args:
+            translator: TranslationService
+            posts: Posts with 'title' and optional 'text'
+
+        Returns:
+            List of (title, description) fitting the embed limits, in the order of `posts`
+        """
+        budget = self.description_chars
+        states = []
+        for post in posts:
+            piece, rest, joiner = self._slice(post.get('text', ''), budget, src, dest)
+            states.append({'piece': piece, 'rest': rest, 'joiner': joiner, 'output': ''})
+
+        texts = []
+        for post, state in zip(posts, states):
+            texts.extend([post['title'], state['piece']])
+        translations = translator.translate_batch(texts, dest=dest, src=src)
+        titles = [trim_text(title, TITLE_LIMIT) for title in translations[0::2]]
+        translations = translations[1::2]
+
+        pending = states
+        for round_index in range(MAX_TOP_UPS + 1):
+            if round_index:
+                metrics.count('budget_top_ups', len(pending))
+                translations = translator.translate_batch([state['piece'] for state in pending], dest=dest, src=src)
+
+            topping_up = []
+            for state, translated in zip(pending, translations):
+                self._learn(src, dest, state['piece'], translated)
+                if state['output']:
+                    state['output'] += state['previous_joiner']
+                state['output'] += translated
+                remaining = budget - len(state['output']) - len(state['joiner'])
+                if state['rest'] and remaining >= MIN_TOP_UP_CHARS and round_index < MAX_TOP_UPS:
+                    # The translation came out short: translate the next slice of the source too
+                    state['previous_joiner'] = state['joiner']
+                    state['piece'], state['rest'], state['joiner'] = self._slice(state['rest'], remaining, src, dest)
+                    topping_up.append(state)
+            pending = topping_up
+            if not pending:
+                break
+
+        metrics.count('budget_skipped_chars', sum(len(state['rest']) for state in states))
+        descriptions = []
+        for state in states:
+            description = state['output']
+            if state['rest'] and len(description) + len(ELLIPSIS) <= budget:
+                # Cut mid-story: mark the omission
+                description = description.rstrip() + ELLIPSIS
+            descriptions.append(trim_text(description, budget))
+        return list(zip(titles, descriptions))
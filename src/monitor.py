@@ -1,169 +1,851 @@
+import time
+# Taken before any other import so --startup-profile covers module loading
+STARTED_AT = time.perf_counter()
+
 import os
 import json
-import time
-import requests
+import argparse
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
-from services.googlenews import GoogleNewsService
-from services.official import OfficialService
-from services.dashen import DashenService
-from services.reddit_rss import RedditRSSService as RedditService
-from services.translator import TranslationService
+from services import http_client, metrics
+from services.http_cache import HttpCache
+from services.discord_dispatcher import DiscordDispatcher
+from services.fetcher import fetch_all
+from state_store import StateStore
+from dedup import PostClusterer, DEFAULT_MAX_DISTANCE
+from embed_budget import EmbedBudget, DESCRIPTION_CHARS, trim_text, fit_embed
+from destinations import load_destinations, DESTINATIONS_FILE as DEFAULT_DESTINATIONS_FILE, SOURCE_LANGUAGE
+from scheduler import AdaptiveScheduler
+from circuit_breaker import CircuitBreaker, call_with_retry, RETRY_ATTEMPTS as DEFAULT_RETRY_ATTEMPTS, RETRY_BUDGET as DEFAULT_RETRY_BUDGET
+from source_registry import LazyInstance, IMPORT_TIMES, CONSTRUCT_TIMES
 from datetime import datetime
 
+IMPORTS_DONE_AT = time.perf_counter()
+
 # Load env
 load_dotenv()
 
-HISTORY_FILE = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'history.json')
+# Concurrency settings for source polling
+POLL_CONCURRENCY = int(os.getenv('POLL_CONCURRENCY', '5'))  # 1 = old sequential behaviour
+SOURCE_TIMEOUT = float(os.getenv('SOURCE_TIMEOUT', '60'))   # Default per-source deadline (seconds)
+DETAIL_WORKERS = int(os.getenv('DETAIL_WORKERS', '4'))      # Parallel article fetches inside a source
+# Posts buffered between two pipeline stages (poll -> route -> translate -> dispatch)
+PIPELINE_QUEUE_SIZE = int(os.getenv('PIPELINE_QUEUE_SIZE', '16'))
 
-def load_history():
-    if os.path.exists(HISTORY_FILE):
-        try:
-            with open(HISTORY_FILE, 'r') as f:
-                return json.load(f)
-        except:
-            pass
-    return {}
+# Translation backend ('google', or 'offline' to echo texts locally for tests and benchmarks)
+TRANSLATION_ENGINE = os.getenv('TRANSLATION_ENGINE', 'google')
+TRANSLATION_WORKERS = int(os.getenv('TRANSLATION_WORKERS', '4'))          # Translation requests in flight
+TRANSLATION_CHUNK_CHARS = int(os.getenv('TRANSLATION_CHUNK_CHARS', '1500'))  # Longer texts are split and translated in parallel
+OFFLINE_TRANSLATION_LATENCY = float(os.getenv('OFFLINE_TRANSLATION_LATENCY', '0'))  # Simulated seconds per offline request
+
+# Retries of a failing source within one run, and skipping of sources that keep failing
+RETRY_ATTEMPTS = int(os.getenv('RETRY_ATTEMPTS', str(DEFAULT_RETRY_ATTEMPTS)))
+RETRY_BUDGET = float(os.getenv('RETRY_BUDGET', str(DEFAULT_RETRY_BUDGET)))  # Seconds in which retries may start
+CIRCUIT_BREAKER_ENABLED = os.getenv('CIRCUIT_BREAKER', '1') == '1'
+
+# Shared HTTP client settings
+HTTP2_ENABLED = os.getenv('HTTP2', '0') == '1'
+HTTP_PREWARM = os.getenv('HTTP_PREWARM', '1') == '1'
+HTTP_CACHE_ENABLED = os.getenv('HTTP_CACHE', '1') == '1'
+# Send every upstream request to a local replay server instead (see scripts/benchmark_monitor.py)
+REPLAY_BASE_URL = os.getenv('REPLAY_BASE_URL')
+
+# Per-stage timings and counters, written after every cycle when a path is set
+METRICS_JOURNAL = os.getenv('METRICS_JOURNAL')    # JSONL run journal, one line per cycle
+METRICS_TEXTFILE = os.getenv('METRICS_TEXTFILE')  # Prometheus textfile (e.g. for node_exporter)
 
-def save_history(data):
-    os.makedirs(os.path.dirname(HISTORY_FILE), exist_ok=True)
-    with open(HISTORY_FILE, 'w') as f:
-        json.dump(data, f, indent=4)
+# Webhooks, languages and filters to fan posts out to (falls back to WEBHOOK_URL in Vietnamese)
+DESTINATIONS_FILE = os.getenv('DESTINATIONS_FILE', DEFAULT_DESTINATIONS_FILE)
+
+# Collapse the same story found on several sources into one embed
+DEDUP_ENABLED = os.getenv('DEDUP', '1') == '1'
+DEDUP_MAX_DISTANCE = int(os.getenv('DEDUP_MAX_DISTANCE', str(DEFAULT_MAX_DISTANCE)))
+# Seconds a post that may have copies on other sources is held back so they can be merged into it
+DEDUP_WINDOW = float(os.getenv('DEDUP_WINDOW', '3'))
+
+# NetEase Dashen users to follow; the first keeps the original source name and history key
+DASHEN_USER_IDS = [user_id.strip() for user_id in os.getenv('DASHEN_USER_IDS', 'c47870f2c5f142a58ea746fbc4655165').split(',') if user_id.strip()]
+
+# Comma-separated history keys of sources to skip (they are never imported)
+DISABLED_SOURCES = {key.strip() for key in os.getenv('DISABLED_SOURCES', '').split(',') if key.strip()}
+
+# Route of a story for a destination that was skipped or filtered out (see run_cycle)
+HANDLED = 'handled'
 
 def send_discord_webhook(webhook_url, content=None, embed=None):
     if not webhook_url:
         print("No Webhook URL provided.")
         return
 
-    data = {}
-    if content:
-        data["content"] = content
-    if embed:
-        data["embeds"] = [embed]
+    if DiscordDispatcher(webhook_url).send(content=content, embeds=[embed] if embed else None):
+        print("Webhook sent successfully.")
 
-    try:
-        response = requests.post(webhook_url, json=data)
-        if response.status_code == 204:
-            print("Webhook sent successfully.")
+def get_last_check(store, svc, key=None):
+    """Return the stored watermark (timestamp or set of seen IDs) for a service."""
+    key = key or svc['history_key']
+    if svc.get('history_type', 'timestamp') == 'ids':
+        return store.get_seen_ids(key)
+    return store.get_watermark(key, time.time() - 86400)
+
+def combine_last_checks(svc, last_checks):
+    """
+    Merge the watermarks of every destination of a source so one poll serves them all:
+    the oldest timestamp, or only the IDs every destination has already seen.
+    """
+    if svc.get('history_type', 'timestamp') == 'ids':
+        return set.intersection(*last_checks)
+    return min(last_checks)
+
+def is_new_post(svc, post, last_check):
+    if svc.get('history_type', 'timestamp') == 'ids':
+        return post['post_id'] not in last_check
+    return post['timestamp'] > last_check
+
+def commit_post(store, svc, post, key=None):
+    """Record a dispatched post in the state store (one transaction per post)."""
+    key = key or svc['history_key']
+    if svc.get('history_type', 'timestamp') == 'ids':
+        store.add_seen_id(key, post['post_id'])
+    else:
+        # Merged and filtered posts are committed out of timestamp order
+        store.advance_watermark(key, post['timestamp'])
+
+def upgrade_watermarks(store, services, destinations):
+    """
+    Convert the stored watermarks of sources whose timestamps changed meaning.
+
+    A source with 'watermark_format' above the format recorded for a state key
+    has its watermark converted once by the service's upgrade_watermark; a
+    conversion that fails is retried on the next run.
+    """
+    for svc in services:
+        version = svc.get('watermark_format')
+        if not version:
+            continue
+        for dest in destinations:
+            key = dest.state_key(svc)
+            meta_key = f"watermark_format:{key}"
+            if not dest.subscribes(svc) or int(store.get_meta(meta_key) or 1) >= version:
+                continue
+            old = store.get_watermark(key)
+            if old is not None:
+                new = svc['instance'].get().upgrade_watermark(old)
+                if new is None:
+                    continue
+                if new != old:
+                    print(f"Converted watermark of {key} from {datetime.fromtimestamp(old)} to {datetime.fromtimestamp(new)}")
+                    store.set_watermark(key, new)
+            store.set_meta(meta_key, version)
+
+def get_prewarm_urls(services):
+    """Collect the upstream URLs of every configured service without loading it."""
+    return [svc['url'] for svc in services if svc.get('url')]
+
+def print_connection_stats():
+    for host, stats in sorted(http_client.get_client().connection_stats().items()):
+        print(f"HTTP {host}: {stats['requests']} requests, {stats['connections']} connections, {stats['reused']} reused")
+
+def print_cache_stats():
+    cache = http_client.get_client().cache
+    if cache is not None:
+        stats = cache.stats()
+        print(f"HTTP cache: {stats['hits']} fresh hits, {stats['revalidated']} unchanged, {stats['misses']} downloads, {stats['entries']} entries ({stats['bytes']} bytes)")
+
+def create_translator():
+    """Lazily created TranslationService using the configured engine."""
+    options = {'latency': OFFLINE_TRANSLATION_LATENCY} if TRANSLATION_ENGINE == 'offline' else None
+    return LazyInstance(
+        "services.translator.TranslationService",
+        engine=TRANSLATION_ENGINE,
+        engine_options=options,
+        workers=TRANSLATION_WORKERS,
+        chunk_chars=TRANSLATION_CHUNK_CHARS,
+    )
+
+def print_translation_stats(translator):
+    if translator.loaded:
+        translator.get().report()
+
+def iter_source(svc, last_check):
+    """Yield (svc, post) for each new post of one source as soon as it is ready."""
+    print(f"--- Checking {svc['name']} ---")
+    for post in svc['instance'].get().iter_new_posts(last_check):
+        yield svc, post
+
+def iter_feeds(group, last_checks):
+    """
+    Poll sources that share one instance (e.g. subreddits of one combined r/a+b
+    listing) with a single iter_new_posts_by_feed call and route each post back
+    to its source by svc['feed'].
+    """
+    print(f"--- Checking {', '.join(svc['name'] for svc in group)} ---")
+    by_feed = {svc['feed']: svc for svc in group}
+    posts = group[0]['instance'].get().iter_new_posts_by_feed(
+        {svc['feed']: last_check for svc, last_check in zip(group, last_checks)}
+    )
+    for feed, post in posts:
+        yield by_feed[feed], post
+
+def group_services(services):
+    """
+    Group service indices into poll jobs: services with a 'feed' that share an
+    instance are fetched together, every other service on its own.
+    """
+    jobs = []
+    shared = {}
+    for index, svc in enumerate(services):
+        if svc.get('feed') is not None:
+            key = id(svc['instance'])
+            if key in shared:
+                jobs[shared[key]].append(index)
+                continue
+            shared[key] = len(jobs)
+        jobs.append([index])
+    return jobs
+
+def job_key(group):
+    """Circuit breaker key of a poll job: the history keys of its sources."""
+    return '+'.join(svc['history_key'] for svc in group)
+
+def poll_job(group, last_checks, emit, store=None):
+    """
+    Poll one job, handing each new post to emit(svc, post) as soon as it is ready.
+
+    SourceUnavailable errors are retried within RETRY_BUDGET as long as no post
+    was handed on yet. With a store, the job's circuit breaker is consulted
+    first: an open circuit skips the poll and a half-open one allows a single
+    probe without retries. emit returns False to stop the poll early.
+
+    Returns:
+        False if the circuit breaker skipped the job, True otherwise
+    """
+    breaker = CircuitBreaker(store, job_key(group)) if store is not None and CIRCUIT_BREAKER_ENABLED else None
+    if breaker is not None and not breaker.allow():
+        retry_at = datetime.fromtimestamp(breaker.retry_at())
+        print(f"Skipping {', '.join(svc['name'] for svc in group)}: circuit open until {retry_at:%H:%M}")
+        for svc in group:
+            metrics.count('circuit_skipped', source=svc['history_key'])
+        return False
+
+    def poll():
+        if group[0].get('feed') is not None:
+            posts = iter_feeds(group, last_checks)
         else:
-            print(f"Webhook failed: {response.status_code} - {response.text}")
-    except Exception as e:
-        print(f"Webhook exception: {e}")
+            posts = iter_source(group[0], last_checks[0])
+        emitted = 0
+        token = metrics.set_source(job_key(group))
+        try:
+            with metrics.span('poll'):
+                for svc, post in posts:
+                    emitted += 1
+                    if not emit(svc, post):
+                        break
+        except http_client.SourceUnavailable as e:
+            # Posts already handed on would be fetched and delivered twice
+            if emitted:
+                e.retryable = False
+            raise
+        finally:
+            posts.close()
+            metrics.reset_source(token)
 
-def main():
-    # Configuration
-    WEBHOOK_URL = os.getenv('WEBHOOK_URL')
+    attempts = 1 if breaker is not None and breaker.probing else RETRY_ATTEMPTS
+    try:
+        call_with_retry(poll, retry_on=(http_client.SourceUnavailable,), attempts=attempts, budget=RETRY_BUDGET)
+    except http_client.SourceUnavailable as e:
+        if breaker is not None:
+            breaker.record_failure(e)
+        raise
+    if breaker is not None:
+        breaker.record_success()
+    return True
 
-    if not WEBHOOK_URL:
-        print("Missing WEBHOOK_URL in environment. Please check .env file.")
-        return
+def poll_services(services, last_checks, inbox, store=None):
+    """
+    Start polling every service concurrently, streaming results into `inbox`.
+
+    Each poll job (one source, or several fetched by one combined request) puts
+    ('post', job, svc, post) for every new post, in the source's order, and ends
+    with ('done', job, None, None), ('skipped', job, None, None) when its circuit
+    breaker is open, or ('error', job, None, exception).
+
+    Returns:
+        (jobs, states, executor): the service indices of each job, per job a dict
+        whose 'deadline' is set once the job starts and whose 'abandoned' flag
+        makes it stop handing on posts, and the executor to shut down afterwards
+    """
+    jobs = group_services(services)
+    states = [{'deadline': None, 'abandoned': False} for _ in jobs]
+    workers = max(1, min(POLL_CONCURRENCY, len(jobs)))
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="poll")
+
+    def run(job, indices):
+        state = states[job]
+        group = [services[index] for index in indices]
+        # The deadline only starts once the job leaves the executor queue
+        state['deadline'] = time.monotonic() + max(svc.get('timeout', SOURCE_TIMEOUT) for svc in group)
+
+        def send(message):
+            # Never block forever on a full queue once the job was given up on
+            while not state['abandoned']:
+                try:
+                    inbox.put(message, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        try:
+            polled = poll_job(group, [last_checks[index] for index in indices],
+                              lambda svc, post: send(('post', job, svc, post)), store)
+            send(('done' if polled else 'skipped', job, None, None))
+        except Exception as e:
+            send(('error', job, None, e))
+
+    for job, indices in enumerate(jobs):
+        executor.submit(run, job, indices)
+    return jobs, states, executor
+
+def build_services(destinations=None):
+    """
+    Return the configuration of every enabled source that some destination subscribes to.
 
-    history = load_history()
-    translator = TranslationService()
-    
-    # Define Stable Services to monitor
-    services_to_check = [
+    Service classes are only imported and constructed when a source is first polled.
+    Sources with a 'feed' that share an instance are polled together by one call.
+    """
+    # Every subreddit comes from one combined r/a+b listing, split back per subreddit
+    reddit = LazyInstance("services.reddit_rss.RedditRSSService", ["WhereWindsMeet", "wherewindsmeet_"], post_limit=5)
+    # Dashen users are polled concurrently by one service, each with its own watermark
+    dashen = LazyInstance("services.dashen.DashenService", DASHEN_USER_IDS)
+    services = [
         {
             "name": "Official Website",
-            "instance": OfficialService(),
+            "instance": LazyInstance("services.official.OfficialService", max_workers=DETAIL_WORKERS),
+            "url": "https://www.yysls.cn/news/",
             "history_key": "last_official_time",
+            # 2: real publish times instead of date + (ID % 86400)
+            "watermark_format": 2,
+            "dedup": True,
             "color": 15844367 # Gold
         },
         {
             "name": "17173.com",
-            "instance": GoogleNewsService("燕云十六声"),
+            "instance": LazyInstance("services.googlenews.GoogleNewsService", "燕云十六声", max_workers=DETAIL_WORKERS),
+            "url": "https://news.google.com/",
             "history_key": "last_google_news_time",
+            "dedup": True,
             "color": 16750848 # 17173 Orange
         },
-        {
-            "name": "NetEase Dashen",
-            "instance": DashenService("c47870f2c5f142a58ea746fbc4655165"),
-            "history_key": "last_dashen_time",
+        *[{
+            "name": "NetEase Dashen" if index == 0 else f"NetEase Dashen ({user_id[:8]})",
+            "instance": dashen,
+            "feed": user_id,
+            # Host of the feed endpoint, the first request of every poll
+            "url": "https://inf.ds.163.com/",
+            "history_key": "last_dashen_time" if index == 0 else f"last_dashen_time_{user_id}",
+            "dedup": True,
             "color": 15484743 # Dashen Red
-        },
+        } for index, user_id in enumerate(DASHEN_USER_IDS)],
         {
             "name": "Reddit r/WhereWindsMeet",
-            "instance": RedditService("WhereWindsMeet", post_limit=5),
+            "instance": reddit,
+            "feed": "WhereWindsMeet",
+            "url": "https://www.reddit.com/",
             "history_key": "seen_reddit_wherewindsmeet_ids",
             "history_type": "ids",
             "color": 16729344 # Reddit Orange
         },
         {
             "name": "Reddit r/wherewindsmeet_",
-            "instance": RedditService("wherewindsmeet_", post_limit=5),
+            "instance": reddit,
+            "feed": "wherewindsmeet_",
+            "url": "https://www.reddit.com/",
             "history_key": "seen_reddit_wherewindsmeet_alt_ids",
             "history_type": "ids",
             "color": 16729344 # Reddit Orange
         }
     ]
+    services = [svc for svc in services if svc['history_key'] not in DISABLED_SOURCES]
+    if destinations is not None:
+        services = [svc for svc in services if any(dest.subscribes(svc) for dest in destinations)]
+    return services
+
+def build_embed(svc, post, destination, duplicates=()):
+    """
+    Build the Discord embed of a post in the destination's language.
+
+    Args:
+        duplicates: (svc, post) copies of the same story from other sources, linked below it
+    """
+    title, description = post.get('translations', {}).get(destination.language, (post['title'], post.get('text', '')))
+
+    # Translations already fit the budget; untranslated text is cut at a sentence boundary
+    description = trim_text(description, DESCRIPTION_CHARS)
+
+    links = [f"[{destination.labels['more']} {source['name']}]({copy['link']})"
+             for source, copy in [(svc, post), *duplicates]]
+    description = f"{description}\n\n" + "\n".join(links)
+
+    return fit_embed({
+        "title": title,
+        "description": description,
+        "url": post['link'],
+        "color": svc.get("color", 3447003),
+        "timestamp": datetime.fromtimestamp(post['timestamp']).isoformat(),
+        "footer": {"text": f"{destination.labels['source']}: {post['author']}"}
+    })
 
-    for svc in services_to_check:
+def translate_posts(translator, deliveries, budget):
+    """
+    Translate every delivered post once per target language, however many
+    destinations share that language. Results go to post['translations'][language].
+
+    Only the part of each text that fits an embed is translated (see EmbedBudget).
+    """
+    by_language = {}
+    for delivery in deliveries:
+        language = delivery['destination'].language
+        post = delivery['post']
+        # Posts translated in an earlier batch (for another destination) are skipped
+        if language != SOURCE_LANGUAGE and language not in post.get('translations', {}):
+            # Keyed by identity: a post delivered to several destinations is translated once
+            by_language.setdefault(language, {})[id(post)] = post
+
+    # The translator (and googletrans with it) is only loaded when there is something to translate
+    for language, posts in by_language.items():
+        posts = list(posts.values())
+        translations = budget.translate_posts(translator.get(), posts, dest=language, src=SOURCE_LANGUAGE)
+        for post, translation in zip(posts, translations):
+            post.setdefault('translations', {})[language] = translation
+
+def drain(inbox, timeout=None):
+    """
+    Wait for the next item of a pipeline queue and take everything queued behind it.
+
+    Returns:
+        List of items (empty if nothing arrived within `timeout` seconds)
+    """
+    try:
+        items = [inbox.get(timeout=timeout)]
+    except queue.Empty:
+        return []
+    while items[-1] is not None:
         try:
-            print(f"--- Checking {svc['name']} ---")
-            # Determine default based on history type
-            history_type = svc.get('history_type', 'timestamp')
-            
-            if history_type == 'ids':
-                default_val = []
-                last_check = history.get(svc['history_key'], default_val)
-                # Ensure it's a list (in case of corruption or type change)
-                if not isinstance(last_check, list):
-                    last_check = []
-            else:
-                default_val = time.time() - 86400
-                last_check = history.get(svc['history_key'], default_val)
-                # Ensure it's a float
-                if not isinstance(last_check, (int, float)):
-                    last_check = default_val
-            
-            new_posts = svc['instance'].get_new_posts(last_check)
-            
-            if new_posts:
-                print(f"Found {len(new_posts)} new posts from {svc['name']}.")
-                for post in new_posts:
-                    # Translate title and description
-                    title_vn = translator.translate(post['title'], dest='vi', src='zh-cn')
-                    
-                    full_text = post.get('text', '')
-                    description_vn = ""
-                    if full_text:
-                        # Translate full text
-                        description_vn = translator.translate(full_text, dest='vi', src='zh-cn')
-                        
-                    # Format description for Discord (limit to ~1000 chars to be safe)
-                    if len(description_vn) > 1000:
-                        description_vn = f"{description_vn[:997]}..."
-                    
-                    description = f"{description_vn}\n\n[Xem thêm trên {svc['name']}]({post['link']})"
-
-                    embed = {
-                        "title": title_vn[:256],
-                        "description": description,
-                        "url": post['link'],
-                        "color": svc.get("color", 3447003),
-                        "timestamp": datetime.fromtimestamp(post['timestamp']).isoformat(),
-                        "footer": {"text": f"Nguồn: {post['author']}"}
-                    }
-                    
-                    send_discord_webhook(WEBHOOK_URL, embed=embed)
-                    
-                    # Update local history
-                    if history_type == 'ids':
-                        if svc['history_key'] not in history or not isinstance(history[svc['history_key']], list):
-                            history[svc['history_key']] = []
-                        history[svc['history_key']].append(post['post_id'])
-                        
-                        # Limit to last 50 IDs to prevent unlimited growth
-                        if len(history[svc['history_key']]) > 50:
-                            history[svc['history_key']] = history[svc['history_key']][-50:]
-                    else:
-                        history[svc['history_key']] = post['timestamp']
-                
-                save_history(history)
-            else:
-                print(f"No new posts from {svc['name']}.")
-                
+            items.append(inbox.get_nowait())
+        except queue.Empty:
+            break
+    return items
+
+def translate_stage(translator, budget, inbox, outbox):
+    """
+    Pipeline stage: translate deliveries as they arrive and pass them on in order.
+
+    Everything queued when the stage wakes up is translated together, so a
+    burst of posts still shares translation requests. None ends the stage.
+    """
+    finished = False
+    while not finished:
+        batch = drain(inbox)
+        if batch[-1] is None:
+            finished = True
+            batch.pop()
+        try:
+            with metrics.span('translate'):
+                translate_posts(translator, batch, budget)
         except Exception as e:
-            print(f"Error checking {svc['name']}: {e}")
+            # Untranslated posts are still delivered in the source language
+            print(f"Error translating posts: {e}")
+        for delivery in batch:
+            outbox.put(delivery)
+    outbox.put(None)
+
+def flush_dispatchers(destinations):
+    """Send every queued embed; destinations have separate rate limit buckets, so they are flushed in parallel."""
+    pending = [dest for dest in destinations if dest.dispatcher.queue]
+    if pending:
+        with metrics.span('dispatch'):
+            fetch_all(lambda dest: dest.dispatcher.flush(), pending, max_workers=len(pending))
+    return bool(pending)
+
+def dispatch_stage(destinations, inbox, on_done, started, polls_done):
+    """
+    Pipeline stage: build embeds as deliveries arrive and send them right away.
+
+    Deliveries that queued up while a message was being sent go out together,
+    packed into as few messages per destination as possible. A delivery is
+    marked sent when its embed is built; later copies of the story are then
+    skipped instead of merged, so a delivery is held back until its 'ready_at'
+    or until every poll has finished. Held deliveries do not block the queue;
+    'ready_at' never decreases within a source, so each source keeps its
+    order. None ends the stage.
+
+    Args:
+        on_done: Callback(destination, copies) once a delivery's message was attempted
+        started: perf_counter() of the cycle start, for the first_post timing
+        polls_done: Event set once no more posts can arrive
+    """
+    first_post = True
+    finished = False
+    held = []
+    while not finished or held:
+        timeout = None
+        if held:
+            timeout = 0 if polls_done.is_set() else max(0, min(delivery['ready_at'] for delivery in held) - time.monotonic())
+        batch = drain(inbox, timeout) if not finished else []
+        if batch and batch[-1] is None:
+            finished = True
+            batch.pop()
+        held.extend(batch)
+
+        now = time.monotonic()
+        ready = [delivery for delivery in held if polls_done.is_set() or delivery['ready_at'] <= now]
+        held = [delivery for delivery in held if not (polls_done.is_set() or delivery['ready_at'] <= now)]
+        for delivery in ready:
+            dest, svc, post = delivery['destination'], delivery['svc'], delivery['post']
+            with delivery['lock']:
+                delivery['sent'] = True
+                duplicates = list(delivery['duplicates'])
+            try:
+                # Each post (and its merged copies) is committed as soon as its message has been attempted
+                copies = [(svc, post), *duplicates]
+                dest.dispatcher.add(build_embed(svc, post, dest, duplicates), on_done=lambda sent, dest=dest, copies=copies: on_done(dest, copies))
+            except Exception as e:
+                print(f"Error preparing {svc['name']} post for {dest.name}: {e}")
+
+        if flush_dispatchers(destinations) and first_post:
+            metrics.record('first_post', time.perf_counter() - started, source='')
+            first_post = False
+
+def run_cycle(services_to_check, store, translator, destinations, budget):
+    """
+    Poll the given services once and stream their new posts through the
+    route, translate and dispatch stages, committing each post for a
+    destination once its message has been attempted.
+
+    The stages run in their own threads with bounded queues in between
+    (PIPELINE_QUEUE_SIZE), so the first embeds leave while other sources and
+    article pages are still being fetched. Each source is fetched once with the
+    oldest watermark of its destinations and yields its posts oldest first;
+    every stage keeps that order. A near-duplicate of a post from another
+    source is merged into that post's embed if it has not been sent yet, and
+    skipped otherwise. Each destination gets the posts that are new to it and
+    pass its filters.
+
+    Returns:
+        List of new posts per service (None where the poll failed, timed out or was skipped)
+    """
+    started = time.perf_counter()
+    subscribers = [[dest for dest in destinations if dest.subscribes(svc)] for svc in services_to_check]
+
+    # Compute every source's last check up front so the fetches can run concurrently
+    dest_checks = [{dest.name: get_last_check(store, svc, dest.state_key(svc)) for dest in dests}
+                   for svc, dests in zip(services_to_check, subscribers)]
+    last_checks = [combine_last_checks(svc, list(checks.values())) if checks else get_last_check(store, svc)
+                   for svc, checks in zip(services_to_check, dest_checks)]
+    checks_by_key = {svc['history_key']: checks for svc, checks in zip(services_to_check, dest_checks)}
+
+    commit_lock = threading.Lock()
+    logged = set()
+
+    def commit(destination, svc, post):
+        with commit_lock:
+            commit_post(store, svc, post, destination.state_key(svc))
+            # The posting rate and fingerprint are recorded once per post, however many destinations get it
+            if id(post) not in logged:
+                logged.add(id(post))
+                store.record_post(svc['history_key'], post['timestamp'])
+                if post.get('fingerprint') is not None:
+                    store.add_fingerprint(svc['history_key'], svc['name'], post['link'], post['fingerprint'])
+
+    def commit_all(destination, copies):
+        for svc, post in copies:
+            commit(destination, svc, post)
+
+    translate_queue = queue.Queue(PIPELINE_QUEUE_SIZE)
+    dispatch_queue = queue.Queue(PIPELINE_QUEUE_SIZE)
+    polls_done = threading.Event()
+    stages = [
+        threading.Thread(target=translate_stage, args=(translator, budget, translate_queue, dispatch_queue), name="translate", daemon=True),
+        threading.Thread(target=dispatch_stage, args=(destinations, dispatch_queue, commit_all, started, polls_done), name="dispatch", daemon=True),
+    ]
+    for stage in stages:
+        stage.start()
+
+    # Copies of the same story across sources are grouped as they arrive, before any translation or webhook work
+    previous = store.get_fingerprints() if DEDUP_ENABLED else []
+    clusterer = PostClusterer(previous, DEDUP_MAX_DISTANCE if DEDUP_ENABLED else None)
+
+    ready_after = {}
+
+    def route(svc, post):
+        """Decide which destination gets a post (route stage, in arrival order)."""
+        cluster = clusterer.add(svc, post)
+        # Per destination: the story's delivery, or HANDLED if it was skipped or filtered out
+        routes = cluster.setdefault('routes', {})
+        checks = checks_by_key[svc['history_key']]
+        for dest in destinations:
+            if dest.name not in checks or not is_new_post(svc, post, checks[dest.name]):
+                continue
+            delivery = routes.get(dest.name)
+            if delivery is HANDLED:
+                commit(dest, svc, post)
+            elif delivery is not None:
+                with delivery['lock']:
+                    merged = not delivery['sent']
+                    if merged:
+                        delivery['duplicates'].append((svc, post))
+                if merged:
+                    print(f"Merged {svc['name']} into {delivery['svc']['name']} post for {dest.name}")
+                else:
+                    print(f"Skipping {svc['name']} post for {dest.name}: already posted from {delivery['svc']['name']} ({delivery['post']['link']})")
+                    commit(dest, svc, post)
+            else:
+                earlier = [(name, link) for key, name, link in cluster['previous'] if dest.subscribes({'history_key': key, 'name': name})]
+                if earlier:
+                    print(f"Skipping {svc['name']} post for {dest.name}: already posted from {earlier[0][0]} ({earlier[0][1]})")
+                    routes[dest.name] = HANDLED
+                    commit(dest, svc, post)
+                elif not dest.wants(post):
+                    # Filtered out: mark it handled so it does not hold the shared watermark back
+                    routes[dest.name] = HANDLED
+                    commit(dest, svc, post)
+                else:
+                    # Only posts that take part in duplicate detection wait for copies from other
+                    # sources, but never ahead of an earlier post of their own source
+                    ready_at = time.monotonic() + DEDUP_WINDOW if post.get('fingerprint') is not None else 0
+                    ready_at = ready_after[svc['history_key']] = max(ready_at, ready_after.get(svc['history_key'], 0))
+                    routes[dest.name] = {'destination': dest, 'svc': svc, 'post': post, 'duplicates': [],
+                                         'ready_at': ready_at, 'sent': False, 'lock': threading.Lock()}
+                    translate_queue.put(routes[dest.name])
+
+    inbox = queue.Queue(PIPELINE_QUEUE_SIZE)
+    jobs, states, executor = poll_services(services_to_check, last_checks, inbox, store)
+    positions = {id(svc): index for index, svc in enumerate(services_to_check)}
+    results = [[] for _ in services_to_check]
+    pending = set(range(len(jobs)))
+    try:
+        while pending:
+            try:
+                kind, job, svc, payload = inbox.get(timeout=0.1)
+            except queue.Empty:
+                kind = None
+
+            if kind is not None and job in pending:
+                names = ', '.join(services_to_check[index]['name'] for index in jobs[job])
+                if kind == 'post':
+                    results[positions[id(svc)]].append(payload)
+                    metrics.count('posts_found', source=svc['history_key'])
+                    route(svc, payload)
+                else:
+                    pending.discard(job)
+                    if kind == 'error':
+                        print(f"Error checking {names}: {payload}")
+                    if kind != 'done':
+                        for index in jobs[job]:
+                            results[index] = None
+
+            # A running request cannot be interrupted, but it is bounded by its own
+            # HTTP timeout; whatever the job still finds is simply discarded.
+            for job in list(pending):
+                deadline = states[job]['deadline']
+                if deadline is not None and time.monotonic() > deadline:
+                    states[job]['abandoned'] = True
+                    pending.discard(job)
+                    names = ', '.join(services_to_check[index]['name'] for index in jobs[job])
+                    print(f"Timed out checking {names} after {max(services_to_check[index].get('timeout', SOURCE_TIMEOUT) for index in jobs[job])}s")
+                    for index in jobs[job]:
+                        results[index] = None
+    finally:
+        # Cancel anything still queued; do not block on abandoned fetches
+        executor.shutdown(wait=False, cancel_futures=True)
+        polls_done.set()
+        translate_queue.put(None)
+        for stage in stages:
+            stage.join()
+
+    for svc, new_posts in zip(services_to_check, results):
+        if new_posts is None:
+            continue
+        if new_posts:
+            print(f"Found {len(new_posts)} new posts from {svc['name']}.")
+        else:
+            print(f"No new posts from {svc['name']}.")
+    return results
+
+def source_health(store, services):
+    """Return the circuit breaker state of every poll job that has failed recently."""
+    health = {}
+    for indices in group_services(services):
+        key = job_key([services[index] for index in indices])
+        state = store.get_health(key)
+        if state and (state['state'] != 'closed' or state['failures']):
+            health[key] = state
+    return health
+
+def print_source_health(health):
+    for key, state in sorted(health.items()):
+        line = f"Circuit {key}: {state['state']}, {state['failures']} failures in a row"
+        if state['state'] == 'open':
+            line += f", next probe at {datetime.fromtimestamp(state['opened_at'] + state['cooldown']):%H:%M}"
+        print(f"{line} (last error: {state['last_error']})")
+
+def setup_metrics():
+    if METRICS_JOURNAL or METRICS_TEXTFILE:
+        metrics.enable()
+
+def export_metrics(**extra):
+    """Write the cycle's spans and counters to the configured journal and textfile."""
+    if METRICS_JOURNAL:
+        metrics.write_journal(METRICS_JOURNAL, **extra)
+    if METRICS_TEXTFILE:
+        metrics.write_prometheus(METRICS_TEXTFILE)
+
+def setup_http(services_to_check, webhook_urls):
+    http_client.configure(
+        http2=HTTP2_ENABLED,
+        cache=HttpCache() if HTTP_CACHE_ENABLED else None,
+        replay_base=REPLAY_BASE_URL
+    )
+
+    if HTTP_PREWARM:
+        # Open connections to every upstream (and Discord) while sources start polling
+        threading.Thread(
+            target=http_client.get_client().prewarm,
+            args=(get_prewarm_urls(services_to_check) + webhook_urls,),
+            daemon=True
+        ).start()
+
+def startup_profile():
+    """Collect import and construction timings and the time to the first HTTP request."""
+    first_request_at = http_client.get_client().first_request_at
+    return {
+        'monitor_imports': IMPORTS_DONE_AT - STARTED_AT,
+        'lazy_imports': dict(IMPORT_TIMES),
+        'construction': dict(CONSTRUCT_TIMES),
+        'time_to_first_request': first_request_at - STARTED_AT if first_request_at else None,
+    }
+
+def print_startup_profile(path=None):
+    profile = startup_profile()
+    print("--- Startup profile ---")
+    print(f"monitor.py imports: {profile['monitor_imports'] * 1000:.1f}ms")
+    for module, seconds in sorted(profile['lazy_imports'].items(), key=lambda item: -item[1]):
+        print(f"import {module}: {seconds * 1000:.1f}ms")
+    for path_name, seconds in sorted(profile['construction'].items(), key=lambda item: -item[1]):
+        print(f"construct {path_name}: {seconds * 1000:.1f}ms")
+    if profile['time_to_first_request'] is not None:
+        print(f"Time to first request: {profile['time_to_first_request'] * 1000:.1f}ms")
+
+    if path:
+        with open(path, 'w') as f:
+            json.dump(profile, f, indent=4)
+
+def main(profile=None):
+    """
+    Run one polling cycle over every enabled source.
+
+    Args:
+        profile: None, or '' to print a startup profile, or a path to also write it as JSON
+    """
+    destinations = load_destinations(DESTINATIONS_FILE, os.getenv('WEBHOOK_URL'))
+
+    if not destinations:
+        print("Missing WEBHOOK_URL in environment (or destinations.json). Please check .env file.")
+        return
+
+    setup_metrics()
+    metrics.start_run()
+    services_to_check = build_services(destinations)
+    setup_http(services_to_check, [dest.webhook_url for dest in destinations])
+
+    store = StateStore()
+    upgrade_watermarks(store, services_to_check, destinations)
+    translator = create_translator()
+    # Expansion estimates are kept across daemon cycles
+    budget = EmbedBudget()
+
+    run_cycle(services_to_check, store, translator, destinations, budget)
+    health = source_health(store, services_to_check)
+    store.close()
+    export_metrics(mode='once', health=health)
+
+    if profile is not None:
+        print_startup_profile(profile)
+
+    for dest in destinations:
+        dest.dispatcher.report()
+    print_translation_stats(translator)
+    print_connection_stats()
+    print_cache_stats()
+    print_source_health(health)
+
+def run_daemon(profile=None):
+    """
+    Keep services, HTTP connections and caches warm and poll each source on its
+    own adaptive schedule instead of relying on an external cron.
+
+    Args:
+        profile: As for main(); the profile is reported after the first cycle
+    """
+    destinations = load_destinations(DESTINATIONS_FILE, os.getenv('WEBHOOK_URL'))
+
+    if not destinations:
+        print("Missing WEBHOOK_URL in environment (or destinations.json). Please check .env file.")
+        return
+
+    setup_metrics()
+    services_to_check = build_services(destinations)
+    setup_http(services_to_check, [dest.webhook_url for dest in destinations])
+
+    store = StateStore()
+    upgrade_watermarks(store, services_to_check, destinations)
+    translator = create_translator()
+    # Expansion estimates are kept across daemon cycles
+    budget = EmbedBudget()
+    scheduler = AdaptiveScheduler(store)
+    keys = [svc['history_key'] for svc in services_to_check]
+
+    print(f"Daemon started with {len(services_to_check)} sources.")
+    try:
+        while True:
+            due_keys = scheduler.due(keys)
+            if due_keys:
+                due = [svc for svc in services_to_check if svc['history_key'] in due_keys]
+                metrics.start_run()
+                results = run_cycle(due, store, translator, destinations, budget)
+                for svc, new_posts in zip(due, results):
+                    scheduler.record(svc['history_key'], None if new_posts is None else len(new_posts))
+                    print(f"Next check of {svc['name']} in {scheduler.sources[svc['history_key']]['interval']:.0f}s")
+                store.expire()
+                export_metrics(mode='daemon', sources=due_keys, health=source_health(store, services_to_check))
+                if profile is not None:
+                    print_startup_profile(profile)
+                    profile = None
+
+            scheduler.write_heartbeat()
+            time.sleep(max(1, scheduler.seconds_until_next()))
+    except KeyboardInterrupt:
+        print("Daemon stopping.")
+    finally:
+        health = source_health(store, services_to_check)
+        store.close()
+        for dest in destinations:
+            dest.dispatcher.report()
+        print_translation_stats(translator)
+        print_connection_stats()
+        print_cache_stats()
+        print_source_health(health)
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Where Winds Meet news monitor")
+    parser.add_argument('--daemon', action='store_true', help="Run continuously with adaptive per-source polling")
+    parser.add_argument('--startup-profile', nargs='?', const='', default=None, metavar='JSON_PATH',
+                        help="Report import times and time to first request (optionally write them to JSON_PATH)")
+    args = parser.parse_args()
+
+    if args.daemon:
+        run_daemon(args.startup_profile)
+    else:
+        main(args.startup_profile)
@@ -0,0 +1,87 @@
+import os
+import json
+import time
+
+DEFAULT_INTERVAL = 15 * 60   # Cadence of the old cron job, used until a rate is known
+MIN_INTERVAL = 2 * 60
+MAX_INTERVAL = 2 * 3600
+POLLS_PER_POST = 4           # Aim to poll a few times between two expected posts
+HEARTBEAT_FILE = os.path.join(os.getenv('DATA_DIR') or os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data'), 'heartbeat.json')
+
+
+class AdaptiveScheduler:
+    def __init__(self, store, default_interval=DEFAULT_INTERVAL, min_interval=MIN_INTERVAL, max_interval=MAX_INTERVAL):
+        """
+        Decide when each source is next due.
+
+        A source's base interval comes from its posting rate in the state store
+        (busy sources are polled more often, quiet ones less). Each further
+        empty poll doubles the interval up to max_interval; finding posts resets it.
+
+        Args:
+            store: StateStore with the post log
+            default_interval: Interval used for sources with no logged posts
+            min_interval: Lower bound for any source (seconds)
+            max_interval: Upper bound for any source (seconds)
+        """
+        self.store = store
+        self.default_interval = default_interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.sources = {}
+
+    def _state(self, key):
+        return self.sources.setdefault(key, {
+            'next_due': 0,
+            'empty_polls': 0,
+            'interval': self.default_interval,
+            'last_poll': None,
+            'last_result': None,
+        })
+
+    def base_interval(self, key):
+        rate = self.store.post_rate(key)
+        if not rate:
+            return self.default_interval
+        return (1 / rate) / POLLS_PER_POST
+
+    def due(self, keys, now=None):
+        """Return the subset of keys whose next poll time has passed."""
+        now = now or time.time()
+        return [key for key in keys if self._state(key)['next_due'] <= now]
+
+    def record(self, key, post_count, now=None):
+        """
+        Update a source after a poll.
+
+        Args:
+            post_count: Number of new posts found, or None if the poll failed
+        """
+        now = now or time.time()
+        state = self._state(key)
+        if post_count:
+            state['empty_polls'] = 0
+        else:
+            state['empty_polls'] += 1
+
+        # The first empty poll keeps the base interval, later ones double it
+        backoff = 2 ** min(max(state['empty_polls'] - 1, 0), 10)
+        interval = self.base_interval(key) * backoff
+        state['interval'] = max(self.min_interval, min(self.max_interval, interval))
+        state['next_due'] = now + state['interval']
+        state['last_poll'] = now
+        state['last_result'] = 'error' if post_count is None else post_count
+
+    def seconds_until_next(self, now=None):
+        now = now or time.time()
+        if not self.sources:
+            return 0
+        return max(0, min(state['next_due'] for state in self.sources.values()) - now)
+
+    def write_heartbeat(self, path=HEARTBEAT_FILE):
+        """Write scheduler state to a heartbeat file for external health checks."""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_file = f"{path}.tmp"
+        with open(tmp_file, 'w') as f:
+            json.dump({'updated_at': time.time(), 'pid': os.getpid(), 'sources': self.sources}, f, indent=4)
+        os.replace(tmp_file, path)
@@ -1,21 +1,91 @@
-from bs4 import BeautifulSoup
-import requests
-import time
+from services import http_client, html_parser
+from services.posts import Post
+from services.fetcher import fetch_all
+import json
 import re
 from datetime import datetime, timedelta
 
+# Feed IDs are MongoDB ObjectIds: 24 hex digits starting with the creation time,
+# so they sort by age and double as an incremental cursor
+OBJECT_ID_RE = re.compile(r'^[0-9a-f]{24}$')
+# id attributes of the feed cards on a profile page, scanned before anything is parsed
+CARD_ID_RE = re.compile(r'\bid="([0-9a-fA-F]{24})"')
+
+# XHR endpoint the profile page loads further cards from, newest first
+FEED_API_URL = "https://inf.ds.163.com/v1/web/feed/basic/getSomeOnesFeeds"
+FEED_TYPES = "1,2,3,4,6,7,10,11"
+PAGE_SIZE = 20
+# Pages walked per user before giving up on reaching the cursor (backfill after an outage)
+MAX_PAGES = 10
+# Users polled at once; they share the client's connections to ds.163.com
+MAX_USER_WORKERS = 4
+# Title of posts that have none
+PLACEHOLDER_TITLE = "Dashen Update"
+
+
+def object_id_time(feed_id):
+    """Creation time embedded in an ObjectId, or None for other IDs."""
+    if feed_id and OBJECT_ID_RE.match(feed_id.lower()):
+        return int(feed_id[:8], 16)
+    return None
+
+
+def cursor_for(last_check_timestamp):
+    """Largest ObjectId created at or before a watermark; newer posts compare greater."""
+    return f"{int(last_check_timestamp):08x}" + "f" * 16
+
+
+def newer_cards_strainer(cursor):
+    """SoupStrainer keeping only feed cards whose ObjectId is past the cursor."""
+    def match(name, attrs):
+        attrs = attrs or {}
+        classes = attrs.get('class') or ''
+        if isinstance(classes, str):
+            classes = classes.split()
+        if 'feed-card' not in classes:
+            return False
+        feed_id = (attrs.get('id') or '').lower()
+        # Cards with other IDs are kept and filtered by their parsed time instead
+        return not OBJECT_ID_RE.match(feed_id) or feed_id > cursor
+
+    return html_parser.strainer(match)
+
+
 class DashenService:
-    def __init__(self, user_id):
-        self.user_id = user_id
-        self.profile_url = f"https://ds.163.com/user/{user_id}/"
+    def __init__(self, user_ids, page_size=PAGE_SIZE, max_pages=MAX_PAGES):
+        """
+        Follow the feeds of one or more NetEase Dashen users.
+
+        Each user's feed is read page by page from the XHR endpoint until a card
+        at or before the cursor (the ObjectId matching the watermark) turns up;
+        if the endpoint is unavailable, the first page of the HTML profile is
+        scraped instead, parsing only cards past the cursor.
+
+        Args:
+            user_ids: Dashen user ID, or a list of IDs polled concurrently
+            page_size: Feed items requested per XHR page
+            max_pages: Pages walked per user in one poll
+        """
+        self.user_ids = [user_ids] if isinstance(user_ids, str) else list(user_ids)
+        self.user_id = self.user_ids[0]
+        self.profile_url = self.profile_url_for(self.user_id)
+        self.page_size = page_size
+        self.max_pages = max_pages
         self.base_feed_url = "https://ds.163.com/feed/"
         self.headers = {
-            "User-Agent": "Mozilla/5.0 (iPhone; CPU iPhone OS 14_6 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/14.0.3 Mobile/15E148 Safari/604.1",
+            "User-Agent": http_client.MOBILE_USER_AGENT,
             "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7",
             "Accept-Language": "zh-CN,zh;q=0.9,en;q=0.8",
             "Referer": "https://ds.163.com/",
         }
 
+    def profile_url_for(self, user_id):
+        return f"https://ds.163.com/user/{user_id}/"
+
+    def feed_api_url(self, user_id, last_id=None):
+        url = f"{FEED_API_URL}?feedTypes={FEED_TYPES}&someOnesUserId={user_id}&size={self.page_size}"
+        return f"{url}&lastFeedId={last_id}" if last_id else url
+
     def _parse_chinese_time(self, time_str):
         """Convert Chinese relative time strings into a UNIX timestamp."""
         now = datetime.now()
@@ -72,75 +142,211 @@ class DashenService:
             
         return now.timestamp() # Fallback
 
-    def get_new_posts(self, last_check_timestamp):
-        print(f"Checking Dashen User: {self.user_id}")
-        
-        try:
-            response = requests.get(self.profile_url, headers=self.headers, timeout=20)
-            if response.status_code != 200:
-                print(f"Error fetching Dashen: HTTP {response.status_code}")
-                return []
-            
-            response.encoding = 'utf-8'
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            # Find all feed cards
-            cards = soup.select('.feed-card')
-            new_posts = []
-            
-            for card in cards:
+
+    def _card_post(self, card):
+        """Build a Post from a feed card of the profile page."""
+        feed_id = card.get('id')
+
+        # Title
+        title_div = card.select_one('.feed-card__content-title')
+        title = title_div.get_text(strip=True) if title_div else ""
+
+        # Stable timestamp from the ObjectId, falling back to the fuzzy display time
+        ts = object_id_time(feed_id)
+        if ts is None:
+            time_tag = card.select_one('time.time-location__time')
+            time_str = time_tag.get_text(strip=True) if time_tag else ""
+            ts = self._parse_chinese_time(time_str)
+
+        # Content text
+        content_div = card.select_one('.feed-text')
+        text = content_div.get_text(separator='\n', strip=True) if content_div else ""
+
+        # Images
+        images = []
+        # Some images are in img tags, some in div backgrounds
+        for img in card.select('img'):
+            src = img.get('src') or img.get('data-src')
+            if src and src.startswith('http') and 'thumbnail' not in src:
+                images.append(src)
+
+        # Can add video extraction later if needed
+        return self._post(title, feed_id, text, ts, images)
+
+    def _post(self, title, feed_id, text, ts, images):
+        # Untitled posts get a placeholder title, which duplicate detection ignores
+        return Post(title or PLACEHOLDER_TITLE, f"{self.base_feed_url}{feed_id}/", text, ts, 'NetEase Dashen',
+                    images=images, untitled=not title)
+
+    def _api_post(self, feed):
+        """Build a Post from one item of the XHR feed; its content is a JSON document (or string)."""
+        feed_id = str(feed['id'])
+        content = feed.get('content') or {}
+        if isinstance(content, str):
+            content = json.loads(content)
+        body = content.get('body') or content
+
+        ts = object_id_time(feed_id)
+        if ts is None:
+            ts = feed['createTime'] / 1000
+
+        images = []
+        for media in body.get('media') or []:
+            src = media.get('url') if isinstance(media, dict) else media
+            if isinstance(src, str) and src.startswith('http') and 'thumbnail' not in src:
+                images.append(src)
+
+        title = body.get('title') or feed.get('title') or ""
+        text = html_parser.strip_tags(body.get('text') or '').strip()
+        return self._post(title, feed_id, text, ts, images)
+
+    def _read_api(self, user_id, cursor, last_check_timestamp):
+        """
+        Walk a user's XHR feed, newest first, until a page ends at or before the cursor.
+
+        Items at or before the cursor are skipped without being parsed (a pinned
+        post can sit above newer ones, so only a page's last item ends the walk).
+
+        Returns:
+            List of new posts, or None if the endpoint did not answer with a feed
+            on the first page
+
+        Raises:
+            SourceUnavailable: If a later page fails; the posts between it and the
+            cursor would otherwise be skipped for good
+        """
+        posts = []
+        last_id = None
+        for page in range(self.max_pages):
+            url = self.feed_api_url(user_id, last_id)
+            try:
+                if page == 0:
+                    response = http_client.get_cached(url, headers=self.headers, timeout=10)
+                    if response.status_code == 200 and response.not_modified and http_client.is_idle(url, cursor):
+                        print(f"Dashen feed of {user_id} unchanged since last check.")
+                        return []
+                else:
+                    response = http_client.get(url, headers=self.headers, timeout=10)
+                if response.status_code != 200:
+                    raise http_client.SourceUnavailable.from_status(f"Dashen feed page {page + 1}", response.status_code)
+                feeds = response.json().get('result', {}).get('feeds')
+                if not isinstance(feeds, list):
+                    raise ValueError("response holds no feed list")
+            except (http_client.SourceUnavailable, ValueError, AttributeError, *http_client.TRANSPORT_ERRORS) as e:
+                if page == 0:
+                    print(f"Dashen feed endpoint unavailable for {user_id} ({e}), falling back to the profile page")
+                    return None
+                if isinstance(e, http_client.SourceUnavailable):
+                    raise
+                raise http_client.SourceUnavailable(f"Dashen feed page {page + 1}: {e}") from e
+
+            for feed in feeds:
+                feed_id = str(feed.get('id') or '').lower()
+                if OBJECT_ID_RE.match(feed_id) and feed_id <= cursor:
+                    continue
                 try:
-                    feed_id = card.get('id')
-                    if not feed_id:
-                        continue
-                    
-                    # Title
-                    title_div = card.select_one('.feed-card__content-title')
-                    title = title_div.get_text(strip=True) if title_div else "Dashen Update"
-                    
-                    # Extract stable timestamp from ID (MongoDB ObjectId)
-                    ts = None
-                    if feed_id and len(feed_id) >= 8:
-                        try:
-                            ts = int(feed_id[:8], 16)
-                        except (ValueError, TypeError):
-                            pass
-                    
-                    # Fallback to fuzzy time
-                    if ts is None:
-                        time_tag = card.select_one('time.time-location__time')
-                        time_str = time_tag.get_text(strip=True) if time_tag else ""
-                        ts = self._parse_chinese_time(time_str)
-                    
-                    if ts > last_check_timestamp:
-                        # Content text
-                        content_div = card.select_one('.feed-text')
-                        text = content_div.get_text(separator='\n', strip=True) if content_div else ""
-                        
-                        # Images
-                        images = []
-                        # Some images are in img tags, some in div backgrounds
-                        for img in card.select('img'):
-                            src = img.get('src') or img.get('data-src')
-                            if src and src.startswith('http') and 'thumbnail' not in src:
-                                images.append(src)
-                        
-                        new_posts.append({
-                            'title': title,
-                            'link': f"{self.base_feed_url}{feed_id}/",
-                            'text': text,
-                            'timestamp': ts,
-                            'author': 'NetEase Dashen',
-                            'images': images,
-                            'videos': [] # Can add video extraction later if needed
-                        })
+                    post = self._api_post(feed)
                 except Exception as e:
-                    print(f"Error parsing card: {e}")
+                    print(f"Error parsing feed item {feed_id}: {e}")
                     continue
+                if post['timestamp'] > last_check_timestamp:
+                    posts.append(post)
 
-            new_posts.sort(key=lambda x: x['timestamp'])
-            return new_posts
-            
+            oldest = str(feeds[-1].get('id') or '').lower() if feeds else ''
+            if len(feeds) < self.page_size or (OBJECT_ID_RE.match(oldest) and oldest <= cursor):
+                break
+            last_id = feeds[-1].get('id')
+        else:
+            print(f"Dashen feed of {user_id}: cursor not reached after {self.max_pages} pages, older posts skipped")
+
+        if not posts and page == 0:
+            http_client.mark_idle(self.feed_api_url(user_id), cursor)
+        return posts
+
+    def _read_profile(self, user_id, cursor, last_check_timestamp):
+        """Scrape the first page of a user's HTML profile, parsing only cards past the cursor."""
+        url = self.profile_url_for(user_id)
+        response = http_client.get_cached(url, headers=self.headers)
+        if response.status_code != 200:
+            raise http_client.SourceUnavailable.from_status("Dashen", response.status_code)
+        if response.not_modified and http_client.is_idle(url, last_check_timestamp):
+            print("Dashen profile unchanged since last check.")
+            return []
+
+        response.encoding = 'utf-8'
+        markup = response.text
+        # A page whose newest card is not past the cursor is not parsed at all
+        card_ids = [card_id.lower() for card_id in CARD_ID_RE.findall(markup)]
+        if card_ids and max(card_ids) <= cursor:
+            http_client.mark_idle(url, last_check_timestamp)
+            return []
+
+        soup = html_parser.parse(markup, only=newer_cards_strainer(cursor))
+        posts = []
+        for card in soup.select('.feed-card'):
+            if not card.get('id'):
+                continue
+            try:
+                post = self._card_post(card)
+            except Exception as e:
+                print(f"Error parsing card: {e}")
+                continue
+            if post['timestamp'] > last_check_timestamp:
+                posts.append(post)
+
+        if not posts:
+            http_client.mark_idle(url, last_check_timestamp)
+        return posts
+
+    def _poll_user(self, user_id, last_check_timestamp):
+        cursor = cursor_for(last_check_timestamp)
+        try:
+            posts = self._read_api(user_id, cursor, last_check_timestamp)
+            if posts is None:
+                posts = self._read_profile(user_id, cursor, last_check_timestamp)
+            return posts
+        except http_client.SourceUnavailable:
+            raise
+        except http_client.TRANSPORT_ERRORS as e:
+            raise http_client.SourceUnavailable(f"Dashen: {e}") from e
         except Exception as e:
-             print(f"Exception fetching Dashen: {e}")
-             return []
+            print(f"Exception fetching Dashen user {user_id}: {e}")
+            return []
+
+    def get_new_posts(self, last_check_timestamp):
+        return list(self.iter_new_posts(last_check_timestamp))
+
+    def iter_new_posts(self, last_check_timestamp):
+        """Yield the new posts of every configured user, oldest first."""
+        for _, post in self.iter_new_posts_by_feed({user_id: last_check_timestamp for user_id in self.user_ids}):
+            yield post
+
+    def iter_new_posts_by_feed(self, last_checks):
+        """
+        Poll several users concurrently, each with its own watermark.
+
+        Args:
+            last_checks: Dict of user ID -> watermark timestamp
+
+        Yields:
+            (user_id, post) pairs, oldest first across all users, once every user was read
+        """
+        user_ids = list(last_checks)
+        print(f"Checking Dashen users: {', '.join(user_ids)}")
+
+        def poll(user_id):
+            # Errors are handed back so a failed user fails the whole poll (and its retry)
+            try:
+                return self._poll_user(user_id, last_checks[user_id])
+            except Exception as e:
+                return e
+
+        results = fetch_all(poll, user_ids, max_workers=MAX_USER_WORKERS)
+        new_posts = []
+        for user_id, result in zip(user_ids, results):
+            if isinstance(result, Exception):
+                raise result
+            new_posts.extend((user_id, post) for post in result)
+
+        new_posts.sort(key=lambda item: item[1]['timestamp'])
+        yield from new_posts
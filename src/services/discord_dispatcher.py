@@ -0,0 +1,174 @@
+import time
+from services import http_client, metrics
+
+# Discord webhook limits
+MAX_EMBEDS_PER_MESSAGE = 10
+MAX_CHARS_PER_MESSAGE = 6000
+MAX_RETRIES = 5
+
+
+def embed_length(embed):
+    """Count the characters Discord includes in the 6000-character message total."""
+    total = len(embed.get('title', '')) + len(embed.get('description', ''))
+    total += len(embed.get('footer', {}).get('text', ''))
+    total += len(embed.get('author', {}).get('name', ''))
+    for field in embed.get('fields', []):
+        total += len(field.get('name', '')) + len(field.get('value', ''))
+    return total
+
+
+class DiscordDispatcher:
+    def __init__(self, webhook_url, max_retries=MAX_RETRIES, name=None):
+        """
+        Queue embeds and deliver them in as few webhook calls as Discord allows.
+
+        Args:
+            webhook_url: Discord webhook URL
+            max_retries: Attempts per message when Discord answers 429
+            name: Destination name shown in the delivery report
+        """
+        self.webhook_url = webhook_url
+        self.name = name
+        self.max_retries = max_retries
+        self.queue = []
+        # Rate limit bucket state from the last response
+        self.remaining = None
+        self.reset_at = 0
+        # Delivery stats
+        self.messages_sent = 0
+        self.embeds_sent = 0
+        self.failed_embeds = 0
+        self.rate_limited = 0
+        self.latencies = []
+        self.busy_time = 0.0
+
+    def add(self, embed, on_done=None):
+        """
+        Queue an embed.
+
+        Args:
+            embed: Discord embed dict
+            on_done: Optional callback(sent) run right after the embed's message was attempted
+        """
+        self.queue.append((embed, on_done))
+
+    def _next_batch(self):
+        batch = []
+        chars = 0
+        while self.queue and len(batch) < MAX_EMBEDS_PER_MESSAGE:
+            length = embed_length(self.queue[0][0])
+            if batch and chars + length > MAX_CHARS_PER_MESSAGE:
+                break
+            batch.append(self.queue.pop(0))
+            chars += length
+        return batch
+
+    def _wait_for_bucket(self):
+        # Sleep proactively instead of provoking a 429 once the bucket is empty
+        if self.remaining == 0:
+            delay = self.reset_at - time.monotonic()
+            if delay > 0:
+                print(f"Discord rate limit reached, waiting {delay:.2f}s")
+                time.sleep(delay)
+
+    def _update_bucket(self, response):
+        remaining = response.headers.get('X-RateLimit-Remaining')
+        reset_after = response.headers.get('X-RateLimit-Reset-After')
+        try:
+            if remaining is not None:
+                self.remaining = int(remaining)
+            if reset_after is not None:
+                self.reset_at = time.monotonic() + float(reset_after)
+        except ValueError:
+            pass
+
+    def _retry_after(self, response):
+        try:
+            return float(response.json().get('retry_after', 1))
+        except Exception:
+            return float(response.headers.get('Retry-After', 1))
+
+    def send(self, content=None, embeds=None):
+        """
+        Post one message, honouring the rate limit bucket and retrying 429s.
+
+        Returns:
+            True if Discord accepted the message
+        """
+        data = {}
+        if content:
+            data["content"] = content
+        if embeds:
+            data["embeds"] = embeds
+
+        for attempt in range(self.max_retries):
+            self._wait_for_bucket()
+            started = time.monotonic()
+            try:
+                response = http_client.post(self.webhook_url, json=data)
+            except Exception as e:
+                print(f"Webhook exception: {e}")
+                return False
+            self._update_bucket(response)
+
+            if response.status_code == 429:
+                self.rate_limited += 1
+                metrics.count('webhook_rate_limited')
+                delay = self._retry_after(response)
+                print(f"Webhook rate limited, retrying in {delay:.2f}s ({attempt + 1}/{self.max_retries})")
+                time.sleep(delay)
+                continue
+
+            if response.status_code in (200, 204):
+                self.latencies.append(time.monotonic() - started)
+                self.messages_sent += 1
+                metrics.count('webhook_messages')
+                return True
+
+            print(f"Webhook failed: {response.status_code} - {response.text}")
+            return False
+
+        print("Webhook failed: still rate limited after retries")
+        return False
+
+    def flush(self):
+        """Send every queued embed, packing up to 10 per message."""
+        started = time.monotonic()
+        while self.queue:
+            batch = self._next_batch()
+            sent = self.send(embeds=[embed for embed, _ in batch])
+            if sent:
+                self.embeds_sent += len(batch)
+                metrics.count('embeds_sent', len(batch))
+                print(f"Webhook sent successfully ({len(batch)} embeds).")
+            else:
+                self.failed_embeds += len(batch)
+                metrics.count('embeds_failed', len(batch))
+            for _, on_done in batch:
+                if on_done is not None:
+                    on_done(sent)
+        self.busy_time += time.monotonic() - started
+
+    def stats(self):
+        latencies = self.latencies
+        return {
+            'messages': self.messages_sent,
+            'embeds': self.embeds_sent,
+            'failed_embeds': self.failed_embeds,
+            'rate_limited': self.rate_limited,
+            'embeds_per_second': self.embeds_sent / self.busy_time if self.busy_time else 0.0,
+            'avg_latency': sum(latencies) / len(latencies) if latencies else 0.0,
+            'max_latency': max(latencies) if latencies else 0.0,
+        }
+
+    def report(self):
+        stats = self.stats()
+        if not stats['messages'] and not stats['failed_embeds']:
+            return
+        label = f"Discord ({self.name})" if self.name else "Discord"
+        print(
+            f"{label}: {stats['embeds']} embeds in {stats['messages']} messages "
+            f"({stats['embeds_per_second']:.2f} embeds/s), "
+            f"latency avg {stats['avg_latency'] * 1000:.0f}ms / max {stats['max_latency'] * 1000:.0f}ms, "
+            f"{stats['rate_limited']} rate limited, {stats['failed_embeds']} failed"
+        )
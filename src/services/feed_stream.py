@@ -0,0 +1,151 @@
+import time
+import codecs
+import feedparser
+import xml.etree.ElementTree as ET
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from services import metrics
+
+CHUNK_SIZE = 8192
+
+
+def _local(tag):
+    """Strip the XML namespace from a tag name."""
+    return tag.rsplit('}', 1)[-1]
+
+
+def _child(elem, name):
+    for child in elem:
+        if _local(child.tag) == name:
+            return child
+    return None
+
+
+def _text(elem, name):
+    child = _child(elem, name)
+    return (child.text or '').strip() if child is not None else ''
+
+
+def _parse_date(value):
+    """Parse an RFC 822 (RSS) or ISO 8601 (Atom) date into a UTC struct_time like feedparser."""
+    if not value:
+        return None
+    try:
+        dt = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        try:
+            dt = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        except ValueError:
+            return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(timezone.utc).timetuple()
+
+
+def _entry_from_element(elem):
+    link = _child(elem, 'link')
+    if link is not None and link.get('href'):
+        link = link.get('href')
+    else:
+        link = (link.text or '').strip() if link is not None else ''
+
+    author = _child(elem, 'author')
+    if author is not None and _child(author, 'name') is not None:
+        author = _text(author, 'name')
+    else:
+        author = (author.text or '').strip() if author is not None else ''
+
+    source = _child(elem, 'source')
+    return {
+        'title': _text(elem, 'title'),
+        'link': link,
+        'published_parsed': _parse_date(_text(elem, 'published') or _text(elem, 'pubDate') or _text(elem, 'updated')),
+        'author': author,
+        'content': _text(elem, 'content') or _text(elem, 'description') or _text(elem, 'summary'),
+        'source_title': (source.text or '').strip() if source is not None else '',
+        'id': _text(elem, 'id') or _text(elem, 'guid'),
+    }
+
+
+def _entry_from_feedparser(entry):
+    content = ''
+    if hasattr(entry, 'content'):
+        content = entry.content[0].value
+    elif hasattr(entry, 'summary'):
+        content = entry.summary
+    return {
+        'title': entry.get('title', ''),
+        'link': entry.get('link', ''),
+        'published_parsed': entry.get('published_parsed'),
+        'author': entry.get('author', ''),
+        'content': content,
+        'source_title': entry.get('source', {}).get('title', ''),
+        'id': entry.get('id', ''),
+    }
+
+
+def iter_entries(chunks):
+    """
+    Incrementally parse an RSS or Atom feed from an iterable of byte chunks.
+
+    Entries are yielded as soon as their closing tag has been read, so callers
+    can stop consuming (and stop downloading) once they have what they need.
+    Feeds that are not well-formed XML fall back to feedparser on the full body.
+
+    Yields:
+        Dicts with title, link, published_parsed, author, content, source_title and id
+    """
+    parser = ET.XMLPullParser(events=('end',))
+    received = []
+    yielded = 0
+    # Time spent parsing, excluding the download and the caller's work between entries
+    parse_time = 0.0
+    chunks = iter(chunks)
+    try:
+        for chunk in chunks:
+            received.append(chunk)
+            started = time.perf_counter()
+            parser.feed(chunk)
+            entries = []
+            for _, elem in parser.read_events():
+                if _local(elem.tag) in ('item', 'entry'):
+                    entries.append(_entry_from_element(elem))
+                    elem.clear()
+            parse_time += time.perf_counter() - started
+            for entry in entries:
+                yield entry
+                yielded += 1
+        parser.close()
+    except ET.ParseError:
+        # Not well-formed: let feedparser deal with the whole document
+        received.extend(chunks)
+        started = time.perf_counter()
+        feed = feedparser.parse(b''.join(received))
+        parse_time += time.perf_counter() - started
+        for entry in feed.entries[yielded:]:
+            yield _entry_from_feedparser(entry)
+    finally:
+        metrics.record('parse', parse_time)
+
+
+def iter_matches(chunks, pattern, encoding='utf-8', overlap=4096):
+    """
+    Yield regex matches over a streamed text document without buffering all of it.
+
+    Args:
+        chunks: Iterable of byte chunks
+        pattern: Compiled regex; matches must not span more than `overlap` characters
+        encoding: Text encoding of the document
+    """
+    decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+    buffer = ''
+    for chunk in chunks:
+        buffer += decoder.decode(chunk)
+        last_end = 0
+        for match in pattern.finditer(buffer):
+            yield match
+            last_end = match.end()
+        # Keep an unmatched tail in case a match straddles the chunk boundary
+        buffer = buffer[max(last_end, len(buffer) - overlap):]
+    buffer += decoder.decode(b'', final=True)
+    yield from pattern.finditer(buffer)
@@ -0,0 +1,70 @@
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_MAX_WORKERS = 4
+
+def fetch_all(func, items, max_workers=DEFAULT_MAX_WORKERS):
+    """
+    Call `func(item)` for every item using a bounded thread pool.
+
+    Args:
+        func: Blocking callable, e.g. a service's get_post_content
+        items: Iterable of arguments to pass to func
+        max_workers: Maximum number of fetches in flight (1 = sequential)
+
+    Returns:
+        List of results in the same order as `items`. If func raises,
+        the corresponding result is None.
+    """
+    items = list(items)
+    if not items:
+        return []
+
+    def safe_call(item):
+        try:
+            return func(item)
+        except Exception as e:
+            print(f"Error fetching {item}: {e}")
+            return None
+
+    workers = max(1, min(max_workers, len(items)))
+    if workers == 1:
+        return [safe_call(item) for item in items]
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="fetch") as executor:
+        # Each call runs in a copy of the caller's context so metrics stay attributed to its source
+        futures = [executor.submit(contextvars.copy_context().run, safe_call, item) for item in items]
+        return [future.result() for future in futures]
+
+def iter_all(func, items, max_workers=DEFAULT_MAX_WORKERS):
+    """
+    Like fetch_all, but yield each result as soon as it and every earlier one are done.
+
+    Results keep the order of `items`, so a caller that passes its items oldest
+    first can hand them on while later fetches are still running.
+    """
+    items = list(items)
+    if not items:
+        return
+
+    def safe_call(item):
+        try:
+            return func(item)
+        except Exception as e:
+            print(f"Error fetching {item}: {e}")
+            return None
+
+    workers = max(1, min(max_workers, len(items)))
+    if workers == 1:
+        for item in items:
+            yield safe_call(item)
+        return
+
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="fetch")
+    try:
+        futures = [executor.submit(contextvars.copy_context().run, safe_call, item) for item in items]
+        for future in futures:
+            yield future.result()
+    finally:
+        # A consumer that stops early does not wait for fetches it will never read
+        executor.shutdown(wait=False, cancel_futures=True)
@@ -1,33 +1,60 @@
-from bs4 import BeautifulSoup
-import feedparser
 import time
-import requests
+from services import http_client, html_parser
 from urllib.parse import quote
+from services.fetcher import iter_all, DEFAULT_MAX_WORKERS
+from services import feed_stream, metrics
+from services.posts import Post
+from services.link_resolver import LinkResolver
+
+# Google News orders results by relevance, not date, so only the entry cap
+# (not the watermark) can end the scan early
+MAX_ENTRIES = 50
+
+# Article text is taken from paragraphs only, so nothing else is built
+PARAGRAPH_STRAINER = html_parser.strainer('p')
+
+# Only the first 1000 characters are kept, so article pages are read until the
+# paragraphs hold comfortably more than that, or the byte cap is hit
+ARTICLE_MAX_BYTES = 256 * 1024
+ARTICLE_MIN_CHARS = 1500
+
+def strip_publisher(title, source_title):
+    """Drop the " - <publisher>" suffix Google News appends to every item title."""
+    suffix = f" - {source_title}"
+    if source_title and title.endswith(suffix):
+        return title[:-len(suffix)].rstrip()
+    return title
 
 class GoogleNewsService:
-    def __init__(self, keyword):
+    def __init__(self, keyword, max_workers=DEFAULT_MAX_WORKERS, resolver=None, max_article_bytes=ARTICLE_MAX_BYTES):
         # Broad search to ensure indexing
         self.keyword = keyword
+        # Number of articles resolved and scraped in parallel
+        self.max_workers = max_workers
+        # Persistent news.google.com -> article URL map
+        self.resolver = resolver or LinkResolver()
+        # Download cap per article page
+        self.max_article_bytes = max_article_bytes
         self.rss_url = f"https://news.google.com/rss/search?q={quote(keyword)}&hl=zh-CN&gl=CN&ceid=CN:zh-Hans"
 
     def resolve_google_link(self, google_url):
-        try:
-            response = requests.get(google_url, timeout=5)
-            return response.url
-        except:
-            return google_url
+        return self.resolver.resolve(google_url, timeout=5)
 
     def get_post_content(self, link):
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36"
-        }
         try:
-            resolved_link = self.resolve_google_link(link)
-            response = requests.get(resolved_link, headers=headers, timeout=10)
+            # A known link goes straight to the (possibly cached) article; an unknown
+            # one is resolved by following redirects and the final response is reused
+            resolved_link, response = self.resolver.open(link, timeout=10)
+            enough = html_parser.TextBudget(ARTICLE_MIN_CHARS, ('<p',))
+            if response is None:
+                response = http_client.get_bounded(resolved_link, self.max_article_bytes, max_age=http_client.ARTICLE_MAX_AGE,
+                                                   enough=enough, timeout=10)
+            else:
+                response = http_client.read_bounded(response, resolved_link, self.max_article_bytes, enough=enough)
             if response.status_code != 200:
                 return {"text": "", "link": resolved_link}
             
-            soup = BeautifulSoup(response.text, 'html.parser')
+            soup = html_parser.parse(response.text, only=PARAGRAPH_STRAINER)
             for script in soup(["script", "style"]):
                 script.extract()
 
@@ -41,50 +68,66 @@ class GoogleNewsService:
         except:
             return {"text": "", "link": link}
 
+    def _scrape(self, link):
+        with metrics.span('enrich'):
+            return self.get_post_content(link)
+
     def get_new_posts(self, last_check_timestamp):
+        return list(self.iter_new_posts(last_check_timestamp))
+
+    def iter_new_posts(self, last_check_timestamp):
+        """Yield new posts oldest first, each as soon as its article has been resolved and scraped."""
         print(f"Checking Google News RSS (filtered for 17173.com): {self.rss_url}")
         
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36"
-        }
-        
         try:
-            response = requests.get(self.rss_url, headers=headers, timeout=20)
-            if response.status_code != 200:
-                return []
-            
-            feed = feedparser.parse(response.text)
-            new_posts = []
-            
-            # Google News RSS usually has the top entries first
-            for entry in feed.entries[:50]: # Increased to find more matches
-                if not hasattr(entry, 'published_parsed'):
-                    continue
+            response = http_client.open_feed(self.rss_url, last_check_timestamp)
+            if response is None:
+                print("Google News RSS unchanged since last check.")
+                return
+            try:
+                if response.status_code != 200:
+                    raise http_client.SourceUnavailable.from_status("Google News RSS", response.status_code)
                 
-                # Filter for 17173 as requested
-                source_name = getattr(entry, 'source', {}).get('title', '').lower() if hasattr(entry, 'source') else ""
-                if '17173' not in entry.link.lower() and '17173' not in source_name:
-                    continue
-
-                entry_timestamp = time.mktime(entry.published_parsed)
+                matches = []
                 
-                # Use a small buffer (5 min) to handle RSS indexing latency
-                if entry_timestamp > last_check_timestamp:
-                    content_details = self.get_post_content(entry.link)
+                # Google News RSS usually has the top entries first
+                entries = feed_stream.iter_entries(response.iter_content(feed_stream.CHUNK_SIZE))
+                for count, entry in enumerate(entries):
+                    if count >= MAX_ENTRIES: # Increased to find more matches
+                        break
+                    if not entry['published_parsed']:
+                        continue
+                    
+                    # Filter for 17173 as requested
+                    source_name = entry['source_title'].lower()
+                    if '17173' not in entry['link'].lower() and '17173' not in source_name:
+                        continue
+
+                    entry_timestamp = time.mktime(entry['published_parsed'])
                     
-                    new_posts.append({
-                        'title': entry.title,
-                        'link': content_details['link'],
-                        'text': content_details['text'],
-                        'timestamp': entry_timestamp,
-                        'author': '17173.com',
-                        'images': [], # No images needed anymore
-                        'videos': []
-                    })
-
-            new_posts.sort(key=lambda x: x['timestamp'])
-            return new_posts
+                    if entry_timestamp > last_check_timestamp:
+                        matches.append((entry, entry_timestamp))
+            finally:
+                response.close()
+
+            matches.sort(key=lambda match: match[1])
+
+            # Resolve and scrape all matching articles in parallel, handing each post on in order
+            details_list = iter_all(self._scrape, [entry['link'] for entry, _ in matches], self.max_workers)
+            for (entry, entry_timestamp), content_details in zip(matches, details_list):
+                if not content_details:
+                    content_details = {"text": "", "link": entry['link']}
+
+                # No images needed anymore
+                yield Post(strip_publisher(entry['title'], entry['source_title']), content_details['link'],
+                           content_details['text'], entry_timestamp, '17173.com')
+
+            if not matches:
+                http_client.mark_idle(self.rss_url, last_check_timestamp)
             
+        except http_client.SourceUnavailable:
+            raise
+        except http_client.TRANSPORT_ERRORS as e:
+            raise http_client.SourceUnavailable(f"Google News RSS: {e}") from e
         except Exception as e:
              print(f"Exception fetching Google News RSS: {e}")
-             return []
@@ -0,0 +1,141 @@
+import os
+import re
+import html
+from bs4 import BeautifulSoup, SoupStrainer
+from services import metrics
+
+# Preferred parser first; html.parser ships with Python and is always available
+BACKENDS = ['lxml', 'html.parser']
+
+TAG_RE = re.compile(r'<[^>]+>')
+SKIPPED_BLOCK_RE = re.compile(r'<(script|style)\b.*?</\1\s*>', re.I | re.S)
+SKIPPED_BLOCK_START_RE = re.compile(r'<(script|style)\b', re.I)
+
+
+def available_backends():
+    """Return the installed BeautifulSoup tree builders, fastest first."""
+    found = []
+    for backend in BACKENDS:
+        if backend == 'html.parser':
+            found.append(backend)
+            continue
+        try:
+            __import__(backend)
+            found.append(backend)
+        except ImportError:
+            pass
+    return found
+
+
+def _select_backend():
+    requested = os.getenv('HTML_BACKEND')
+    installed = available_backends()
+    if requested:
+        if requested in installed:
+            return requested
+        print(f"HTML backend '{requested}' is not installed, falling back to {installed[0]}")
+    return installed[0]
+
+
+backend = _select_backend()
+
+
+def set_backend(name):
+    """Switch the parser used by parse() (e.g. for benchmarks)."""
+    global backend
+    if name not in available_backends():
+        raise ValueError(f"HTML backend '{name}' is not installed")
+    backend = name
+
+
+def parse(markup, only=None, parser=None):
+    """
+    Parse HTML with the selected backend.
+
+    Args:
+        markup: HTML text
+        only: Optional SoupStrainer; only matching subtrees are built
+        parser: Override the module-wide backend for this call
+
+    Returns:
+        BeautifulSoup tree
+    """
+    with metrics.span('parse'):
+        return BeautifulSoup(markup, parser or backend, parse_only=only)
+
+
+def strainer(name=None, attrs=None, **kwargs):
+    """Build a SoupStrainer for parse(only=...) from a tag name, attributes or a match(name, attrs) function."""
+    return SoupStrainer(name, attrs or {}, **kwargs)
+
+
+def classes_strainer(*class_names, tags=(), ids=()):
+    """Build a SoupStrainer keeping elements with any of the given classes, tag names or ids."""
+    class_names = set(class_names)
+
+    def match(name, attrs):
+        if name in tags:
+            return True
+        attrs = attrs or {}
+        if attrs.get('id') in ids:
+            return True
+        classes = attrs.get('class') or ''
+        if isinstance(classes, str):
+            classes = classes.split()
+        return any(c in class_names for c in classes)
+
+    return strainer(match)
+
+
+def strip_tags(markup):
+    """Convert an HTML fragment to plain text without building a tree."""
+    return html.unescape(TAG_RE.sub('', markup))
+
+
+class TextBudget:
+    def __init__(self, min_chars, start_markers=()):
+        """
+        Tell a streaming download when a page has enough visible text (see http_client.read_bounded).
+
+        Called with each newly decoded piece of HTML; tags, scripts and styles are
+        skipped, including ones split across pieces.
+
+        Args:
+            min_chars: Visible characters wanted
+            start_markers: Only count text after the first of these strings
+                (e.g. the article body's class attribute); empty counts from the start
+        """
+        self.min_chars = min_chars
+        self.start_markers = start_markers
+        self.started = not start_markers
+        self.pending = ''
+        self.chars = 0
+
+    def __call__(self, text):
+        self.pending += text
+        if not self.started:
+            positions = [self.pending.find(marker) for marker in self.start_markers]
+            positions = [position for position in positions if position >= 0]
+            if not positions:
+                # Keep enough of the tail to match a marker split across pieces
+                longest = max(len(marker) for marker in self.start_markers)
+                self.pending = self.pending[-longest:]
+                return False
+            self.started = True
+            self.pending = self.pending[min(positions):]
+
+        # Anything after the last unclosed '<' may be a tag still being downloaded
+        cut = self.pending.rfind('<')
+        if cut >= 0 and self.pending.find('>', cut) < 0:
+            complete, self.pending = self.pending[:cut], self.pending[cut:]
+        else:
+            complete, self.pending = self.pending, ''
+        # A script/style block that is still open is kept until its closing tag arrives
+        complete = SKIPPED_BLOCK_RE.sub('', complete)
+        opened = SKIPPED_BLOCK_START_RE.search(complete)
+        if opened:
+            complete, self.pending = complete[:opened.start()], complete[opened.start():] + self.pending
+
+        visible = TAG_RE.sub('', complete)
+        self.chars += len(''.join(html.unescape(visible).split()))
+        return self.chars >= self.min_chars
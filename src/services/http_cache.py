@@ -0,0 +1,272 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from services import metrics
+
+DEFAULT_CACHE_DIR = os.path.join(os.getenv('DATA_DIR') or os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'data'), 'http_cache')
+DEFAULT_TTL = 7 * 86400            # Entries unused for this long are dropped
+DEFAULT_MAX_BYTES = 50 * 1024 * 1024
+
+
+class CachedResponse:
+    """A stored response body served with the requests.Response interface."""
+
+    def __init__(self, url, content, encoding=None, headers=None, status_code=200, partial=False, truncated=False):
+        self.url = url
+        self.status_code = status_code
+        self.content = content
+        self.encoding = encoding
+        self.headers = headers or {}
+        self.from_cache = True
+        self.not_modified = True
+        # True when only validators were kept (the body was never fully read)
+        self.partial = partial
+        # Byte cap of the bounded download that kept only a prefix of the body (False if complete)
+        self.truncated = truncated
+
+    @property
+    def text(self):
+        return self.content.decode(self.encoding or 'utf-8', errors='replace')
+
+    def json(self):
+        return json.loads(self.text)
+
+    def iter_content(self, chunk_size=8192):
+        for start in range(0, len(self.content), chunk_size):
+            yield self.content[start:start + chunk_size]
+
+    def close(self):
+        pass
+
+
+class HttpCache:
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, ttl=DEFAULT_TTL, max_bytes=DEFAULT_MAX_BYTES):
+        """
+        Persistent URL-keyed response cache with conditional revalidation.
+
+        Args:
+            cache_dir: Directory holding index.json and one body file per URL
+            ttl: Seconds after the last use before an entry is evicted
+            max_bytes: Total body size above which least recently used entries are evicted
+        """
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.index_file = os.path.join(cache_dir, 'index.json')
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self.index = self._load_index()
+
+    def _load_index(self):
+        if os.path.exists(self.index_file):
+            try:
+                with open(self.index_file, 'r') as f:
+                    return json.load(f)
+            except Exception as e:
+                print(f"Ignoring unreadable HTTP cache index: {e}")
+        return {}
+
+    def _save_index(self):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_file = f"{self.index_file}.tmp"
+        with open(tmp_file, 'w') as f:
+            json.dump(self.index, f)
+        os.replace(tmp_file, self.index_file)
+
+    def _key(self, url):
+        return hashlib.sha1(url.encode('utf-8')).hexdigest()
+
+    def _body_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.body")
+
+    def _read_body(self, key):
+        try:
+            with open(self._body_path(key), 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def _remove(self, key):
+        self.index.pop(key, None)
+        try:
+            os.remove(self._body_path(key))
+        except OSError:
+            pass
+
+    def _evict(self):
+        now = time.time()
+        for key, entry in list(self.index.items()):
+            if now - entry.get('accessed_at', 0) > self.ttl:
+                self._remove(key)
+
+        total = sum(entry.get('size', 0) for entry in self.index.values())
+        for key, entry in sorted(self.index.items(), key=lambda item: item[1].get('accessed_at', 0)):
+            if total <= self.max_bytes:
+                break
+            total -= entry.get('size', 0)
+            self._remove(key)
+
+    def validators(self, url):
+        """Return conditional request headers for a cached URL."""
+        with self.lock:
+            entry = self.index.get(self._key(url))
+        if not entry:
+            return {}
+        headers = {}
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def get_fresh(self, url, max_age, allow_truncated=False):
+        """
+        Return the cached response if it was stored less than max_age seconds ago.
+
+        Args:
+            allow_truncated: Also serve the prefix kept by a byte-bounded download
+        """
+        if not max_age:
+            return None
+        key = self._key(url)
+        with self.lock:
+            entry = self.index.get(key)
+            if not entry or entry.get('partial') or time.time() - entry['stored_at'] > max_age:
+                return None
+            if entry.get('truncated') and not allow_truncated:
+                return None
+            body = self._read_body(key)
+            if body is None:
+                return None
+            entry['accessed_at'] = time.time()
+            self.hits += 1
+        metrics.count('http_cache_hits')
+        return CachedResponse(entry.get('final_url', url), body, entry.get('encoding'), truncated=entry.get('truncated', False))
+
+    def not_modified(self, url):
+        """
+        Handle a 304: refresh the entry and return the stored response.
+
+        For validator-only entries the returned response has `partial` set and an
+        empty body.
+        """
+        key = self._key(url)
+        with self.lock:
+            entry = self.index.get(key)
+            if not entry:
+                return None
+            partial = bool(entry.get('partial'))
+            body = b'' if partial else self._read_body(key)
+            if body is None:
+                return None
+            entry['stored_at'] = entry['accessed_at'] = time.time()
+            self.revalidated += 1
+            self._save_index()
+        metrics.count('http_cache_revalidated')
+        return CachedResponse(entry.get('final_url', url), body, entry.get('encoding'), partial=partial,
+                              truncated=entry.get('truncated', False))
+
+    def store(self, url, response, content=None, truncated=False):
+        """
+        Store a 200 response and report whether its body changed.
+
+        Servers that send no ETag/Last-Modified still get change detection
+        through a hash of the body.
+
+        Args:
+            truncated: Byte cap of the download if the content is only a prefix of the body (see get_fresh)
+
+        Returns:
+            True if the body is identical to the cached copy
+        """
+        key = self._key(url)
+        content = response.content if content is None else content
+        digest = hashlib.sha256(content).hexdigest()
+        now = time.time()
+
+        with self.lock:
+            previous = self.index.get(key)
+            unchanged = bool(previous) and previous.get('hash') == digest
+            if unchanged:
+                self.revalidated += 1
+            else:
+                self.misses += 1
+                os.makedirs(self.cache_dir, exist_ok=True)
+                with open(self._body_path(key), 'wb') as f:
+                    f.write(content)
+
+            self.index[key] = {
+                'url': url,
+                'final_url': str(response.url),
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+                'encoding': response.encoding,
+                'hash': digest,
+                'size': len(content),
+                'truncated': truncated,
+                'stored_at': now,
+                'accessed_at': now,
+                # A changed body invalidates any earlier "nothing new" marker
+                'idle_watermark': previous.get('idle_watermark') if unchanged else None,
+            }
+            self._evict()
+            self._save_index()
+        metrics.count('http_cache_revalidated' if unchanged else 'http_cache_misses')
+        return unchanged
+
+    def store_validators(self, url, response):
+        """Keep only ETag/Last-Modified for a response whose body was not fully read."""
+        key = self._key(url)
+        now = time.time()
+        with self.lock:
+            self._remove(key)
+            self.misses += 1
+            self.index[key] = {
+                'url': url,
+                'final_url': str(response.url),
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+                'encoding': response.encoding,
+                'hash': None,
+                'size': 0,
+                'partial': True,
+                'stored_at': now,
+                'accessed_at': now,
+                'idle_watermark': None,
+            }
+            self._save_index()
+        metrics.count('http_cache_misses')
+
+    def _watermark_digest(self, watermark):
+        if isinstance(watermark, (list, set, tuple)):
+            watermark = sorted(watermark)
+        return hashlib.sha1(json.dumps(watermark, default=str).encode('utf-8')).hexdigest()
+
+    def mark_idle(self, url, watermark):
+        """Remember that parsing the cached body with this watermark produced no new posts."""
+        key = self._key(url)
+        with self.lock:
+            entry = self.index.get(key)
+            if entry:
+                entry['idle_watermark'] = self._watermark_digest(watermark)
+                self._save_index()
+
+    def is_idle(self, url, watermark):
+        """True if the cached body was already parsed with this watermark and yielded nothing."""
+        with self.lock:
+            entry = self.index.get(self._key(url))
+        return bool(entry) and entry.get('idle_watermark') == self._watermark_digest(watermark)
+
+    def stats(self):
+        with self.lock:
+            return {
+                'entries': len(self.index),
+                'bytes': sum(entry.get('size', 0) for entry in self.index.values()),
+                'hits': self.hits,
+                'revalidated': self.revalidated,
+                'misses': self.misses,
+            }
@@ -0,0 +1,479 @@
+import time
+import codecs
+import inspect
+import threading
+import requests
+from urllib.parse import urlsplit
+from requests.adapters import HTTPAdapter
+from services.fetcher import fetch_all
+from services import metrics
+
+# Central request policy shared by every service
+DEFAULT_TIMEOUT = 20
+DESKTOP_USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36"
+MOBILE_USER_AGENT = "Mozilla/5.0 (iPhone; CPU iPhone OS 14_6 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/14.0.3 Mobile/15E148 Safari/604.1"
+DEFAULT_HEADERS = {
+    "User-Agent": DESKTOP_USER_AGENT,
+}
+
+# Article pages rarely change once published: serve them from the cache for a day
+ARTICLE_MAX_AGE = 86400
+
+# Content types accepted by bounded article downloads
+HTML_CONTENT_TYPES = ('text/html', 'application/xhtml+xml')
+BOUNDED_CHUNK_SIZE = 16384
+
+# Keep-alive pool sizing: one pool per host, several sockets per pool so
+# parallel detail fetches to the same host can all reuse connections
+POOL_CONNECTIONS = 16
+POOL_MAXSIZE = 10
+
+
+def replay_url(url, base):
+    """Map https://host/path?query to base/host/path?query on a replay server."""
+    parts = urlsplit(url)
+    if not parts.netloc or url.startswith(base):
+        return url
+    query = f"?{parts.query}" if parts.query else ""
+    return f"{base}/{parts.netloc}{parts.path or '/'}{query}"
+
+
+class HttpxResponse:
+    """Expose the subset of the requests.Response interface the services use."""
+
+    def __init__(self, response):
+        self._response = response
+        self.status_code = response.status_code
+        self.headers = response.headers
+        self.url = str(response.url)
+        self.content = response.content
+        self.encoding = response.encoding
+
+    @property
+    def text(self):
+        return self.content.decode(self.encoding or 'utf-8', errors='replace')
+
+    def json(self):
+        return self._response.json()
+
+    def iter_content(self, chunk_size=8192):
+        for start in range(0, len(self.content), chunk_size):
+            yield self.content[start:start + chunk_size]
+
+    def close(self):
+        self._response.close()
+
+
+# Exceptions of a request that never got an HTTP answer (connection errors, timeouts)
+TRANSPORT_ERRORS = (requests.RequestException,)
+
+
+class SourceUnavailable(Exception):
+    """Raised by a service whose upstream could not be reached or answered with an error."""
+
+    def __init__(self, message, retryable=True):
+        super().__init__(message)
+        # Client errors other than 429 will not go away by retrying
+        self.retryable = retryable
+
+    @classmethod
+    def from_status(cls, what, status_code):
+        return cls(f"{what}: HTTP {status_code}", retryable=status_code >= 500 or status_code == 429)
+
+
+class UnexpectedContentType(Exception):
+    """Raised by bounded downloads when the server sends something other than a page."""
+
+
+class BoundedResponse:
+    """The (possibly truncated) body of a streamed response read by read_bounded()."""
+
+    def __init__(self, response, content, encoding, truncated):
+        self.status_code = response.status_code
+        self.headers = response.headers
+        self.url = str(response.url)
+        self.content = content
+        self.encoding = encoding
+        # True when reading stopped before the end of the body
+        self.truncated = truncated
+        self.from_cache = False
+        self.not_modified = False
+
+    @property
+    def text(self):
+        return self.content.decode(self.encoding or 'utf-8', errors='replace')
+
+    def close(self):
+        pass
+
+
+class CachingStream:
+    """
+    Wrap a streamed 200 response and record it in the cache on close().
+
+    A fully read body is stored; if the reader stopped early only the
+    validators are kept, so the next run can still get a 304.
+    """
+
+    def __init__(self, response, cache, url):
+        self._response = response
+        self._cache = cache
+        self._cache_url = url
+        self._chunks = []
+        self._complete = False
+        self.status_code = response.status_code
+        self.headers = response.headers
+        self.url = str(response.url)
+        self.encoding = response.encoding
+        self.from_cache = False
+        self.not_modified = False
+
+    def iter_content(self, chunk_size=8192):
+        for chunk in self._response.iter_content(chunk_size):
+            self._chunks.append(chunk)
+            metrics.count('bytes_downloaded', len(chunk))
+            yield chunk
+        self._complete = True
+
+    def close(self):
+        if self._response is None:
+            return
+        if self._complete:
+            self.not_modified = self._cache.store(self._cache_url, self, content=b''.join(self._chunks))
+        else:
+            self._cache.store_validators(self._cache_url, self)
+        self._response.close()
+        self._response = None
+
+
+class HttpClient:
+    def __init__(self, timeout=DEFAULT_TIMEOUT, headers=None, http2=False, cache=None, replay_base=None):
+        """
+        Shared HTTP client with keep-alive connection pools per host.
+
+        Args:
+            timeout: Default timeout (seconds) when a call does not pass one
+            headers: Default headers, merged under any per-request headers
+            http2: Use an HTTP/2 capable httpx client if httpx and h2 are installed
+            cache: Optional HttpCache used by get_cached
+            replay_base: Base URL of a local replay server that receives every
+                request instead of the real upstream (benchmarks only)
+        """
+        self.timeout = timeout
+        self.cache = cache
+        self.replay_base = replay_base.rstrip('/') if replay_base else None
+        self.session = requests.Session()
+        self.session.headers.update(headers or DEFAULT_HEADERS)
+        adapter = HTTPAdapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.adapter = adapter
+
+        self.http2_client = None
+        if http2:
+            try:
+                import httpx
+                self.http2_client = httpx.Client(http2=True, headers=dict(self.session.headers))
+                # httpx renamed allow_redirects to follow_redirects in 0.20
+                params = inspect.signature(httpx.Client.request).parameters
+                self._redirect_kwarg = 'follow_redirects' if 'follow_redirects' in params else 'allow_redirects'
+                self._http2_errors = (httpx.HTTPError,)
+            except Exception as e:
+                print(f"HTTP/2 unavailable, using HTTP/1.1 keep-alive: {e}")
+
+        self._stats_lock = threading.Lock()
+        self._http2_requests = {}
+        # perf_counter() of the first request, for startup profiling
+        self.first_request_at = None
+
+    def request(self, method, url, **kwargs):
+        if self.first_request_at is None:
+            self.first_request_at = time.perf_counter()
+        kwargs.setdefault('timeout', self.timeout)
+        if self.replay_base:
+            url = replay_url(url, self.replay_base)
+        metrics.count('http_requests')
+        with metrics.span('fetch'):
+            if self.http2_client is not None and not kwargs.get('stream'):
+                with self._stats_lock:
+                    host = urlsplit(url).netloc
+                    self._http2_requests[host] = self._http2_requests.get(host, 0) + 1
+                kwargs.pop('stream', None)
+                kwargs[self._redirect_kwarg] = kwargs.pop('allow_redirects', True)
+                try:
+                    response = HttpxResponse(self.http2_client.request(method, url, **kwargs))
+                except self._http2_errors as e:
+                    # Raised as a requests exception, like on the HTTP/1.1 path (see TRANSPORT_ERRORS)
+                    raise requests.ConnectionError(str(e)) from e
+            else:
+                response = self.session.request(method, url, **kwargs)
+        # Streamed bodies are counted as they are read (see CachingStream)
+        if metrics.enabled and not kwargs.get('stream'):
+            metrics.count('bytes_downloaded', len(response.content))
+        return response
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def get_cached(self, url, max_age=0, **kwargs):
+        """
+        GET through the response cache.
+
+        Entries younger than max_age are served without a request; otherwise the
+        request carries If-None-Match/If-Modified-Since. The returned response has
+        `not_modified` set when the server answered 304 or sent an identical body.
+        """
+        if self.cache is None:
+            response = self.get(url, **kwargs)
+            response.from_cache = False
+            response.not_modified = False
+            return response
+
+        cached = self.cache.get_fresh(url, max_age)
+        if cached is not None:
+            return cached
+
+        base_headers = kwargs.pop('headers', None) or {}
+        headers = dict(base_headers)
+        headers.update(self.cache.validators(url))
+        response = self.get(url, headers=headers, **kwargs)
+
+        if response.status_code == 304:
+            cached = self.cache.not_modified(url)
+            if cached is not None and not cached.partial and not cached.truncated:
+                return cached
+            # Body went missing from the cache (or only a prefix was kept): fetch it unconditionally
+            response = self.get(url, headers=base_headers, **kwargs)
+
+        response.from_cache = False
+        response.not_modified = False
+        if response.status_code == 200:
+            response.not_modified = self.cache.store(url, response)
+        return response
+
+    def open_feed(self, url, watermark, **kwargs):
+        """
+        Open a feed or listing page for incremental reading.
+
+        Returns None when the server reports the document unchanged (304, or an
+        identical body from a server without validators) and it was already parsed
+        with this watermark without finding anything new. Otherwise returns a
+        response to read with iter_content() and close() when done.
+        """
+        kwargs['stream'] = True
+        if self.cache is None:
+            return self.get(url, **kwargs)
+
+        base_headers = kwargs.pop('headers', None) or {}
+        headers = dict(base_headers)
+        headers.update(self.cache.validators(url))
+        response = self.get(url, headers=headers, **kwargs)
+
+        if response.status_code == 304:
+            response.close()
+            cached = self.cache.not_modified(url)
+            if cached is not None and self.cache.is_idle(url, watermark):
+                return None
+            if cached is not None and not cached.partial:
+                return cached
+            # Only validators were kept last time: the body is needed again
+            response = self.get(url, headers=base_headers, **kwargs)
+
+        if response.status_code != 200:
+            return response
+
+        if not response.headers.get('ETag') and not response.headers.get('Last-Modified'):
+            # No validators: a full read is the only way to detect an unchanged body
+            response.from_cache = False
+            metrics.count('bytes_downloaded', len(response.content))
+            response.not_modified = self.cache.store(url, response)
+            if response.not_modified and self.cache.is_idle(url, watermark):
+                return None
+            return response
+
+        return CachingStream(response, self.cache, url)
+
+    def read_bounded(self, response, url, max_bytes, enough=None, content_types=HTML_CONTENT_TYPES, encoding=None):
+        """
+        Read an open streamed response, stopping early, and close it.
+
+        Args:
+            response: Unread response from a stream=True request
+            url: Cache key for the result
+            max_bytes: Never read more than this many bytes
+            enough: Optional callable fed each newly decoded piece of text; reading
+                stops as soon as it returns True (e.g. html_parser.TextBudget)
+            content_types: Accepted Content-Type values (None accepts anything)
+            encoding: Override the encoding from the response headers
+
+        Returns:
+            BoundedResponse (the response itself, closed and unread, if the status is not 200)
+
+        Raises:
+            UnexpectedContentType: The server did not send an accepted content type
+        """
+        if response.status_code != 200:
+            # Return the connection to the pool; callers only look at the status
+            response.close()
+            return response
+
+        content_type = response.headers.get('Content-Type', '').split(';')[0].strip().lower()
+        if content_types and content_type and content_type not in content_types:
+            response.close()
+            raise UnexpectedContentType(f"{url} is {content_type}")
+
+        encoding = encoding or response.encoding or 'utf-8'
+        decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+        chunks = []
+        size = 0
+        truncated = False
+        for chunk in response.iter_content(BOUNDED_CHUNK_SIZE):
+            chunk = chunk[:max_bytes - size]
+            chunks.append(chunk)
+            size += len(chunk)
+            if size >= max_bytes or (enough is not None and enough(decoder.decode(chunk))):
+                truncated = True
+                break
+        response.close()
+
+        content = b''.join(chunks)
+        metrics.count('bytes_downloaded', size)
+        length = response.headers.get('Content-Length')
+        if truncated and length and length.isdigit():
+            metrics.count('bytes_skipped', max(0, int(length) - size))
+
+        bounded = BoundedResponse(response, content, encoding, truncated)
+        if self.cache is not None:
+            self.cache.store(url, bounded, truncated=max_bytes if truncated else False)
+        return bounded
+
+    def get_bounded(self, url, max_bytes, enough=None, content_types=HTML_CONTENT_TYPES, encoding=None, max_age=0, **kwargs):
+        """
+        GET a page through the cache, reading at most max_bytes of it (see read_bounded).
+
+        A cached prefix of a previously truncated download is reused when it was
+        read with at least the same byte cap (callers use one `enough` per URL).
+        """
+        def usable(cached):
+            return cached is not None and not cached.partial and (not cached.truncated or cached.truncated >= max_bytes)
+
+        base_headers = kwargs.pop('headers', None) or {}
+        headers = dict(base_headers)
+        if self.cache is not None:
+            cached = self.cache.get_fresh(url, max_age, allow_truncated=True)
+            if usable(cached):
+                return cached
+            headers.update(self.cache.validators(url))
+
+        response = self.get(url, headers=headers, stream=True, **kwargs)
+        if response.status_code == 304:
+            response.close()
+            cached = self.cache.not_modified(url)
+            if usable(cached):
+                return cached
+            response = self.get(url, headers=base_headers, stream=True, **kwargs)
+        return self.read_bounded(response, url, max_bytes, enough, content_types, encoding)
+
+    def head(self, url, **kwargs):
+        kwargs.setdefault('allow_redirects', False)
+        return self.request("HEAD", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def prewarm(self, urls, max_workers=8):
+        """Open connections to every distinct origin in `urls` concurrently."""
+        origins = []
+        for url in urls:
+            parts = urlsplit(url)
+            origin = f"{parts.scheme}://{parts.netloc}/"
+            if parts.netloc and origin not in origins:
+                origins.append(origin)
+
+        def warm(origin):
+            response = self.head(origin, timeout=5)
+            response.close()
+            return origin
+
+        return [origin for origin in fetch_all(warm, origins, max_workers) if origin]
+
+    def connection_stats(self):
+        """
+        Return per-host connection reuse statistics.
+
+        Returns:
+            Dict of host -> {'requests', 'connections', 'reused'}
+        """
+        stats = {}
+        pools = self.adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            host = pool.host if pool.port in (None, 80, 443) else f"{pool.host}:{pool.port}"
+            entry = stats.setdefault(host, {'requests': 0, 'connections': 0, 'reused': 0})
+            entry['requests'] += pool.num_requests
+            entry['connections'] += pool.num_connections
+            entry['reused'] = max(0, entry['requests'] - entry['connections'])
+
+        with self._stats_lock:
+            for host, count in self._http2_requests.items():
+                entry = stats.setdefault(host, {'requests': 0, 'connections': 0, 'reused': 0})
+                entry['requests'] += count
+
+        return stats
+
+    def close(self):
+        self.session.close()
+        if self.http2_client is not None:
+            self.http2_client.close()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_client():
+    """Return the process-wide shared HttpClient, creating it on first use."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = HttpClient()
+    return _client
+
+def configure(**kwargs):
+    """Replace the shared client (e.g. to enable HTTP/2) before any service uses it."""
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+        _client = HttpClient(**kwargs)
+    return _client
+
+def get(url, **kwargs):
+    return get_client().get(url, **kwargs)
+
+def post(url, **kwargs):
+    return get_client().post(url, **kwargs)
+
+def get_cached(url, max_age=0, **kwargs):
+    return get_client().get_cached(url, max_age=max_age, **kwargs)
+
+def open_feed(url, watermark, **kwargs):
+    return get_client().open_feed(url, watermark, **kwargs)
+
+def get_bounded(url, max_bytes, **kwargs):
+    return get_client().get_bounded(url, max_bytes, **kwargs)
+
+def read_bounded(response, url, max_bytes, **kwargs):
+    return get_client().read_bounded(response, url, max_bytes, **kwargs)
+
+def mark_idle(url, watermark):
+    """Record that the cached body of `url` held nothing newer than `watermark`."""
+    cache = get_client().cache
+    if cache is not None:
+        cache.mark_idle(url, watermark)
+
+def is_idle(url, watermark):
+    cache = get_client().cache
+    return cache is not None and cache.is_idle(url, watermark)
@@ -0,0 +1,88 @@
+import os
+import json
+import time
+import threading
+from services import http_client
+
+DEFAULT_CACHE_FILE = os.path.join(os.getenv('DATA_DIR') or os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'data'), 'resolved_links.json')
+DEFAULT_TTL = 30 * 86400
+
+
+class LinkResolver:
+    def __init__(self, cache_file=DEFAULT_CACHE_FILE, ttl=DEFAULT_TTL):
+        """
+        Resolve redirecting links (e.g. news.google.com articles) to their canonical URL.
+
+        Resolutions are persisted as a URL -> canonical URL map so later runs skip
+        the redirect round trip entirely.
+
+        Args:
+            cache_file: JSON file holding the map (None keeps it in memory only)
+            ttl: Seconds before a resolution is looked up again
+        """
+        self.cache_file = cache_file
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.links = self._load()
+
+    def _load(self):
+        if self.cache_file and os.path.exists(self.cache_file):
+            try:
+                with open(self.cache_file, 'r') as f:
+                    links = json.load(f)
+                now = time.time()
+                return {url: entry for url, entry in links.items() if now - entry['resolved_at'] <= self.ttl}
+            except Exception as e:
+                print(f"Ignoring unreadable link cache: {e}")
+        return {}
+
+    def _save(self):
+        if not self.cache_file:
+            return
+        os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
+        tmp_file = f"{self.cache_file}.tmp"
+        with open(tmp_file, 'w') as f:
+            json.dump(self.links, f)
+        os.replace(tmp_file, self.cache_file)
+
+    def lookup(self, url):
+        """Return the stored canonical URL, or None if unknown or expired."""
+        with self.lock:
+            entry = self.links.get(url)
+        if entry and time.time() - entry['resolved_at'] <= self.ttl:
+            return entry['url']
+        return None
+
+    def remember(self, url, canonical):
+        with self.lock:
+            self.links[url] = {'url': canonical, 'resolved_at': time.time()}
+            self._save()
+
+    def open(self, url, **kwargs):
+        """
+        Follow redirects for `url` without reading the final body.
+
+        Returns:
+            (canonical_url, response) where response is the still-unread final
+            response, or None if the resolution came from the map. The caller
+            must read or close the response.
+        """
+        canonical = self.lookup(url)
+        if canonical:
+            return canonical, None
+
+        response = http_client.get(url, stream=True, **kwargs)
+        canonical = str(response.url)
+        if response.status_code == 200:
+            self.remember(url, canonical)
+        return canonical, response
+
+    def resolve(self, url, **kwargs):
+        """Return the canonical URL, fetching only headers and redirects."""
+        try:
+            canonical, response = self.open(url, **kwargs)
+            if response is not None:
+                response.close()
+            return canonical
+        except Exception:
+            return url
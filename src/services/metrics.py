@@ -0,0 +1,186 @@
+import os
+import json
+import time
+import threading
+import contextvars
+from datetime import datetime
+
+# Instrumentation is off unless enable() is called; every hook then returns
+# after a single flag check
+enabled = False
+
+PROMETHEUS_PREFIX = 'wwmbot'
+
+# Source (history key) the current thread is working for; propagated to
+# detail fetch threads by fetcher.fetch_all
+_source = contextvars.ContextVar('metrics_source', default='')
+
+_lock = threading.Lock()
+_spans = {}      # (stage, source) -> [calls, total seconds, max seconds]
+_counters = {}   # (name, source) -> value
+_run_started = None
+
+
+class _NoopSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class _Span:
+    def __init__(self, stage, source):
+        self.stage = stage
+        self.source = source
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        record(self.stage, time.perf_counter() - self.started, self.source)
+        return False
+
+
+def enable():
+    global enabled
+    enabled = True
+
+
+def start_run():
+    """Clear all spans and counters at the start of a polling cycle."""
+    global _run_started
+    with _lock:
+        _spans.clear()
+        _counters.clear()
+        _run_started = time.time()
+
+
+def set_source(source):
+    """Attribute spans and counters in the current context to `source`; returns a reset token."""
+    return _source.set(source)
+
+
+def reset_source(token):
+    _source.reset(token)
+
+
+def span(stage, source=None):
+    """
+    Time a block as one call of `stage` (fetch, parse, enrich, translate, dispatch).
+
+    Usage:
+        with metrics.span('parse'):
+            ...
+    """
+    if not enabled:
+        return _NOOP_SPAN
+    return _Span(stage, _source.get() if source is None else source)
+
+
+def record(stage, seconds, source=None):
+    if not enabled:
+        return
+    key = (stage, _source.get() if source is None else source)
+    with _lock:
+        entry = _spans.get(key)
+        if entry is None:
+            _spans[key] = [1, seconds, seconds]
+        else:
+            entry[0] += 1
+            entry[1] += seconds
+            entry[2] = max(entry[2], seconds)
+
+
+def count(name, value=1, source=None):
+    """Add `value` to a counter such as bytes_downloaded or posts_found."""
+    if not enabled:
+        return
+    key = (name, _source.get() if source is None else source)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def snapshot():
+    """
+    Return the current run's measurements.
+
+    Returns:
+        Dict with started_at, duration, spans (list of stage/source/calls/seconds/max)
+        and counters (list of name/source/value)
+    """
+    with _lock:
+        started = _run_started
+        spans = [
+            {'stage': stage, 'source': source, 'calls': calls, 'seconds': total, 'max': longest}
+            for (stage, source), (calls, total, longest) in sorted(_spans.items())
+        ]
+        counters = [
+            {'name': name, 'source': source, 'value': value}
+            for (name, source), value in sorted(_counters.items())
+        ]
+    return {
+        'started_at': datetime.fromtimestamp(started).isoformat() if started else None,
+        'duration': time.time() - started if started else None,
+        'spans': spans,
+        'counters': counters,
+    }
+
+
+def write_journal(path, **extra):
+    """Append the current run as one JSON line to `path`."""
+    entry = snapshot()
+    entry.update(extra)
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+
+
+def _labels(**labels):
+    parts = [f'{name}="{value}"' for name, value in labels.items() if value]
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+def write_prometheus(path):
+    """
+    Write the current run in the Prometheus text format, e.g. for the
+    node_exporter textfile collector. The file is replaced atomically.
+    """
+    data = snapshot()
+    lines = [
+        f"# HELP {PROMETHEUS_PREFIX}_stage_seconds Time spent per stage in the last run.",
+        f"# TYPE {PROMETHEUS_PREFIX}_stage_seconds gauge",
+    ]
+    for entry in data['spans']:
+        lines.append(f"{PROMETHEUS_PREFIX}_stage_seconds{_labels(stage=entry['stage'], source=entry['source'])} {entry['seconds']:.6f}")
+    lines.append(f"# HELP {PROMETHEUS_PREFIX}_stage_calls Calls per stage in the last run.")
+    lines.append(f"# TYPE {PROMETHEUS_PREFIX}_stage_calls gauge")
+    for entry in data['spans']:
+        lines.append(f"{PROMETHEUS_PREFIX}_stage_calls{_labels(stage=entry['stage'], source=entry['source'])} {entry['calls']}")
+
+    names = sorted({entry['name'] for entry in data['counters']})
+    for name in names:
+        lines.append(f"# TYPE {PROMETHEUS_PREFIX}_{name} gauge")
+        for entry in data['counters']:
+            if entry['name'] == name:
+                lines.append(f"{PROMETHEUS_PREFIX}_{name}{_labels(source=entry['source'])} {entry['value']}")
+
+    if data['duration'] is not None:
+        lines.append(f"# TYPE {PROMETHEUS_PREFIX}_run_duration_seconds gauge")
+        lines.append(f"{PROMETHEUS_PREFIX}_run_duration_seconds {data['duration']:.6f}")
+        lines.append(f"# TYPE {PROMETHEUS_PREFIX}_last_run_timestamp_seconds gauge")
+        lines.append(f"{PROMETHEUS_PREFIX}_last_run_timestamp_seconds {time.time():.0f}")
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_file = f"{path}.tmp"
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(lines) + '\n')
+    os.replace(tmp_file, path)
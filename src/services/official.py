@@ -1,27 +1,119 @@
-from bs4 import BeautifulSoup
-import requests
-import time
+from services import http_client, html_parser
 import re
 from datetime import datetime
+from urllib.parse import urljoin
+from services.fetcher import iter_all, DEFAULT_MAX_WORKERS
+from services import feed_stream, metrics
+from services.posts import Post
+
+# Only the title and the article body subtrees are built when parsing a news page
+CONTENT_STRAINER = html_parser.classes_strainer('content', 'news-detail', 'art_content', 'main_content', tags=('h1',), ids=('content',))
+
+NEWS_LINK_RE = re.compile(r'href="(https://www.yysls.cn/news/.*?\.html)"')
+# Only the newest links on the listing page are considered
+MAX_LINKS = 5
+# Newest news index entries considered per poll; more than MAX_LINKS so a gap after an outage is filled
+MAX_INDEX_ENTRIES = 20
+
+# News links carry the publish date and the article ID: .../20260203/40412_1285159.html
+LINK_DATE_RE = re.compile(r'/(\d{8})/')
+ARTICLE_ID_RE = re.compile(r'(\d+)\.html$')
+# "2026-02-03 10:00[:00]" or "2026年2月3日 10:00" as shown on article pages
+PUBLISH_TIME_RE = re.compile(r'(\d{4})[-/年](\d{1,2})[-/月](\d{1,2})日?\s*(\d{1,2}):(\d{2})(?::(\d{2}))?')
+# Article IDs order posts published within the same second: the ID modulo this
+# becomes the fraction of a second added to the publish time
+ID_TIE_BREAK = 1000000
+
+# Article pages are read until the body has this much visible text, or the byte cap is hit
+ARTICLE_MAX_BYTES = 512 * 1024
+ARTICLE_MIN_CHARS = 3000
+CONTENT_MARKERS = ('class="content"', 'class="news-detail"', 'class="art_content"', 'class="main_content"', 'id="content"')
+
+def parse_publish_time(value):
+    """
+    Read a publish time from a news index field or the top of an article page.
+
+    Args:
+        value: Seconds or milliseconds since the epoch, "YYYY-MM-DD HH:MM[:SS]"
+            (or its 年月日 form), or a bare "YYYY-MM-DD"
+
+    Returns:
+        UNIX timestamp (local time, like the site), or None if there is none
+    """
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return value / 1000 if value > 1e11 else float(value)
+    if not isinstance(value, str):
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return parse_publish_time(int(value))
+    match = PUBLISH_TIME_RE.search(value)
+    if match:
+        year, month, day, hour, minute, second = match.groups()
+        return datetime(int(year), int(month), int(day), int(hour), int(minute), int(second or 0)).timestamp()
+    try:
+        return datetime.strptime(value[:10].replace('/', '-'), "%Y-%m-%d").timestamp()
+    except ValueError:
+        return None
+
+
+def cursor_timestamp(published, link):
+    """Publish time plus the article ID as a tie-break, so posts of the same second keep a stable order."""
+    id_match = ARTICLE_ID_RE.search(link)
+    if not id_match:
+        return published
+    return int(published) + int(id_match.group(1)) % ID_TIE_BREAK / ID_TIE_BREAK
+
+
+def legacy_link_timestamp(link):
+    """Timestamp the service used to derive from a link (publish date + ID % 86400), for upgrading watermarks."""
+    date = link_date(link)
+    id_match = ARTICLE_ID_RE.search(link)
+    if date is None or not id_match:
+        return None
+    return date.timestamp() + int(id_match.group(1)) % 86400
+
+
+def link_date(link):
+    """Publish date from a news link, or None."""
+    date_match = LINK_DATE_RE.search(link)
+    if not date_match:
+        return None
+    try:
+        return datetime.strptime(date_match.group(1), "%Y%m%d")
+    except ValueError:
+        return None
+
 
 class OfficialService:
-    def __init__(self):
+    def __init__(self, max_workers=DEFAULT_MAX_WORKERS, max_article_bytes=ARTICLE_MAX_BYTES):
         self.url = "https://www.yysls.cn/news/"
         self.api_url = "https://yysls.cn/news/index.json" 
+        # Number of article pages fetched in parallel
+        self.max_workers = max_workers
+        # Download cap per article page
+        self.max_article_bytes = max_article_bytes
+        # News index (response, error) fetched by upgrade_watermark, reused by the next poll
+        self.pending_index = None
 
     def get_post_content(self, link):
         """Scrape full content, images, and videos from a specific news page."""
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36"
-        }
         try:
-            response = requests.get(link, headers=headers, timeout=20)
+            # NetEase pages are utf-8 whatever the headers say
+            response = http_client.get_bounded(
+                link, self.max_article_bytes, max_age=http_client.ARTICLE_MAX_AGE, encoding='utf-8',
+                enough=html_parser.TextBudget(ARTICLE_MIN_CHARS, CONTENT_MARKERS)
+            )
             if response.status_code != 200:
                 return None
             
-            # Fix encoding if necessary (NetEase often uses utf-8)
             response.encoding = 'utf-8'
-            soup = BeautifulSoup(response.text, 'html.parser')
+            soup = html_parser.parse(response.text, only=CONTENT_STRAINER)
+            # The publish time sits above the article body; dates inside the body are event dates
+            head = response.text
+            for marker in CONTENT_MARKERS:
+                head = head.split(marker, 1)[0]
+            published = parse_publish_time(head) if PUBLISH_TIME_RE.search(head) else None
             
             # Title extraction - usually in h1
             title = soup.find('h1').get_text(strip=True) if soup.find('h1') else "Official News"
@@ -31,8 +123,8 @@ class OfficialService:
             content_div = soup.select_one('.content, .news-detail, .art_content, .main_content, #content')
             
             if not content_div:
-                # Fallback if no specific div found
-                full_text = soup.get_text(separator='\n', strip=True)
+                # Fallback if no specific div found: parse the whole page
+                full_text = html_parser.parse(response.text).get_text(separator='\n', strip=True)
                 images = []
                 videos = []
             else:
@@ -65,82 +157,208 @@ class OfficialService:
                 'title': title,
                 'text': full_text,
                 'images': images,
-                'videos': videos
+                'videos': videos,
+                'published': published
             }
         except Exception as e:
             print(f"Error scraping post content: {e}")
             return None
 
+    def _scrape(self, link):
+        with metrics.span('enrich'):
+            return self.get_post_content(link)
+
     def get_new_posts(self, last_check_timestamp):
-        print(f"Checking Official Website: {self.url}")
-        
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36"
-        }
-        
+        return list(self.iter_new_posts(last_check_timestamp))
+
+    def _get_index(self, keep=False):
+        """
+        GET the news index, reusing the response (or error) kept by a previous call.
+
+        Args:
+            keep: Keep the result for the next call, so converting watermarks
+                and the first poll of a run share one request
+
+        Raises:
+            ValueError: The index answered with an error status
+            http_client.TRANSPORT_ERRORS: The index could not be reached
+        """
+        pending, self.pending_index = self.pending_index, None
+        if pending is None:
+            try:
+                pending = (http_client.get_cached(self.api_url, timeout=10), None)
+            except http_client.TRANSPORT_ERRORS as e:
+                pending = (None, e)
+        if keep:
+            self.pending_index = pending
+        response, error = pending
+        if error is not None:
+            raise error
+        if response.status_code != 200:
+            raise ValueError(f"HTTP {response.status_code}")
+        return response
+
+    def _index_entries(self, data):
+        """
+        Read the news index: {"code": 0, "data": {"list": [{"id", "title", "url", "time"}, ...]}}.
+
+        Returns:
+            List of (link, title, timestamp) for every entry with a link and publish time
+
+        Raises:
+            ValueError: If the document is not a news index or reports an error
+        """
+        if not isinstance(data, dict) or data.get('code') != 0:
+            raise ValueError(f"index error code {data.get('code') if isinstance(data, dict) else None}")
+        items = (data.get('data') or {}).get('list')
+        if not isinstance(items, list):
+            raise ValueError("no data.list of news entries")
+
+        entries = []
+        for item in items:
+            link = item.get('url')
+            published = parse_publish_time(item.get('time'))
+            if not link or published is None:
+                continue
+            link = urljoin(self.url, link)
+            entries.append((link, item.get('title') or "Official News Update", cursor_timestamp(published, link)))
+        if items and not entries:
+            raise ValueError("entries have no link or publish time")
+        return entries
+
+    def upgrade_watermark(self, value):
+        """
+        Convert a watermark of the old date + (ID % 86400) timestamps to a publish time cursor.
+
+        Returns:
+            The cursor of the news index entry the watermark was taken from, the
+            watermark itself if no entry matches (it is older than the index),
+            or None if the index is unavailable
+        """
+        try:
+            entries = self._index_entries(self._get_index(keep=True).json())
+        except (ValueError, *http_client.TRANSPORT_ERRORS) as e:
+            print(f"Official news index unavailable ({e}), watermark not converted yet")
+            return None
+        for link, _, ts in entries:
+            if legacy_link_timestamp(link) == value:
+                return ts
+        return value
+
+    def _read_index(self, last_check_timestamp):
+        """
+        Return the (link, title, timestamp) index entries past the watermark,
+        None if the index is unchanged, or raise ValueError if it is unusable.
+        """
+        response = self._get_index()
+        if response.not_modified and http_client.is_idle(self.api_url, last_check_timestamp):
+            return None
+        entries = self._index_entries(response.json())
+        entries.sort(key=lambda entry: entry[2], reverse=True)
+        return [entry for entry in entries[:MAX_INDEX_ENTRIES] if entry[2] > last_check_timestamp]
+
+    def _read_listing(self, last_check_timestamp):
+        """
+        Scrape the HTML listing for links that may be past the watermark.
+
+        Only the publish date is in a link, so links of the watermark's day and
+        later are returned and their exact time is read from the article page.
+
+        Returns:
+            List of (link, date), or None if the listing is unchanged
+        """
+        response = http_client.open_feed(self.url, last_check_timestamp)
+        if response is None:
+            return None
         try:
-            response = requests.get(self.url, headers=headers, timeout=20)
             if response.status_code != 200:
-                print(f"Error fetching Official Site: HTTP {response.status_code}")
-                return []
-            
-            links = re.findall(r'href="(https://www.yysls.cn/news/.*?\.html)"', response.text)
+                raise http_client.SourceUnavailable.from_status("Official Site", response.status_code)
+
+            # Scan the listing as it downloads and stop once enough links are found
+            unique_links = []
+            for match in feed_stream.iter_matches(response.iter_content(feed_stream.CHUNK_SIZE), NEWS_LINK_RE):
+                if match.group(1) not in unique_links:
+                    unique_links.append(match.group(1))
+                    if len(unique_links) >= MAX_LINKS:
+                        break
+        finally:
+            response.close()
+
+        since = datetime.fromtimestamp(last_check_timestamp).replace(hour=0, minute=0, second=0, microsecond=0)
+        candidates = []
+        for link in unique_links:
+            date = link_date(link)
+            if date is None or date >= since:
+                candidates.append((link, date))
+        return candidates
+
+    def _post(self, link, title, ts, details):
+        if details:
+            return Post(details['title'], link, details['text'], ts, 'Official Site',
+                        images=details['images'], videos=details['videos'])
+        # Fallback simple record if scraping fails
+        return Post(title, link, "Could not scrape content.", ts, 'Official Site')
+
+    def iter_new_posts(self, last_check_timestamp):
+        """
+        Yield new posts oldest first.
+
+        New entries come from the JSON news index, which has real publish
+        times, and each is handed on as soon as its article page has been
+        scraped. If the index is unavailable, the HTML listing is scraped instead.
+        """
+        print(f"Checking Official Website: {self.url}")
+
+        try:
+            try:
+                entries = self._read_index(last_check_timestamp)
+            except (ValueError, *http_client.TRANSPORT_ERRORS) as e:
+                print(f"Official news index unavailable ({e}), falling back to the listing page")
+            else:
+                if entries is None:
+                    print("Official news index unchanged since last check.")
+                    return
+                entries.sort(key=lambda entry: entry[2])
+                # Only entries past the cursor cost an article page; they are fetched in parallel
+                details_list = iter_all(self._scrape, [link for link, _, _ in entries], self.max_workers)
+                for (link, title, ts), details in zip(entries, details_list):
+                    yield self._post(link, title, ts, details)
+                if not entries:
+                    http_client.mark_idle(self.api_url, last_check_timestamp)
+                return
+
+            candidates = self._read_listing(last_check_timestamp)
+            if candidates is None:
+                print("Official Site unchanged since last check.")
+                return
+
+            # Publish times are only known once the pages are in, so they are all read before sorting
+            details_list = list(iter_all(self._scrape, [link for link, _ in candidates], self.max_workers))
             new_posts = []
-            
-            seen = set()
-            unique_links = [x for x in links if not (x in seen or seen.add(x))]
-            
-            for link in unique_links[:5]:
-                date_match = re.search(r'/(\d{8})/', link)
-                ts = time.time()
-                if date_match:
-                    try:
-                        parsed_date = datetime.strptime(date_match.group(1), "%Y%m%d")
-                        base_ts = parsed_date.timestamp()
-                        
-                        # Extract a stable offset from the ID in the link to differentiate posts on the same day
-                        # Link pattern example: .../20260203/40412_1285159.html
-                        id_match = re.search(r'(\d+)\.html$', link)
-                        if id_match:
-                            # Use the ID as a second-offset (modulo one day) to keep it stable and readable
-                            # This ensures two posts on the same day have different but STABLE timestamps
-                            offset = int(id_match.group(1)) % 86400
-                            ts = base_ts + offset
-                        else:
-                            ts = base_ts
-                    except:
-                        ts = time.time() # Extreme fallback
-                else:
-                    ts = time.time()
-                
+            for (link, date), details in zip(candidates, details_list):
+                published = details.get('published') if details else None
+                if published is None or (date is not None and datetime.fromtimestamp(published).date() != date.date()):
+                    # No usable time on the page: the start of the link's publish day
+                    published = date.timestamp() if date is not None else None
+                    if published is not None and int(last_check_timestamp) > published:
+                        # A post of the watermark's day may still be unseen: the watermark's
+                        # fraction is the ID of the last post, and article IDs only grow,
+                        # so the IDs decide within the watermark's second
+                        published = int(last_check_timestamp)
+                if published is None:
+                    continue
+                ts = cursor_timestamp(published, link)
                 if ts > last_check_timestamp:
-                    # Fetch full details
-                    details = self.get_post_content(link)
-                    if details:
-                        new_posts.append({
-                            'title': details['title'],
-                            'link': link,
-                            'text': details['text'],
-                            'timestamp': ts,
-                            'author': 'Official Site',
-                            'images': details['images'],
-                            'videos': details['videos']
-                        })
-                    else:
-                        # Fallback simple record if scraping fails
-                        new_posts.append({
-                            'title': "Official News Update",
-                            'link': link,
-                            'text': "Could not scrape content.",
-                            'timestamp': ts,
-                            'author': 'Official Site',
-                            'images': [],
-                            'videos': []
-                        })
-
-            new_posts.sort(key=lambda x: x['timestamp'])
-            return new_posts
-            
+                    new_posts.append(self._post(link, "Official News Update", ts, details))
+            new_posts.sort(key=lambda post: post['timestamp'])
+            yield from new_posts
+
+            if not new_posts:
+                http_client.mark_idle(self.url, last_check_timestamp)
+
+        except http_client.SourceUnavailable:
+            raise
+        except http_client.TRANSPORT_ERRORS as e:
+            raise http_client.SourceUnavailable(f"Official Site: {e}") from e
         except Exception as e:
              print(f"Exception fetching Official Site: {e}")
-             return []
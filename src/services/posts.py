@@ -0,0 +1,20 @@
+class Post(dict):
+    def __init__(self, title, link, text, timestamp, author, images=None, videos=None, **extra):
+        """
+        A new post as yielded by a service's iter_new_posts().
+
+        Still a dict, so posts are read with post['title'] as before and the
+        pipeline can attach fingerprint and translations to them.
+
+        Args:
+            title: Post title in the source language
+            link: Canonical URL of the post
+            text: Plain text body (may be truncated by the service)
+            timestamp: Publish time (Unix seconds), the watermark of timestamp sources
+            author: Author or site name shown in the embed footer
+            images: Image URLs
+            videos: Video or player URLs
+            **extra: Service specific fields, e.g. post_id for ID-tracked sources
+        """
+        super().__init__(title=title, link=link, text=text, timestamp=timestamp, author=author,
+                         images=images or [], videos=videos or [], **extra)
@@ -1,4 +1,4 @@
-import requests
+from services import http_client
 import time
 from datetime import datetime
 
@@ -33,7 +33,6 @@ class RedditService:
             "Accept-Language": "en-US,en;q=0.9",
             "Accept-Encoding": "gzip, deflate, br",
             "DNT": "1",
-            "Connection": "keep-alive",
             "Upgrade-Insecure-Requests": "1"
         }
         
@@ -42,7 +41,7 @@ class RedditService:
         }
         
         try:
-            response = requests.get(self.base_url, headers=headers, params=params, timeout=20)
+            response = http_client.get(self.base_url, headers=headers, params=params)
             
             if response.status_code != 200:
                 print(f"Error fetching Reddit r/{self.subreddit}: HTTP {response.status_code}")
@@ -92,7 +91,7 @@ class RedditService:
             
             return new_posts
             
-        except requests.exceptions.RequestException as e:
+        except http_client.TRANSPORT_ERRORS as e:
             print(f"Request error fetching Reddit r/{self.subreddit}: {e}")
             return []
         except Exception as e:
@@ -1,138 +1,176 @@
-import feedparser
 import time
 import random
-import requests
+from services import http_client, html_parser, feed_stream
+from services.posts import Post
 from datetime import datetime
 
+# Reddit caps a listing at 100 entries
+MAX_LISTING_LIMIT = 100
+
 class RedditRSSService:
-    def __init__(self, subreddit, post_limit=5):
+    def __init__(self, subreddits, post_limit=5):
         """
         Initialize Reddit service using RSS feeds (no authentication required).
         
+        Several subreddits are fetched in one request through Reddit's combined
+        r/a+b listing and the entries are split back per subreddit.
+        
         Args:
-            subreddit: Name of the subreddit (without r/)
-            post_limit: Number of hot posts to fetch (default: 5)
+            subreddits: Name of the subreddit (without r/), or a list of names
+            post_limit: Number of hot posts to fetch per subreddit (default: 5)
         """
-        self.subreddit = subreddit
+        self.subreddits = [subreddits] if isinstance(subreddits, str) else list(subreddits)
+        self.subreddit = '+'.join(self.subreddits)
         self.post_limit = post_limit
+        self.rss_url = self.feed_url(self.subreddits)
+
+    def feed_url(self, subreddits):
         # Use /top/.rss?t=day to get the highest upvoted posts of the day
         # This prioritizes high upvote counts as requested
-        self.rss_url = f"https://www.reddit.com/r/{subreddit}/top/.rss?t=day&limit={post_limit}"
-        
+        # The combined listing ranks all subreddits together, so a busy one could fill
+        # a small limit on its own; ask for the full listing and trim each subreddit
+        # to post_limit afterwards
+        return f"https://www.reddit.com/r/{'+'.join(subreddits)}/top/.rss?t=day&limit={MAX_LISTING_LIMIT}"
+
     def get_new_posts(self, last_check):
         """
-        Fetch new hot posts from the subreddit using RSS feed.
+        Fetch new hot posts from every configured subreddit using one RSS feed.
         
         Args:
-            last_check: Unix timestamp (float) OR list of seen post IDs
+            last_check: Unix timestamp (float) OR list/set of seen post IDs
             
         Returns:
-            List of new posts with title, link, text, timestamp, and author
+            List of new posts with title, link, text, timestamp, author and subreddit
         """
-        print(f"Checking Reddit r/{self.subreddit} via RSS")
-        
-        # Determine strict mode (timestamp) vs dedup mode (ids)
-        seen_ids = set()
-        min_timestamp = 0
+        return list(self.iter_new_posts(last_check))
+
+    def iter_new_posts(self, last_check):
+        """Yield the new posts of every configured subreddit, oldest first."""
+        for _, post in self.iter_new_posts_by_feed({subreddit: last_check for subreddit in self.subreddits}):
+            yield post
+
+    def get_new_posts_by_feed(self, last_checks):
+        """
+        Fetch several subreddits in one request and demultiplex the entries.
         
-        if isinstance(last_check, list):
-            seen_ids = set(last_check)
-        else:
-            min_timestamp = float(last_check)
+        Args:
+            last_checks: Dict of subreddit name -> timestamp or set of seen post IDs
+            
+        Returns:
+            Dict of subreddit name -> list of new posts (oldest first)
+
+        Raises:
+            SourceUnavailable: Reddit could not be reached or answered with an error
+        """
+        new_posts = {subreddit: [] for subreddit in last_checks}
+        for subreddit, post in self.iter_new_posts_by_feed(last_checks):
+            new_posts[subreddit].append(post)
+        return new_posts
+
+    def iter_new_posts_by_feed(self, last_checks):
+        """
+        Like get_new_posts_by_feed, but yield (subreddit, post) pairs oldest first
+        once the listing has been read.
+        """
+        subreddits = list(last_checks)
+        combined = '+'.join(subreddits)
+        print(f"Checking Reddit r/{combined} via RSS")
+        new_posts = {subreddit: [] for subreddit in subreddits}
+        # Reddit may spell a subreddit differently from the configuration
+        names = {subreddit.lower(): subreddit for subreddit in subreddits}
+        # The feed is unchanged-and-idle only for the same watermarks of every subreddit
+        watermark = [[subreddit, sorted(check) if isinstance(check, (list, set)) else check]
+                     for subreddit, check in sorted(last_checks.items())]
             
         try:
-        # ... logic ...
             # Add random user agent to avoid simple blocking
             headers = {
                 'User-Agent': f'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/{random.randint(100, 120)}.0.0.0 Safari/537.36'
             }
             
             # Fetch RSS content manually first to handle headers better
-            response = requests.get(self.rss_url, headers=headers, timeout=10)
+            feed_url = self.feed_url(subreddits)
+            response = http_client.open_feed(feed_url, watermark, headers=headers, timeout=10)
             
-            if response.status_code != 200:
-                print(f"Error fetching RSS for r/{self.subreddit}: HTTP {response.status_code}")
-                # Try alternative URL format if first fails
-                alt_url = f"https://old.reddit.com/r/{self.subreddit}/hot/.rss"
+            if response is not None and response.status_code >= 500:
+                # Reddit itself is down, old.reddit.com with it: leave it to the retry policy
+                response.close()
+                raise http_client.SourceUnavailable.from_status(f"Reddit r/{combined}", response.status_code)
+            if response is not None and response.status_code != 200:
+                response.close()
+                print(f"Error fetching RSS for r/{combined}: HTTP {response.status_code}")
+                # Try alternative URL format if the request was refused
+                alt_url = f"https://old.reddit.com/r/{combined}/hot/.rss"
                 print(f"Retrying with {alt_url}...")
-                response = requests.get(alt_url, headers=headers, timeout=10)
-                if response.status_code != 200:
-                    return []
+                feed_url = alt_url
+                response = http_client.open_feed(feed_url, watermark, headers=headers, timeout=10)
+                if response is not None and response.status_code != 200:
+                    response.close()
+                    raise http_client.SourceUnavailable.from_status(f"Reddit r/{combined}", response.status_code)
 
-            # Parse RSS content
-            feed = feedparser.parse(response.content)
-            
-            new_posts = []
-            
-            # Iterate through entries
-            # RSS feeds usually have ~25 entries, we take recent ones
-            for entry in feed.entries:
-                # Parse timestamp
-                published_time = time.mktime(entry.published_parsed) if hasattr(entry, 'published_parsed') else time.time()
-                
-                # Extract link and ID
-                link = entry.get('link', '')
-                post_id = link.split('/comments/')[-1].split('/')[0] if '/comments/' in link else link
-                
-                is_new = False
-                
-                # Check if new based on mode
-                if seen_ids:
-                    # ID mode: New if ID not in seen list
-                    if post_id and post_id not in seen_ids:
-                        is_new = True
-                else:
-                    # Timestamp mode: New if newer than last check
-                    if published_time > min_timestamp:
-                        is_new = True
-                
-                if is_new:
-                    # Extract information
-                    title = entry.get('title', 'No Title')
-                    author = entry.get('author', 'Unknown')
-                    
-                    # Get content
-                    content = ''
-                    if hasattr(entry, 'content'):
-                        content = entry.content[0].value
-                    elif hasattr(entry, 'summary'):
-                        content = entry.summary
-                        
-                    # Simple HTML cleanup (very basic)
-                    import re
-                    # Remove HTML tags
-                    text_content = re.sub(r'<[^>]+>', '', content)
-                    # Unescape entities
-                    import html
-                    text_content = html.unescape(text_content)
-                    
-                    # Limit text length
-                    if len(text_content) > 500:
-                        text_content = text_content[:497] + "..."
+            if response is None:
+                print(f"RSS for r/{combined} unchanged since last check.")
+                return
+
+            # Parse the feed incrementally; every new entry is kept, as the listing is in
+            # score order and only the oldest post_limit per subreddit are taken
+            try:
+                for entry in feed_stream.iter_entries(response.iter_content(feed_stream.CHUNK_SIZE)):
+                    # Extract link, subreddit and ID
+                    link = entry['link']
+                    subreddit = names.get(link.split('/r/')[-1].split('/')[0].lower()) if '/r/' in link else None
+                    if subreddit is None:
+                        continue
+                    post_id = link.split('/comments/')[-1].split('/')[0] if '/comments/' in link else link
+
+                    # Parse timestamp
+                    published_time = time.mktime(entry['published_parsed']) if entry['published_parsed'] else time.time()
                     
+                    # Check if new based on mode: ID mode (seen IDs) or timestamp mode
+                    last_check = last_checks[subreddit]
+                    if isinstance(last_check, (list, set)):
+                        is_new = bool(post_id) and post_id not in last_check
+                    else:
+                        is_new = published_time > float(last_check)
                     
-                    new_posts.append({
-                        'title': title,
-                        'link': link,
-                        'text': text_content if text_content else "View post on Reddit",
-                        'timestamp': published_time,
-                        'author': author,
-                        'score': 0,  # RSS doesn't provide score
-                        'post_id': post_id
-                    })
-            
-            # Sort by timestamp (oldest first)
-            new_posts.sort(key=lambda x: x['timestamp'])
-            
-            # Apply limit after sorting to get the OLDEST new posts first, 
-            # but we usually just return all new ones. 
-            # If we want to strictly respect post_limit for the batch:
-            if len(new_posts) > self.post_limit:
-                new_posts = new_posts[:self.post_limit]
+                    if is_new:
+                        # Extract information
+                        title = entry['title'] or 'No Title'
+                        author = entry['author'] or 'Unknown'
+                            
+                        # Simple HTML cleanup (remove tags, unescape entities)
+                        text_content = html_parser.strip_tags(entry['content'])
+                        
+                        # Limit text length
+                        if len(text_content) > 500:
+                            text_content = text_content[:497] + "..."
+                        
+                        new_posts[subreddit].append(Post(
+                            title, link, text_content if text_content else "View post on Reddit", published_time, author,
+                            score=0,  # RSS doesn't provide score
+                            post_id=post_id,
+                            subreddit=subreddit
+                        ))
+            finally:
+                response.close()
+
+            # Apply the limit after sorting to get the OLDEST new posts of each subreddit first
+            for subreddit, posts in new_posts.items():
+                posts.sort(key=lambda x: x['timestamp'])
+                del posts[self.post_limit:]
             
-            print(f"Found {len(new_posts)} new posts from r/{self.subreddit}")
-            return new_posts
+            if not any(new_posts.values()):
+                http_client.mark_idle(feed_url, watermark)
+
+            for subreddit, posts in new_posts.items():
+                print(f"Found {len(posts)} new posts from r/{subreddit}")
+            # Sort by timestamp (oldest first) across subreddits
+            for post in sorted((post for posts in new_posts.values() for post in posts), key=lambda x: x['timestamp']):
+                yield post['subreddit'], post
             
+        except http_client.SourceUnavailable:
+            raise
+        except http_client.TRANSPORT_ERRORS as e:
+            raise http_client.SourceUnavailable(f"Reddit r/{combined}: {e}") from e
         except Exception as e:
-            print(f"Exception fetching Reddit RSS r/{self.subreddit}: {e}")
-            return []
+            print(f"Exception fetching Reddit RSS r/{combined}: {e}")
@@ -0,0 +1,105 @@
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+from services import metrics
+
+DEFAULT_CACHE_FILE = os.path.join(os.getenv('DATA_DIR') or os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'data'), 'translation_cache.json')
+DEFAULT_MAX_ENTRIES = 2000
+DEFAULT_MAX_CHARS = 2000000  # Total translated characters kept on disk
+
+
+class TranslationCache:
+    def __init__(self, cache_file=DEFAULT_CACHE_FILE, max_entries=DEFAULT_MAX_ENTRIES, max_chars=DEFAULT_MAX_CHARS, engine='google'):
+        """
+        Persistent LRU cache of translations keyed by a hash of (engine, text, src, dest).
+
+        Args:
+            cache_file: JSON file the cache is loaded from and saved to
+            max_entries: Maximum number of cached translations
+            max_chars: Maximum total length of cached translations
+            engine: Name of the engine producing the translations; engines sharing
+                a file never see each other's output (e.g. offline echoes)
+        """
+        self.cache_file = cache_file
+        self.engine = engine
+        self.max_entries = max_entries
+        self.max_chars = max_chars
+        self.lock = threading.Lock()
+        self.dirty = False
+        self.hits = 0
+        self.misses = 0
+        self.entries = self._load()
+        self.total_chars = sum(len(value) for value in self.entries.values())
+
+    def _load(self):
+        if os.path.exists(self.cache_file):
+            try:
+                with open(self.cache_file, 'r', encoding='utf-8') as f:
+                    return OrderedDict(json.load(f))
+            except Exception as e:
+                print(f"Ignoring unreadable translation cache: {e}")
+        return OrderedDict()
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
+        tmp_file = f"{self.cache_file}.tmp"
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(list(self.entries.items()), f, ensure_ascii=False)
+        os.replace(tmp_file, self.cache_file)
+        self.dirty = False
+
+    def _key(self, text, src, dest):
+        return hashlib.sha256(f"{self.engine}\0{src}\0{dest}\0{text}".encode('utf-8')).hexdigest()
+
+    def get(self, text, src, dest):
+        key = self._key(text, src, dest)
+        with self.lock:
+            value = self.entries.get(key)
+            if value is None:
+                self.misses += 1
+                metrics.count('translation_cache_misses')
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+        metrics.count('translation_cache_hits')
+        return value
+
+    def put(self, text, src, dest, translated, save=True):
+        """
+        Store a translation.
+
+        Args:
+            save: Write the file now; pass False when storing many and call save() after the last
+        """
+        key = self._key(text, src, dest)
+        with self.lock:
+            if key in self.entries:
+                self.total_chars -= len(self.entries.pop(key))
+            self.entries[key] = translated
+            self.total_chars += len(translated)
+
+            # Evict least recently used translations
+            while self.entries and (len(self.entries) > self.max_entries or self.total_chars > self.max_chars):
+                _, evicted = self.entries.popitem(last=False)
+                self.total_chars -= len(evicted)
+
+            self.dirty = True
+            if save:
+                self._save()
+
+    def save(self):
+        """Write pending changes to disk."""
+        with self.lock:
+            if self.dirty:
+                self._save()
+
+    def stats(self):
+        with self.lock:
+            return {
+                'entries': len(self.entries),
+                'chars': self.total_chars,
+                'hits': self.hits,
+                'misses': self.misses,
+            }
@@ -0,0 +1,67 @@
+import time
+import threading
+
+DEFAULT_ENGINE = 'google'
+
+
+class GoogleEngine:
+    """Google Translate through googletrans; each worker thread gets its own Translator."""
+
+    name = 'google'
+
+    def __init__(self):
+        # googletrans is imported on first use so the offline engine never loads it
+        from googletrans import Translator
+        self.translator_class = Translator
+        self.local = threading.local()
+
+    def translate(self, text, dest, src):
+        translator = getattr(self.local, 'translator', None)
+        if translator is None:
+            # A Translator keeps one HTTP session and token state, which are not shared between threads
+            translator = self.local.translator = self.translator_class()
+        # googletrans 4.0.0-rc1 fixed most issues with the API change
+        return translator.translate(text, dest=dest, src=src).text
+
+
+class OfflineEngine:
+    """Local stand-in for tests and benchmarks: echoes the text after a simulated delay."""
+
+    name = 'offline'
+
+    def __init__(self, latency=0.0, char_latency=0.0):
+        """
+        Args:
+            latency: Seconds every request takes
+            char_latency: Extra seconds per character of the request
+        """
+        self.latency = latency
+        self.char_latency = char_latency
+
+    def translate(self, text, dest, src):
+        delay = self.latency + self.char_latency * len(text)
+        if delay:
+            time.sleep(delay)
+        return text
+
+
+ENGINES = {
+    GoogleEngine.name: GoogleEngine,
+    OfflineEngine.name: OfflineEngine,
+}
+
+
+def create_engine(name=DEFAULT_ENGINE, **options):
+    """
+    Create a translation engine by name.
+
+    Args:
+        name: 'google' or 'offline'
+        **options: Constructor arguments of the engine
+
+    Raises:
+        ValueError: If the engine is unknown
+    """
+    if name not in ENGINES:
+        raise ValueError(f"Unknown translation engine '{name}' (expected one of {', '.join(ENGINES)})")
+    return ENGINES[name](**options)
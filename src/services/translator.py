@@ -1,17 +1,244 @@
-from googletrans import Translator
-import asyncio
+import re
+import time
+import threading
+from services.translation_cache import TranslationCache, DEFAULT_CACHE_FILE
+from services.translation_engines import create_engine, DEFAULT_ENGINE
+from services.fetcher import fetch_all
+from services import metrics
+
+# Google's web endpoint rejects requests much above 5000 characters
+MAX_BATCH_CHARS = 4500
+# Texts longer than this are split so their pieces are translated in parallel
+CHUNK_CHARS = 1500
+# Translation requests in flight at once
+DEFAULT_WORKERS = 4
+# Line placed between packed strings; it survives translation unchanged
+BATCH_SEPARATOR = "\n⁂⁂⁂\n"
+
+# Boundaries a long text is split at, tried in order: paragraphs, then sentences
+# (CJK full stops need no following space; Latin ones do, so "v1.2" stays whole)
+SPLIT_PATTERNS = [
+    re.compile(r'(\n+)'),
+    re.compile(r'((?<=[。！？；])\s*|(?<=[.!?;])\s+)'),
+]
+
+
+def split_text(text, max_chars, level=0):
+    """
+    Split text into pieces of at most max_chars characters.
+
+    Paragraph boundaries are preferred, then sentence boundaries; a sentence
+    that is still too long is cut at its last space before the limit.
+
+    Returns:
+        List of [piece, separator]; joining every piece followed by its
+        separator gives back the text (the last separator is '')
+    """
+    if len(text) <= max_chars:
+        return [[text, '']]
+
+    if level == len(SPLIT_PATTERNS):
+        pieces = []
+        while len(text) > max_chars:
+            cut = text.rfind(' ', 0, max_chars + 1)
+            if cut > 0:
+                pieces.append([text[:cut], ' '])
+                text = text[cut + 1:]
+            else:
+                pieces.append([text[:max_chars], ''])
+                text = text[max_chars:]
+        pieces.append([text, ''])
+        return pieces
+
+    parts = SPLIT_PATTERNS[level].split(text)
+    pieces = []
+    for index in range(0, len(parts), 2):
+        segment_pieces = split_text(parts[index], max_chars, level + 1)
+        segment_pieces[-1][1] = parts[index + 1] if index + 1 < len(parts) else ''
+        for piece, separator in segment_pieces:
+            # Neighbouring short segments are merged back up to the limit
+            if pieces and len(pieces[-1][0]) + len(pieces[-1][1]) + len(piece) <= max_chars:
+                pieces[-1] = [pieces[-1][0] + pieces[-1][1] + piece, separator]
+            else:
+                pieces.append([piece, separator])
+    return pieces
+
+
+def join_pieces(translations, separators):
+    """Reassemble translated pieces; line breaks are kept and other boundaries become one space."""
+    text = ''
+    for translation, separator in zip(translations, separators):
+        text += translation
+        if separator:
+            text += separator if '\n' in separator else ' '
+    return text
+
 
 class TranslationService:
-    def __init__(self):
-        self.translator = Translator()
+    def __init__(self, cache_file=DEFAULT_CACHE_FILE, max_batch_chars=MAX_BATCH_CHARS, engine=DEFAULT_ENGINE,
+                 engine_options=None, workers=DEFAULT_WORKERS, chunk_chars=CHUNK_CHARS):
+        """
+        Args:
+            cache_file: Path of the persistent translation cache (None disables caching)
+            max_batch_chars: Maximum length of one packed translate_batch request
+            engine: Engine name ('google', 'offline') or an object with a name and translate(text, dest, src)
+            engine_options: Constructor arguments of a named engine
+            workers: Maximum number of translation requests in flight
+            chunk_chars: Length above which a text is split at paragraph and sentence boundaries
+        """
+        self.engine = create_engine(engine, **(engine_options or {})) if isinstance(engine, str) else engine
+        self.cache = TranslationCache(cache_file, engine=self.engine.name) if cache_file else None
+        self.max_batch_chars = max_batch_chars
+        self.workers = workers
+        self.chunk_chars = min(chunk_chars, max_batch_chars)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.failed_requests = 0
+        self.request_chars = 0
+        self.latencies = []
+
+    def _request(self, text, dest, src):
+        """Send one request to the engine, recording its latency."""
+        started = time.perf_counter()
+        failed = False
+        try:
+            return self.engine.translate(text, dest=dest, src=src)
+        except Exception:
+            failed = True
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            with self.lock:
+                self.requests += 1
+                self.failed_requests += failed
+                self.request_chars += len(text)
+                self.latencies.append(elapsed)
+            metrics.record(f"translate:{self.engine.name}", elapsed)
 
     def translate(self, text, dest='vi', src='zh-cn'):
         if not text:
             return ""
-        try:
-            # googletrans 4.0.0-rc1 fixed most issues with the API change
-            result = self.translator.translate(text, dest=dest, src=src)
-            return result.text
-        except Exception as e:
-            print(f"Translation error: {e}")
-            return text # Fallback to original text on error
+        return self.translate_batch([text], dest=dest, src=src)[0]
+
+    def _pack(self, texts):
+        """Group texts into chunks whose joined length stays under max_batch_chars."""
+        chunks = []
+        current = []
+        size = 0
+        for text in texts:
+            added = len(text) + (len(BATCH_SEPARATOR) if current else 0)
+            if current and size + added > self.max_batch_chars:
+                chunks.append(current)
+                current = []
+                size = 0
+                added = len(text)
+            current.append(text)
+            size += added
+        if current:
+            chunks.append(current)
+        return chunks
+
+    def _translate_chunk(self, chunk, dest, src):
+        """
+        Translate one packed request.
+
+        If it fails or comes back with a different number of parts, its strings
+        are sent one by one.
+
+        Returns:
+            List of translations, None for every string that failed
+        """
+        if len(chunk) > 1:
+            try:
+                result = self._request(BATCH_SEPARATOR.join(chunk), dest, src)
+                parts = [part.strip() for part in result.split(BATCH_SEPARATOR.strip())]
+                if len(parts) == len(chunk):
+                    return parts
+                print(f"Batch translation split mismatch ({len(parts)} != {len(chunk)}), retrying individually")
+            except Exception as e:
+                print(f"Batch translation error: {e}")
+
+        translated = []
+        for text in chunk:
+            try:
+                translated.append(self._request(text, dest, src))
+            except Exception as e:
+                print(f"Translation error: {e}")
+                translated.append(None)
+        return translated
+
+    def translate_batch(self, texts, dest='vi', src='zh-cn'):
+        """
+        Translate many strings using as few requests as possible.
+
+        Short strings are packed together up to max_batch_chars per request and
+        split back afterwards. Strings longer than chunk_chars are split at
+        paragraph and sentence boundaries and their pieces sent separately. All
+        requests run in a pool of `workers` threads; anything that fails falls
+        back to its original text, piece by piece.
+
+        Returns:
+            List of translations in the same order as `texts`
+        """
+        results = [""] * len(texts)
+        pending = {}
+        for index, text in enumerate(texts):
+            if not text:
+                continue
+            cached = self.cache.get(text, src, dest) if self.cache is not None else None
+            if cached is not None:
+                results[index] = cached
+            else:
+                # Identical strings (e.g. a title repeated as text) are translated once
+                pending.setdefault(text, []).append(index)
+
+        if not pending:
+            return results
+
+        metrics.count('translated_chars', sum(len(text) for text in pending))
+        pieces = {text: split_text(text, self.chunk_chars) for text in pending}
+        short_texts = [text for text in pending if len(pieces[text]) == 1]
+        # Pieces of long texts are sent alone so one article keeps several workers busy
+        long_pieces = list(dict.fromkeys(piece for text in pending if len(pieces[text]) > 1 for piece, _ in pieces[text]))
+        requests = self._pack(short_texts) + [[piece] for piece in long_pieces]
+
+        translated = {}
+        responses = fetch_all(lambda chunk: self._translate_chunk(chunk, dest, src), requests, max_workers=self.workers)
+        for chunk, response in zip(requests, responses):
+            translated.update(zip(chunk, response or [None] * len(chunk)))
+
+        for text, indices in pending.items():
+            parts = [translated[piece] for piece, _ in pieces[text]]
+            value = join_pieces([part if part is not None else piece for part, (piece, _) in zip(parts, pieces[text])],
+                                [separator for _, separator in pieces[text]])
+            # Only complete translations are cached so failures get retried next time
+            if self.cache is not None and None not in parts:
+                self.cache.put(text, src, dest, value, save=False)
+            for index in indices:
+                results[index] = value
+
+        if self.cache is not None:
+            self.cache.save()
+        return results
+
+    def stats(self):
+        with self.lock:
+            latencies = list(self.latencies)
+            return {
+                'engine': self.engine.name,
+                'requests': self.requests,
+                'failed_requests': self.failed_requests,
+                'chars': self.request_chars,
+                'avg_latency': sum(latencies) / len(latencies) if latencies else 0.0,
+                'max_latency': max(latencies) if latencies else 0.0,
+            }
+
+    def report(self):
+        stats = self.stats()
+        if not stats['requests']:
+            return
+        print(
+            f"Translation ({stats['engine']}): {stats['requests']} requests, {stats['chars']} chars, "
+            f"latency avg {stats['avg_latency'] * 1000:.0f}ms / max {stats['max_latency'] * 1000:.0f}ms, "
+            f"{stats['failed_requests']} failed"
+        )
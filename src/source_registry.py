@@ -0,0 +1,53 @@
+import sys
+import time
+import importlib
+import threading
+
+# Seconds spent importing each lazily loaded module (including its dependencies)
+IMPORT_TIMES = {}
+# Seconds spent constructing each lazily created object
+CONSTRUCT_TIMES = {}
+
+
+def load_class(path):
+    """Import 'package.module.ClassName' on first use and return the class."""
+    module_name, class_name = path.rsplit('.', 1)
+    if module_name in sys.modules:
+        # import_module (rather than sys.modules) waits for another thread still importing it
+        module = importlib.import_module(module_name)
+    else:
+        started = time.perf_counter()
+        module = importlib.import_module(module_name)
+        IMPORT_TIMES.setdefault(module_name, time.perf_counter() - started)
+    return getattr(module, class_name)
+
+
+class LazyInstance:
+    def __init__(self, path, *args, **kwargs):
+        """
+        Defer importing and constructing a class until it is actually needed.
+
+        Args:
+            path: Dotted path of the class, e.g. 'services.official.OfficialService'
+            *args, **kwargs: Constructor arguments
+        """
+        self.path = path
+        self.args = args
+        self.kwargs = kwargs
+        self._instance = None
+        self.lock = threading.Lock()
+
+    @property
+    def loaded(self):
+        return self._instance is not None
+
+    def get(self):
+        if self._instance is None:
+            # Poll workers may ask for a shared instance at the same time; only one builds it
+            with self.lock:
+                if self._instance is None:
+                    cls = load_class(self.path)
+                    started = time.perf_counter()
+                    self._instance = cls(*self.args, **self.kwargs)
+                    CONSTRUCT_TIMES[self.path] = CONSTRUCT_TIMES.get(self.path, 0) + time.perf_counter() - started
+        return self._instance
@@ -0,0 +1,253 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+
+# DATA_DIR in the environment relocates all persistent state (e.g. for benchmarks)
+DATA_DIR = os.getenv('DATA_DIR') or os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data')
+STATE_DB = os.path.join(DATA_DIR, 'state.db')
+LEGACY_HISTORY_FILE = os.path.join(DATA_DIR, 'history.json')
+
+# How long a seen post ID is remembered
+SEEN_ID_HORIZON = 7 * 86400
+# How far back posting rates are learned from
+POST_LOG_WINDOW = 30 * 86400
+# How long delivered posts are remembered for cross-source duplicate detection
+FINGERPRINT_WINDOW = 3 * 86400
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS watermarks (
+    source_key TEXT PRIMARY KEY,
+    value REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS seen_ids (
+    source_key TEXT NOT NULL,
+    post_id TEXT NOT NULL,
+    seen_at REAL NOT NULL,
+    PRIMARY KEY (source_key, post_id)
+);
+CREATE INDEX IF NOT EXISTS idx_seen_ids_seen_at ON seen_ids (seen_at);
+CREATE TABLE IF NOT EXISTS post_log (
+    source_key TEXT NOT NULL,
+    posted_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_post_log_source ON post_log (source_key, posted_at);
+CREATE TABLE IF NOT EXISTS fingerprints (
+    source_key TEXT NOT NULL,
+    source_name TEXT NOT NULL,
+    link TEXT NOT NULL,
+    simhash TEXT NOT NULL,
+    numbers TEXT NOT NULL DEFAULT '',
+    seen_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_fingerprints_seen_at ON fingerprints (seen_at);
+CREATE TABLE IF NOT EXISTS source_health (
+    source_key TEXT PRIMARY KEY,
+    state TEXT NOT NULL,
+    failures INTEGER NOT NULL,
+    opened_at REAL,
+    cooldown REAL NOT NULL,
+    last_error TEXT,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+class StateStore:
+    def __init__(self, db_path=STATE_DB, horizon=SEEN_ID_HORIZON, legacy_file=LEGACY_HISTORY_FILE):
+        """
+        SQLite-backed replacement for data/history.json.
+
+        Holds a timestamp watermark per source and an indexed table of seen post
+        IDs. Every update is its own transaction, so a crash never loses or
+        corrupts what was already committed.
+
+        Args:
+            db_path: SQLite database file (opened in WAL mode)
+            horizon: Seconds a seen post ID is kept before it expires
+            legacy_file: history.json to import once if present
+        """
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self.db_path = db_path
+        self.horizon = horizon
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self.migrate_schema()
+        self.migrate_json(legacy_file)
+        self.expire()
+
+    def _transaction(self, statements):
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                for sql, params in statements:
+                    self.conn.execute(sql, params)
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    def get_meta(self, key):
+        with self.lock:
+            row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key, value):
+        self._transaction([("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))])
+
+    def migrate_schema(self):
+        """Add columns introduced after a database was created."""
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(fingerprints)")}
+        if 'numbers' not in columns:
+            # Older entries have no numbers recorded, so no post's numbers conflict with them
+            self.conn.execute("ALTER TABLE fingerprints ADD COLUMN numbers TEXT NOT NULL DEFAULT ''")
+
+    def migrate_json(self, legacy_file):
+        """Import watermarks and seen IDs from history.json the first time the store is opened."""
+        if self.get_meta('migrated_json') or not legacy_file or not os.path.exists(legacy_file):
+            return
+
+        try:
+            with open(legacy_file, 'r') as f:
+                history = json.load(f)
+        except Exception as e:
+            print(f"Could not migrate {legacy_file}: {e}")
+            return
+
+        now = time.time()
+        statements = []
+        for key, value in history.items():
+            if isinstance(value, list):
+                for post_id in value:
+                    statements.append((
+                        "INSERT OR IGNORE INTO seen_ids (source_key, post_id, seen_at) VALUES (?, ?, ?)",
+                        (key, str(post_id), now)
+                    ))
+            elif isinstance(value, (int, float)):
+                statements.append((
+                    "INSERT OR REPLACE INTO watermarks (source_key, value, updated_at) VALUES (?, ?, ?)",
+                    (key, float(value), now)
+                ))
+        statements.append(("INSERT OR REPLACE INTO meta (key, value) VALUES ('migrated_json', ?)", (str(now),)))
+        self._transaction(statements)
+        print(f"Migrated {len(history)} history entries from {legacy_file}")
+
+    def get_watermark(self, source_key, default=None):
+        with self.lock:
+            row = self.conn.execute("SELECT value FROM watermarks WHERE source_key = ?", (source_key,)).fetchone()
+        return row[0] if row else default
+
+    def set_watermark(self, source_key, value):
+        self._transaction([(
+            "INSERT OR REPLACE INTO watermarks (source_key, value, updated_at) VALUES (?, ?, ?)",
+            (source_key, float(value), time.time())
+        )])
+
+    def advance_watermark(self, source_key, value):
+        """Like set_watermark, but never moves an existing watermark backwards."""
+        self._transaction([(
+            "INSERT INTO watermarks (source_key, value, updated_at) VALUES (?, ?, ?) "
+            "ON CONFLICT (source_key) DO UPDATE SET value = MAX(value, excluded.value), updated_at = excluded.updated_at",
+            (source_key, float(value), time.time())
+        )])
+
+    def get_seen_ids(self, source_key):
+        """Return the unexpired seen IDs of a source as a set."""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT post_id FROM seen_ids WHERE source_key = ? AND seen_at >= ?",
+                (source_key, time.time() - self.horizon)
+            ).fetchall()
+        return {row[0] for row in rows}
+
+    def add_seen_id(self, source_key, post_id):
+        self._transaction([(
+            "INSERT OR REPLACE INTO seen_ids (source_key, post_id, seen_at) VALUES (?, ?, ?)",
+            (source_key, str(post_id), time.time())
+        )])
+
+    def record_post(self, source_key, posted_at):
+        """Log a post's publish time so per-source posting rates can be learned."""
+        self._transaction([(
+            "INSERT INTO post_log (source_key, posted_at) VALUES (?, ?)",
+            (source_key, float(posted_at))
+        )])
+
+    def post_rate(self, source_key, window=POST_LOG_WINDOW):
+        """
+        Return the average number of posts per second over the last `window` seconds,
+        or None if the source has no logged posts yet.
+        """
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT COUNT(*), MIN(posted_at) FROM post_log WHERE source_key = ? AND posted_at >= ?",
+                (source_key, now - window)
+            ).fetchone()
+        count, oldest = row
+        if not count:
+            return None
+        # Measure from the oldest logged post so a newly added source is not underestimated
+        return count / max(now - oldest, 3600)
+
+    def add_fingerprint(self, source_key, source_name, link, fingerprint):
+        """Remember a delivered post's (simhash, numbers) fingerprint for duplicate detection in later runs."""
+        value, numbers = fingerprint
+        self._transaction([(
+            "INSERT INTO fingerprints (source_key, source_name, link, simhash, numbers, seen_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (source_key, source_name, link, f"{value:016x}", numbers, time.time())
+        )])
+
+    def get_fingerprints(self, window=FINGERPRINT_WINDOW):
+        """
+        Return recently delivered posts as (source_key, source_name, link, fingerprint) tuples.
+        """
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT source_key, source_name, link, simhash, numbers FROM fingerprints WHERE seen_at >= ?",
+                (time.time() - window,)
+            ).fetchall()
+        return [(key, name, link, (int(simhash, 16), numbers)) for key, name, link, simhash, numbers in rows]
+
+    def get_health(self, source_key):
+        """Return a source's circuit breaker state as a dict, or None if it never failed."""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT state, failures, opened_at, cooldown, last_error FROM source_health WHERE source_key = ?",
+                (source_key,)
+            ).fetchone()
+        if row is None:
+            return None
+        state, failures, opened_at, cooldown, last_error = row
+        return {'state': state, 'failures': failures, 'opened_at': opened_at, 'cooldown': cooldown, 'last_error': last_error}
+
+    def set_health(self, source_key, state, failures, opened_at, cooldown, last_error):
+        self._transaction([(
+            "INSERT OR REPLACE INTO source_health (source_key, state, failures, opened_at, cooldown, last_error, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (source_key, state, failures, opened_at, cooldown, last_error, time.time())
+        )])
+
+    def expire(self):
+        """Drop seen IDs older than the horizon and log and fingerprint entries outside their windows."""
+        now = time.time()
+        self._transaction([
+            ("DELETE FROM seen_ids WHERE seen_at < ?", (now - self.horizon,)),
+            ("DELETE FROM post_log WHERE posted_at < ?", (now - POST_LOG_WINDOW,)),
+            ("DELETE FROM fingerprints WHERE seen_at < ?", (now - FINGERPRINT_WINDOW,)),
+        ])
+
+    def close(self):
+        # Checkpoint the WAL into the main file so the database is a single, committable file
+        with self.lock:
+            self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            self.conn.close()